@@ -0,0 +1 @@
+"""Bot extensions, one per subsystem; each can be reloaded with `!reload <name>`."""
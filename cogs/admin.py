@@ -0,0 +1,332 @@
+"""Server administration: configuration, vouch overrides, bulk jobs and discrepancy alerts."""
+import json
+import time
+import asyncio
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from common import (
+    claim_unassigned_rows, clean_nickname, edit_nickname, format_member_rows, get_config, get_meta,
+    has_unassigned_rows, is_admin, is_guild_owner, member_locks, refresh_decayed_scores, send_paginated, set_meta,
+    store, update_nickname, db_fetchall,
+)
+from jobs import format_job, get_job, resume_jobs, save_job_progress, start_job
+from retention import RETENTION_INTERVAL, run_retention
+
+
+class Admin(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.cleanup_task = None
+        self.retention_task = None
+
+    async def cog_load(self):
+        self.cleanup_task = asyncio.create_task(self.clean_old_notifications())
+        self.retention_task = asyncio.create_task(self.retention_loop())
+
+    async def cog_unload(self):
+        # Bulk jobs are not owned by this cog and keep running across a reload
+        self.cleanup_task.cancel()
+        self.retention_task.cancel()
+
+    async def clean_old_notifications(self):
+        """Clean up old notification records"""
+        while True:
+            await asyncio.sleep(3600)  # Every hour
+            current_time = time.time()
+            to_delete = []
+
+            for msg_id, data in self.bot.discrepancy_notifications.items():
+                if current_time - data.get('timestamp', 0) > 86400:  # 24 hours
+                    to_delete.append(msg_id)
+
+            for msg_id in to_delete:
+                del self.bot.discrepancy_notifications[msg_id]
+
+    async def retention_loop(self):
+        """Archive old reasons, prune cooldowns and release free pages once a day.
+
+        The last run time is kept in bot_meta so restarts and reloads keep the schedule.
+        """
+        await self.bot.wait_until_ready()
+        while True:
+            last_run = float(get_meta("retention_last_run") or 0)
+            await asyncio.sleep(max(0, last_run + RETENTION_INTERVAL - time.time()))
+            try:
+                result = await run_retention(store)
+                await store.refresh()
+                if result['archived']:
+                    for guild in self.bot.guilds:
+                        self.bot.forget_vouch_graph(guild.id)
+                print(f"Retention: archived {result['archived']} reasons, pruned {result['cooldowns']} cooldowns, "
+                      f"freed {result['bytes_freed'] / 1024:.0f} KiB in {result['seconds']:.1f}s")
+            except Exception as e:
+                print(f"Retention run failed: {e}")
+            set_meta("retention_last_run", str(time.time()))
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Data from before guild partitioning belongs to the only guild a single-server bot has
+        if has_unassigned_rows():
+            if len(self.bot.guilds) == 1:
+                guild = self.bot.guilds[0]
+                moved = await claim_unassigned_rows(guild.id)
+                print(f"Assigned {moved} pre-partitioning rows to {guild.name}")
+            else:
+                print("Unassigned vouch data found; run !claimvouches in the server it belongs to")
+
+        resume_jobs(self.bot)
+
+        for guild in self.bot.guilds:
+            staff_channel_name, admin_roles = get_config(guild.id)
+
+            # Check staff channel
+            channel = discord.utils.get(guild.text_channels, name=staff_channel_name)
+            missing_channel = channel is None
+
+            # Check admin roles
+            missing_roles = [rid for rid in admin_roles if guild.get_role(rid) is None]
+
+            # DM owner
+            if missing_channel or missing_roles:
+                try:
+                    owner = guild.owner
+                    msg = "**⚠️ VouchBot Configuration Warning**\n"
+                    if missing_channel:
+                        msg += f"• Staff channel `{staff_channel_name}` not found.\n"
+                    if missing_roles:
+                        msg += f"• Missing admin roles: `{', '.join(missing_roles)}`\n"
+                    msg += "Use `!setconfig` to update them."
+                    await owner.send(msg)
+                except Exception as e:
+                    print(f"Failed to DM owner in {guild.name}: {e}")
+
+    @commands.hybrid_command(extras={"ephemeral": True})
+    @app_commands.describe(setting="Which setting to change", value="New value (channel ID or role IDs)")
+    @commands.check_any(commands.is_owner(), commands.check(is_guild_owner))
+    async def setconfig(self, ctx, setting: str, *, value: str):
+        """[OWNER] Set staff_channel_id or admin_roles_id (comma-separated IDs)"""
+        setting = setting.lower()
+        if setting not in ("staff_channel_id", "admin_roles_id"):
+            return await ctx.send("❌ Invalid setting. Use `staff_channel_id` or `admin_roles_id`.")
+
+        if setting == "staff_channel_id":
+            try:
+                channel_id = int(value.strip())
+                channel = ctx.guild.get_channel(channel_id)
+                if channel is None:
+                    return await ctx.send("❌ That channel ID doesn't exist in this server!")
+                value = str(channel.id)
+            except ValueError:
+                return await ctx.send("❌ Invalid channel ID format. Use a numeric ID.")
+
+        elif setting == "admin_roles_id":
+            try:
+                role_ids = [int(r.strip()) for r in value.split(",") if r.strip()]
+                missing = [rid for rid in role_ids if ctx.guild.get_role(rid) is None]
+                if missing:
+                    return await ctx.send(f"❌ These role IDs don't exist: {', '.join(map(str, missing))}")
+                value = json.dumps(role_ids)
+            except ValueError:
+                return await ctx.send("❌ Invalid role ID format. Use numeric IDs separated by commas.")
+
+        if not store.set_config(ctx.guild.id, setting, value):
+            return await ctx.send("❌ Failed to update config.")
+
+        await ctx.send(f"✅ `{setting}` updated.")
+
+    @commands.hybrid_command()
+    @app_commands.describe(member="User to modify", action="Enable or disable unvouchable status (on/off)")
+    @commands.check(is_admin)
+    async def unvouchable(self, ctx, member: discord.Member, action: str = "on"):
+        """[ADMIN] Toggle unvouchable status (on/off)"""
+        enable = action.lower() in ("on", "enable", "yes", "true", "1")
+        async with member_locks.hold(ctx.guild.id, member.id):
+            if not store.set_unvouchable(ctx.guild.id, member.id, enable):
+                return await ctx.send("❌ Failed to update database!")
+            await update_nickname(member)
+        if enable:
+            await ctx.send(f"🔒 {member.mention} is now unvouchable!")
+        else:
+            await ctx.send(f"🔓 {member.mention} can now be vouched!")
+
+    @commands.hybrid_command()
+    @commands.check(is_admin)
+    async def unvouchable_list(self, ctx):
+        """[ADMIN] List all unvouchable users"""
+        await send_paginated(
+            ctx, "🔒 Unvouchable Users",
+            lambda after: store.unvouchable_page(ctx.guild.id, after),
+            format_member_rows(ctx.guild),
+            "No unvouchable users!"
+        )
+
+    @commands.hybrid_command()
+    @app_commands.describe(member="User to reset")
+    @commands.check(is_admin)
+    async def clearvouches(self, ctx, member: discord.Member):
+        """[ADMIN] Reset a user's vouches and allow re-vouching"""
+        # Reset count, vouch history and cooldown together
+        async with member_locks.hold(ctx.guild.id, member.id):
+            if not store.clear_vouches(ctx.guild.id, member.id):
+                return await ctx.send("❌ Database error!")
+            self.bot.forget_vouch_graph(ctx.guild.id)
+            refresh_decayed_scores(ctx.guild.id, member.id)
+            await update_nickname(member)
+        await ctx.send(f"♻️ Completely reset vouches for {member.mention}! Users can now vouch for them again.")
+
+    @commands.hybrid_command()
+    @commands.check(is_admin)
+    async def clearvouches_all(self, ctx):
+        """[ADMIN] Reset ALL vouches and cooldowns in this server"""
+        # Reset all counts, records and cooldowns together, off the loop; the read model catches up afterwards
+        cleared = await asyncio.to_thread(store.engine.clear_vouches, ctx.guild.id)
+        await store.refresh()
+        self.bot.forget_vouch_graph(ctx.guild.id)
+        if not cleared:
+            return await ctx.send("❌ Database error!")
+        await asyncio.to_thread(refresh_decayed_scores, ctx.guild.id)
+
+        job_id = start_job(self.bot, "refreshnicks", ctx.guild, ctx.channel, ctx.author.id)
+        await ctx.send(f"♻️ Completely reset ALL vouches and cooldowns! Refreshing nicknames in job #{job_id}")
+
+    @commands.hybrid_command()
+    @app_commands.describe(member="User to modify", count="New vouch count")
+    @commands.check(is_admin)
+    async def setvouches(self, ctx, member: discord.Member, count: int):
+        """[ADMIN] Set vouch count, recording the difference as a signed adjustment"""
+        # Community vouch records are left alone; the adjustment carries who changed the count and when
+        async with member_locks.hold(ctx.guild.id, member.id):
+            ok = (
+                store.set_vouch_count(ctx.guild.id, member.id, count, ctx.author.id, int(time.time()))
+                and store.set_tracking(ctx.guild.id, member.id, True)
+            )
+            if not ok:
+                return await ctx.send("❌ Database error!")
+            await update_nickname(member)
+        await ctx.send(f"✅ Set {member.mention}'s vouches to {count}")
+
+    @commands.command()
+    @commands.is_owner()
+    async def claimvouches(self, ctx):
+        """[OWNER] Move vouch data from before per-server storage into this server"""
+        if not has_unassigned_rows():
+            return await ctx.send("ℹ️ There is no unassigned vouch data")
+        moved = await claim_unassigned_rows(ctx.guild.id)
+        await ctx.send(f"✅ Moved {moved} rows of unassigned vouch data into this server")
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def enablevouches_all(self, ctx):
+        """[ADMIN] Enable tracking for all"""
+        job_id = start_job(self.bot, "enablevouches_all", ctx.guild, ctx.channel, ctx.author.id)
+        await ctx.send(f"🔄 Enabling tracking for everyone in job #{job_id}")
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def disablevouches_all(self, ctx):
+        """[ADMIN] Disable tracking for all"""
+        job_id = start_job(self.bot, "disablevouches_all", ctx.guild, ctx.channel, ctx.author.id)
+        await ctx.send(f"🔄 Disabling tracking for everyone in job #{job_id}")
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def jobstatus(self, ctx, job_id: int = None):
+        """[ADMIN] Show one bulk job, or the latest jobs in this server"""
+        if job_id is not None:
+            job = get_job(job_id)
+            if job is None or job['guild_id'] != ctx.guild.id:
+                return await ctx.send(f"❌ No job #{job_id} in this server")
+            return await ctx.send(format_job(job))
+        jobs = db_fetchall("SELECT * FROM jobs WHERE guild_id = ? ORDER BY job_id DESC LIMIT 10", (ctx.guild.id,))
+        if not jobs:
+            return await ctx.send("No bulk jobs yet")
+        await ctx.send("\n".join(format_job(job) for job in jobs))
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def canceljob(self, ctx, job_id: int):
+        """[ADMIN] Stop a queued or running bulk job"""
+        job = get_job(job_id)
+        if job is None or job['guild_id'] != ctx.guild.id:
+            return await ctx.send(f"❌ No job #{job_id} in this server")
+        if job['status'] not in ("queued", "running"):
+            return await ctx.send(f"❌ Job #{job_id} is already {job['status']}")
+        save_job_progress(job_id, status="cancelled", finished_at=int(time.time()))
+        task = self.bot.jobs.get(job_id)
+        if task:
+            task.cancel()
+        await ctx.send(f"🛑 Cancelled job #{job_id}")
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        bot = self.bot
+
+        if payload.message_id not in bot.discrepancy_notifications:
+            return
+
+        # Skip bot's own reactions
+        if payload.user_id == bot.user.id:
+            return
+
+        try:
+            data = bot.discrepancy_notifications[payload.message_id]
+            guild = bot.get_guild(payload.guild_id)
+            if not guild:
+                return
+
+            _, admin_roles = get_config(guild.id)
+
+            # Get the member in question
+            member = guild.get_member(data['member_id'])
+            if not member:
+                return
+
+            # Check if reaction is from admin
+            reactor = guild.get_member(payload.user_id)
+            if not reactor or not any(r.id in admin_roles for r in reactor.roles):
+                return
+
+            # Handle the action
+            if str(payload.emoji) == "✅":
+                async with member_locks.hold(guild.id, member.id):
+                    # Another admin's reaction may have handled this alert while we waited
+                    if bot.discrepancy_notifications.pop(payload.message_id, None) is None:
+                        return
+
+                    # Reset vouches
+                    store.clear_records(guild.id, member.id)
+                    store.set_vouch_count(guild.id, member.id, 0, reactor.id, int(time.time()))
+                    bot.forget_vouch_graph(guild.id)
+                    refresh_decayed_scores(guild.id, member.id)
+
+                    # Clean nickname
+                    try:
+                        await edit_nickname(member, clean_nickname(member.display_name))
+                    except discord.HTTPException:
+                        pass
+
+                # Send confirmation where it came from
+                if data['admin_id'] == guild.me.id:  # Staff channel
+                    channel = guild.get_channel(payload.channel_id)
+                    if channel:
+                        await channel.send(f"✅ {reactor.mention} reset vouches for {member.mention}")
+                else:  # DM
+                    try:
+                        await reactor.send(f"✅ Reset vouches for {member.mention}")
+                    except discord.Forbidden:
+                        pass
+
+            # Clean up
+            bot.discrepancy_notifications.pop(payload.message_id, None)
+
+        except Exception as e:
+            print(f"Reaction handling error: {e}")
+            if payload.message_id in bot.discrepancy_notifications:
+                del bot.discrepancy_notifications[payload.message_id]
+
+
+async def setup(bot):
+    await bot.add_cog(Admin(bot))
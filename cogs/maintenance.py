@@ -0,0 +1,138 @@
+"""Rarely used repair and database tools.
+
+Loaded lazily: main.py registers a hidden placeholder for each command in
+LAZY_EXTENSIONS and only imports this module the first time one is used.
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+import discord
+from discord.ext import commands
+
+from common import (
+    ADMIN_ALERTS_CHANNEL_ID, db_fetchall, fill_missing_timestamps, is_admin, set_meta, store, wal_archiver,
+)
+from retention import ARCHIVE_AFTER_DAYS, archive_path, run_retention
+from walarchive import list_generations
+
+
+class Maintenance(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def fix_vouch_records(self, ctx):
+        """[ADMIN] Rebuild vouch counts from records and adjustments"""
+        # Triggers keep counts in step, so anything found here was written around them.
+        # Only the SQL runs in the worker thread; the read model is refreshed back on the loop
+        wrong = await asyncio.to_thread(store.engine.recount_vouches, ctx.guild.id)
+        if wrong:
+            await store.refresh()
+
+        if wrong:
+            await ctx.send(f"✅ Fixed {wrong} vouch counts that disagreed with their records!")
+        else:
+            await ctx.send("✅ Every vouch count matches its records")
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def fix_vouch_timestamps(self, ctx):
+        """[ADMIN] Repair missing timestamps in old records, then their rollups and decayed scores"""
+        count = await asyncio.to_thread(fill_missing_timestamps, ctx.guild.id, int(time.time()))
+        await store.refresh()
+
+        await ctx.send(f"✅ Updated timestamps for {count} records")
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def dbstats(self, ctx):
+        """[ADMIN] Show database size per table and index"""
+        rows = db_fetchall("""
+            SELECT name, SUM(pgsize) AS size, COUNT(*) AS pages
+            FROM dbstat GROUP BY name ORDER BY size DESC
+        """)
+        lines = [f"💾 Database file: {os.path.getsize(store.path) / 1024:.1f} KiB"]
+        usage = store.memory_usage()
+        lines.append(
+            f"🧠 Read model ({usage['guilds']} guilds): {usage['users']} users, {usage['tracked']} tracked, {usage['unvouchable']} unvouchable, "
+            f"{usage['vouches']} vouches in {usage['bytes'] / 1024:.1f} KiB"
+        )
+        lines.extend(f"`{row['name']}`: {row['size'] / 1024:.1f} KiB ({row['pages']} pages)" for row in rows)
+        await ctx.send("\n".join(lines)[:2000])
+
+    @commands.command()
+    @commands.is_owner()
+    async def retention(self, ctx, days: int = ARCHIVE_AFTER_DAYS):
+        """[OWNER] Archive reasons older than N days, prune cooldowns and release free pages now"""
+        if days < 1:
+            return await ctx.send("❌ Days must be at least 1")
+        size = os.path.getsize(store.path)
+        await ctx.send(f"🗄️ Archiving reasons older than {days} days to `{os.path.basename(archive_path(store))}`...")
+        result = await run_retention(store, days)
+        await store.refresh()
+        if result['archived']:
+            for guild in self.bot.guilds:
+                self.bot.forget_vouch_graph(guild.id)
+        set_meta("retention_last_run", str(time.time()))
+        await ctx.send(
+            f"✅ Archived {result['archived']} reasons and pruned {result['cooldowns']} expired cooldowns. "
+            f"Released {result['bytes_freed'] / 1024:.1f} KiB ({size / 1024:.1f} → "
+            f"{os.path.getsize(store.path) / 1024:.1f} KiB) in {result['seconds']:.1f}s"
+        )
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def restore_points(self, ctx):
+        """[ADMIN] Show how far back the WAL archive can restore the database"""
+        if wal_archiver is None:
+            return await ctx.send("ℹ️ WAL archiving is off. Set `VOUCH_WAL_ARCHIVE` to an archive directory to enable it.")
+        generations = await asyncio.to_thread(list_generations, wal_archiver.directory)
+        if not generations:
+            return await ctx.send("⏳ The first snapshot has not been taken yet.")
+        status = wal_archiver.status()
+        latest = status["shipped_at"] or generations[-1][0]
+        await ctx.send(
+            f"🗄️ Restorable to any moment from <t:{int(generations[0][0])}:f> to <t:{int(latest)}:f> "
+            f"({len(generations)} snapshots)\n"
+            f"Shipped {status['segments']} WAL segments ({status['bytes_shipped'] / 1024:.0f} KiB) since startup; "
+            f"{status['wal_bytes'] / 1024:.0f} KiB of WAL on disk\n"
+            f"To restore, stop the bot and run `python walarchive.py restore <archive> restored.db --at <time>`"
+        )
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def backup_db(self, ctx):
+        """[ADMIN] Create a database backup"""
+        try:
+            # In WAL mode the file alone misses recent commits, so copy through SQLite
+            with tempfile.TemporaryDirectory() as directory:
+                backup_path = os.path.join(directory, 'vouches_backup.db')
+                await asyncio.to_thread(store.backup, backup_path)
+                with open(backup_path, 'rb') as f:
+                    # Send to both the original channel and admin alerts channel
+                    await ctx.send("Database backup created successfully!")
+                    alert_channel = self.bot.get_channel(ADMIN_ALERTS_CHANNEL_ID)
+                    if alert_channel:
+                        await alert_channel.send(
+                            f"Database backup requested by {ctx.author.mention} (ID: {ctx.author.id}):",
+                            file=discord.File(f, 'vouches_backup.db')
+                        )
+                    else:
+                        await ctx.send("⚠️ Could not find admin alerts channel, but backup was created.")
+        except Exception as e:
+            error_msg = f"❌ Backup failed: {str(e)}"
+            await ctx.send(error_msg)
+            # Try to send error to admin channel too
+            try:
+                alert_channel = self.bot.get_channel(ADMIN_ALERTS_CHANNEL_ID)
+                if alert_channel:
+                    await alert_channel.send(error_msg)
+            except:
+                pass
+
+
+async def setup(bot):
+    await bot.add_cog(Maintenance(bot))
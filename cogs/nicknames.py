@@ -0,0 +1,205 @@
+"""Nickname tags: bulk cleanup, self-healing tags and fake tag detection."""
+import asyncio
+
+import discord
+from discord.ext import commands
+
+from common import (
+    build_nickname_plan, clean_nickname, edit_nickname,
+    get_config, get_displayed_vouches, get_nickname_state, get_staff_channel, is_admin, is_nick_echo, member_locks,
+    queue_send, render_nickname, store, update_nickname,
+)
+from jobs import start_job
+from outbound import PRIORITY_ALERT
+
+NICK_HEAL_DELAY = 10  # Seconds to wait for nickname edits to settle
+FAKE_TAG_DIGEST_INTERVAL = 300  # Seconds between fake tag digests
+
+
+def scan_fake_tags(guild):
+    """Check every display name in the guild against DB counts in one batch pass"""
+    counts = store.positive_counts(guild.id)
+    offenders = []
+    for member in guild.members:
+        displayed = get_displayed_vouches(member.display_name)
+        actual = counts.get(member.id, 0)
+        if displayed > actual:
+            offenders.append((member.id, displayed, actual))
+    return offenders
+
+
+class Nicknames(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.fake_tag_task = None
+
+    async def cog_load(self):
+        self.fake_tag_task = asyncio.create_task(self.fake_tag_scanner())
+
+    async def cog_unload(self):
+        self.fake_tag_task.cancel()
+
+    def queue_fake_tag(self, guild_id, member_id, displayed, actual):
+        """Add an offender to the next digest unless it was already reported"""
+        key = (guild_id, member_id)
+        if self.bot.fake_tag_reported.get(key) == displayed:
+            return
+        self.bot.fake_tag_pending.setdefault(guild_id, {})[member_id] = (displayed, actual)
+
+    def clear_fake_tag(self, guild_id, member_id):
+        """Forget an offender whose tag is no longer fake"""
+        self.bot.fake_tag_reported.pop((guild_id, member_id), None)
+        self.bot.fake_tag_pending.get(guild_id, {}).pop(member_id, None)
+
+    async def send_fake_tag_digest(self, guild):
+        """Report all pending fake tag offenders in a single staff message"""
+        pending = self.bot.fake_tag_pending.pop(guild.id, None)
+        if not pending:
+            return
+
+        lines = []
+        for member_id, (displayed, actual) in pending.items():
+            self.bot.fake_tag_reported[(guild.id, member_id)] = displayed
+            lines.append(f"<@{member_id}>: shows {displayed}V, actual {actual}")
+
+        embed = discord.Embed(
+            title=f"🚨 Fake Tags Detected ({len(lines)})",
+            color=discord.Color.orange(),
+            description="\n".join(lines)[:4000]
+        )
+
+        staff_channel = get_staff_channel(guild)
+        if not staff_channel:
+            print(f"Fake tags in {guild.name} with no staff channel: {len(lines)} offenders")
+            return
+
+        _, admin_roles = get_config(guild.id)
+        try:
+            await queue_send(
+                PRIORITY_ALERT, staff_channel,
+                content=" ".join(f"<@&{rid}>" for rid in admin_roles) if admin_roles else "",
+                embed=embed
+            )
+        except discord.HTTPException as e:
+            print(f"Failed to send fake tag digest in {guild.name}: {e}")
+
+    async def fake_tag_scanner(self):
+        """Scan all guilds once, then flush incremental findings periodically"""
+        await self.bot.wait_until_ready()
+        for guild in self.bot.guilds:
+            for member_id, displayed, actual in scan_fake_tags(guild):
+                self.queue_fake_tag(guild.id, member_id, displayed, actual)
+            await self.send_fake_tag_digest(guild)
+
+        while True:
+            await asyncio.sleep(FAKE_TAG_DIGEST_INTERVAL)
+            for guild_id in list(self.bot.fake_tag_pending):
+                guild = self.bot.get_guild(guild_id)
+                if guild:
+                    await self.send_fake_tag_digest(guild)
+                else:
+                    self.bot.fake_tag_pending.pop(guild_id, None)
+
+    def schedule_nickname_heal(self, member):
+        """Debounce nickname restoration so rapid edits trigger a single update"""
+        key = (member.guild.id, member.id)
+        pending = self.bot.nick_heal_tasks.get(key)
+        if pending and not pending.done():
+            pending.cancel()
+        self.bot.nick_heal_tasks[key] = asyncio.create_task(self.heal_nickname(member.guild, member.id))
+
+    async def heal_nickname(self, guild, member_id):
+        """Restore a tracked member's tags once their nickname has settled"""
+        try:
+            await asyncio.sleep(NICK_HEAL_DELAY)
+        except asyncio.CancelledError:
+            return
+        self.bot.nick_heal_tasks.pop((guild.id, member_id), None)
+        member = guild.get_member(member_id)
+        if member:
+            async with member_locks.hold(guild.id, member_id):
+                await update_nickname(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if before.display_name == after.display_name:
+            return
+
+        # Ignore nickname edits made by the bot itself
+        key = (after.guild.id, after.id)
+        if is_nick_echo(key, after.display_name):
+            return
+
+        tracking, actual, unvouchable = get_nickname_state(after.guild.id, after.id)
+
+        displayed = get_displayed_vouches(after.display_name)
+        if displayed > actual:
+            self.queue_fake_tag(after.guild.id, after.id, displayed, actual)
+        else:
+            self.clear_fake_tag(after.guild.id, after.id)
+
+        # Self-heal stripped or forged tags on tracked members
+        if tracking and render_nickname(after.display_name, after.name, actual, unvouchable) != after.display_name:
+            self.schedule_nickname_heal(after)
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def fixnicks(self, ctx):
+        """[ADMIN] Force-clean ALL nicknames"""
+        changes, tracked = build_nickname_plan(ctx.guild)
+        if not changes:
+            return await ctx.send(f"✅ All {tracked} tracked nicknames are already correct")
+
+        job_id = start_job(self.bot, "fixnicks", ctx.guild, ctx.channel, ctx.author.id)
+        await ctx.send(f"🔄 Started nickname cleanup job #{job_id} ({len(changes)}/{tracked} need changes)")
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def nickplan(self, ctx, mode: str = "dry"):
+        """[ADMIN] Preview nickname changes (use `apply` to perform them)"""
+        changes, tracked = build_nickname_plan(ctx.guild)
+        if not changes:
+            return await ctx.send(f"✅ All {tracked} tracked nicknames are already correct")
+
+        lines = [f"`{member.display_name}` → `{new_nick}`" for member, new_nick in changes]
+        msg = f"📝 {len(changes)} of {tracked} tracked nicknames would change:\n" + "\n".join(lines)
+        await ctx.send(msg[:2000])
+
+        if mode.lower() == "apply":
+            job_id = start_job(self.bot, "fixnicks", ctx.guild, ctx.channel, ctx.author.id)
+            await ctx.send(f"🔄 Applying the plan in job #{job_id}")
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def nuclear_fix(self, ctx, member: discord.Member):
+        """[ADMIN] COMPLETELY reset problematic nicknames"""
+        try:
+            # Get pure username without discriminator
+            original_name = member.name
+
+            async with member_locks.hold(ctx.guild.id, member.id):
+                # Step 1: Reset to pure username
+                await edit_nickname(member, original_name)
+
+                # Step 2: Force update with clean tags
+                await update_nickname(member)
+
+            await ctx.send(f"✅ Successfully reset {member.mention}'s nickname!")
+        except Exception as e:
+            await ctx.send(f"❌ Failed to reset nickname: {str(e)}")
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def resetnick(self, ctx, member: discord.Member):
+        """[ADMIN] Completely reset a user's nickname"""
+        base_name = clean_nickname(member.display_name)
+        try:
+            async with member_locks.hold(ctx.guild.id, member.id):
+                await edit_nickname(member, base_name)
+            await ctx.send(f"✅ Reset {member.mention}'s nickname!")
+        except discord.HTTPException:
+            await ctx.send("❌ Failed to reset nickname (missing permissions)")
+
+
+async def setup(bot):
+    await bot.add_cog(Nicknames(bot))
@@ -0,0 +1,370 @@
+"""Reporting: vouch history and analytics, leaderboards, ring detection, trust scores and bot health."""
+import io
+import re
+import math
+import time
+import asyncio
+import datetime
+import typing
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from common import (
+    DECAY_RATE, backfill_vouch_rollups, db_fetchall, decayed_scores_need_backfill, format_member_rows,
+    get_vouch_analytics, is_admin, member_locks, notify_ring_suspects, outbound, refresh_decayed_scores, rollups_need_backfill,
+    run_in_process, search_vouch_reasons, send_paginated, store, watchdog,
+)
+from graph import VouchGraph, format_ring_report, refresh_trust_scores
+from loopwatch import MAX_PROFILE_SECONDS
+from memstats import MAX_WINDOW_SECONDS, allocation_diff, cache_sizes, process_rss, structure_sizes
+
+TRUST_SCORE_INTERVAL = 6 * 3600  # Seconds between scheduled trust score recomputes
+# vouchsearch's age limit, written as a days:N flag so numbers stay search terms
+SEARCH_DAYS_FLAG = re.compile(r'(?:^|\s)days:(\d+)(?=\s|$)', re.IGNORECASE)
+
+
+class Reporting(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.trust_task = None
+
+    async def cog_load(self):
+        self.trust_task = asyncio.create_task(self.trust_score_loop())
+
+    async def cog_unload(self):
+        self.trust_task.cancel()
+
+    async def load_vouch_graph(self, guild):
+        """Build one guild's vouch graph off the event loop"""
+        started = time.perf_counter()
+        with self.bot.vouch_graph_load(guild.id) as keep:
+            graph = await asyncio.to_thread(VouchGraph.load, guild.id)
+            keep(graph)
+        print(f"Loaded vouch graph for {guild.name}: {graph.edge_count} edges in {time.perf_counter() - started:.2f}s")
+
+    async def trust_score_loop(self):
+        """Recompute trust scores on a schedule without blocking the event loop.
+
+        PageRank runs in the worker process (run_in_process), since in a thread
+        its long list passes would still hold the GIL. The graphs and the last
+        refresh time live on the bot, so a reload picks up the existing
+        schedule instead of recomputing straight away. Each guild's graph and
+        scores are computed from that guild's vouches only.
+        """
+        await self.bot.wait_until_ready()
+        fresh = set()  # Graphs loaded just now; the first refresh scores them instead of loading again
+        for guild in self.bot.guilds:
+            if guild.id not in self.bot.vouch_graphs:
+                await self.load_vouch_graph(guild)
+                fresh.add(guild.id)
+        if rollups_need_backfill():
+            total = await asyncio.to_thread(backfill_vouch_rollups)
+            print(f"Backfilled daily rollups from {total} vouch records")
+        if decayed_scores_need_backfill():
+            total = await asyncio.to_thread(refresh_decayed_scores)
+            print(f"Backfilled decayed vouch scores for {total} members")
+
+        while True:
+            if self.bot.trust_refreshed_at is not None:
+                await asyncio.sleep(max(0, self.bot.trust_refreshed_at + TRUST_SCORE_INTERVAL - time.monotonic()))
+                fresh.clear()
+            started = time.perf_counter()
+            total = 0
+            for guild in self.bot.guilds:
+                graph = self.bot.vouch_graphs.get(guild.id) if guild.id in fresh else None
+                try:
+                    with self.bot.vouch_graph_load(guild.id) as keep:
+                        graph, count = await run_in_process(refresh_trust_scores, guild.id, graph)
+                        keep(graph)
+                    total += count
+                except Exception as e:
+                    print(f"Trust score refresh failed in {guild.name}: {e}")
+            print(f"Trust scores refreshed for {total} users in {time.perf_counter() - started:.2f}s")
+            self.bot.trust_refreshed_at = time.monotonic()
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def trustscores(self, ctx):
+        """[ADMIN] Recompute this server's graph-weighted trust scores now"""
+        await ctx.send("🔄 Recomputing trust scores...")
+        started = time.perf_counter()
+        with self.bot.vouch_graph_load(ctx.guild.id) as keep:
+            graph, count = await run_in_process(refresh_trust_scores, ctx.guild.id)
+            keep(graph)
+        await ctx.send(f"✅ Trust scores computed for {count} users in {time.perf_counter() - started:.1f}s")
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def ringscan(self, ctx):
+        """[ADMIN] Scan the vouch graph for rings, dense clusters and fresh-account bursts"""
+        await ctx.send("🔍 Scanning vouch graph...")
+        started = time.perf_counter()
+        with self.bot.vouch_graph_load(ctx.guild.id) as keep:
+            graph = await asyncio.to_thread(VouchGraph.load, ctx.guild.id)
+            keep(graph)
+        result = await asyncio.to_thread(graph.analyze)
+        elapsed = time.perf_counter() - started
+
+        lines = format_ring_report(result)
+        if not lines:
+            return await ctx.send(f"✅ No suspicious patterns in {graph.edge_count} vouches ({elapsed:.1f}s)")
+        await notify_ring_suspects(ctx.guild, lines)
+        await ctx.send(
+            (f"🕵️ Scanned {graph.edge_count} vouches in {elapsed:.1f}s\n" + "\n".join(lines))[:2000]
+        )
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def vouch_history(self, ctx, member: discord.Member, limit: int = 5):
+        """[ADMIN] Show recent vouch activity for a user"""
+        limit = max(1, min(limit, 25))
+
+        def format_rows(records):
+            lines = []
+            for record in records:
+                admin = ctx.guild.get_member(record['voucher_id'])
+                admin_name = admin.mention if admin else f"Unknown User ({record['voucher_id']})"
+                timestamp = datetime.datetime.fromtimestamp(record['timestamp'] or 0).strftime('%Y-%m-%d %H:%M')
+                lines.append(
+                    f"{timestamp} - {admin_name} "
+                    f"{'(ADMIN) ' if record['is_admin'] else ''}"
+                    f"- Reason: {record['reason'] or 'None'}"
+                )
+            return lines
+
+        await send_paginated(
+            ctx, f"**Vouch history for {member.mention}**",
+            lambda after: store.vouch_page(ctx.guild.id, member.id, after, limit),
+            format_rows,
+            f"No vouch history found for {member.mention}"
+        )
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def vouchsearch(self, ctx, member: typing.Optional[discord.Member] = None, *, query: str):
+        """[ADMIN] Search vouch reasons: !vouchsearch [@member] <terms> [days:N]
+
+        Only vouches from the last N days match when days:N is given. Bare
+        numbers are search terms, so `!vouchsearch 2024 trade` finds both words.
+        """
+        flag = SEARCH_DAYS_FLAG.search(query)
+        days = int(flag.group(1)) if flag else None
+        query = SEARCH_DAYS_FLAG.sub(" ", query).strip()
+        if not query:
+            return await ctx.send("❌ Give some search terms, e.g. `!vouchsearch trade days:30`")
+        since = int(time.time()) - days * 86400 if days else None
+
+        def format_rows(rows):
+            lines = []
+            for row in rows:
+                timestamp = datetime.datetime.fromtimestamp(row['timestamp'] or 0).strftime('%Y-%m-%d')
+                lines.append(f"{timestamp} <@{row['voucher_id']}> → <@{row['vouched_id']}>: {row['excerpt']}")
+            return lines
+
+        await send_paginated(
+            ctx, f"🔎 Vouches matching `{query[:100]}`",
+            lambda after: search_vouch_reasons(ctx.guild.id, query, member.id if member else None, since, after or 0),
+            format_rows,
+            f"No vouch reasons match `{query[:100]}`"
+        )
+
+    @commands.hybrid_command()
+    @app_commands.describe(member="User to check")
+    async def vouch_sources(self, ctx, member: discord.Member):
+        """Check where a user's vouches came from"""
+        def format_rows(vouchers):
+            lines = []
+            for v in vouchers:
+                user = ctx.guild.get_member(v['voucher_id'])
+                name = user.mention if user else f"Unknown User ({v['voucher_id']})"
+                lines.append(f"{name}: {datetime.datetime.fromtimestamp(v['timestamp'] or 0).strftime('%Y-%m-%d')}")
+            return lines
+
+        await send_paginated(
+            ctx, f"**Vouch Sources for {member.mention}**",
+            lambda after: store.vouch_page(ctx.guild.id, member.id, after),
+            format_rows,
+            f"❌ No vouch records found for {member.mention}"
+        )
+
+    @commands.hybrid_command()
+    @app_commands.describe(display="count, list, analytics or backfill", days="Days of history for analytics", member="Optional: analytics for one member")
+    async def vouchstats(self, ctx, display: str = "count", days: int = 7, member: discord.Member = None):
+        """View vouch statistics (count, list, analytics [days] [member], backfill)"""
+        display = display.lower()
+
+        if display == "analytics":
+            days = max(1, min(days, 90))
+            per_day, top_givers, top_receivers = get_vouch_analytics(ctx.guild.id, days, member.id if member else None)
+
+            def name(user_id):
+                found = ctx.guild.get_member(user_id)
+                return found.display_name if found else f"Unknown User ({user_id})"
+
+            peak = max((row['count'] for row in per_day), default=0)
+            lines = [f"📈 Vouches per day, last {days} days" + (f" for {member.mention}" if member else "") + ":"]
+            for row in per_day:
+                date = datetime.datetime.fromtimestamp(row['day'] * 86400, datetime.timezone.utc).strftime('%m-%d')
+                lines.append(f"`{date}` {'█' * max(1, round(10 * row['count'] / peak))} {row['count']}")
+            if not per_day:
+                lines.append("No vouches in this window.")
+            if not member:
+                lines.append("\n🏅 Top vouchers:")
+                lines.extend(f"{i}. {name(row['user_id'])}: {row['count']}" for i, row in enumerate(top_givers, 1))
+                lines.append("\n🏆 Most vouched:")
+                lines.extend(f"{i}. {name(row['user_id'])}: {row['count']}" for i, row in enumerate(top_receivers, 1))
+            return await ctx.send("\n".join(lines)[:2000])
+
+        if display == "backfill":
+            if not is_admin(ctx):
+                return await ctx.send("❌ Only admins can rebuild analytics!")
+            total = await asyncio.to_thread(backfill_vouch_rollups)
+            return await ctx.send(f"✅ Rebuilt daily rollups from {total} vouch records")
+
+        count = store.count_tracked(ctx.guild.id)
+
+        if display == "list":
+            if not is_admin(ctx):
+                return await ctx.send("❌ Only admins can view the full list!")
+
+            await send_paginated(
+                ctx, f"📊 Users with tracking ({count})",
+                lambda after: store.tracked_page(ctx.guild.id, after),
+                format_member_rows(ctx.guild),
+                "📊 No users have vouch tracking enabled"
+            )
+        else:
+            await ctx.send(f"📊 {count} users have vouch tracking enabled")
+
+    @commands.hybrid_command()
+    @app_commands.describe(limit="Number of users to display (default 10)", sort="Sort by count, trust or recent")
+    async def vouchboard(self, ctx, limit: int = 10, sort: str = "count"):
+        """Show top vouched members (sort by `count`, `trust` or `recent`)"""
+        sort = sort.lower()
+        if sort == "recent":
+            # Decayed scores are ranked by rank_key, so this walks idx_decayed_rank
+            top = db_fetchall("""
+            SELECT v.user_id, v.vouch_count, t.score, d.rank_key
+            FROM decayed_scores d
+            JOIN vouches v ON v.guild_id = d.guild_id AND v.user_id = d.user_id
+            LEFT JOIN trust_scores t ON t.guild_id = d.guild_id AND t.user_id = d.user_id
+            WHERE d.guild_id = ? AND v.tracking_enabled = 1
+            ORDER BY d.rank_key DESC
+            LIMIT ?
+            """, (ctx.guild.id, limit))
+        else:
+            order = "t.score DESC" if sort == "trust" else "v.vouch_count DESC"
+            top = db_fetchall(f"""
+            SELECT v.user_id, v.vouch_count, t.score, NULL AS rank_key
+            FROM vouches v
+            LEFT JOIN trust_scores t ON t.guild_id = v.guild_id AND t.user_id = v.user_id
+            WHERE v.guild_id = ? AND v.tracking_enabled = 1
+            ORDER BY {order}
+            LIMIT ?
+            """, (ctx.guild.id, limit))
+
+        now = time.time()
+        msg = "🏆 Top Vouched Members:\n" if sort != "recent" else "🏆 Top Vouched Members (recent activity weighted):\n"
+        for i, row in enumerate(top, 1):
+            if member := ctx.guild.get_member(row['user_id']):
+                trust = f" (trust {row['score']:.2f})" if row['score'] is not None else ""
+                # rank_key - DECAY_RATE * now is the log of the member's current decayed score
+                recent = f" (recent {math.exp(row['rank_key'] - DECAY_RATE * now):.1f})" if row['rank_key'] is not None else ""
+                msg += f"{i}. {member.display_name}: {row['vouch_count']}V{trust}{recent}\n"
+
+        await ctx.send(msg[:2000])
+
+    @commands.command(name="outbound")
+    @commands.check(is_admin)
+    async def outbound_metrics(self, ctx):
+        """[ADMIN] Show outbound API queue metrics per priority class"""
+        metrics = outbound.metrics()
+        lines = [f"📤 In flight: {metrics['in_flight']} • Paused buckets: {metrics['paused_buckets']}"]
+        for name, stats in metrics['classes'].items():
+            lines.append(
+                f"`{name}`: {stats['queued']} queued, {stats['in_flight']} running, "
+                f"{stats['completed']}/{stats['submitted']} done, {stats['failed']} failed "
+                f"({stats['rate_limited']} rate limited), avg wait {stats['avg_wait_ms']:.0f} ms"
+            )
+        await ctx.send("\n".join(lines))
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def locks(self, ctx):
+        """[ADMIN] Show per-member lock contention"""
+        metrics = member_locks.metrics()
+        lines = [
+            f"🔐 {metrics['acquired']} acquired, {metrics['contended']} waited "
+            f"({metrics['collisions']} behind another member on a shared stripe of {metrics['stripes']})",
+            f"⏳ Avg wait {metrics['avg_wait_ms']:.0f} ms, max {metrics['max_wait_ms']:.0f} ms, "
+            f"avg hold {metrics['avg_hold_ms']:.0f} ms • {metrics['busy']} held, {metrics['waiting']} waiting now",
+        ]
+        for (guild_id, member_id), count, waited in metrics['hot']:
+            if guild_id == ctx.guild.id:
+                lines.append(f"<@{member_id}>: waited {count}× for {waited:.0f} ms recently")
+        await ctx.send("\n".join(lines)[:2000])
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def looplag(self, ctx, seconds: int = 0):
+        """[ADMIN] Show event-loop lag and the worst stalls; profile the loop for N seconds if given"""
+        report = watchdog.report()
+        lines = [
+            f"⏱️ Loop lag over the last {report['samples']} heartbeats: p50 {report['p50'] * 1000:.0f} ms, "
+            f"p99 {report['p99'] * 1000:.0f} ms, max since start {report['max'] * 1000:.0f} ms",
+            f"🧱 {report['stalls']} stalls over {watchdog.threshold * 1000:.0f} ms since start",
+        ]
+        for entry in report['offenders']:
+            lines.append(
+                f"`{entry['culprit']}`: {entry['count']}×, worst {entry['worst'].duration * 1000:.0f} ms, "
+                f"total {entry['total'] * 1000:.0f} ms"
+            )
+        if report['offenders']:
+            worst = report['offenders'][0]['worst']
+            lines.append("Worst stall:\n```" + "\n".join(worst.stack[-10:])[:1000] + "```")
+        await ctx.send("\n".join(lines)[:2000])
+
+        if seconds <= 0:
+            return
+        seconds = min(seconds, MAX_PROFILE_SECONDS)
+        await ctx.send(f"🔬 Profiling the event loop for {seconds}s...")
+        try:
+            profile = await asyncio.to_thread(watchdog.profile, seconds)
+        except RuntimeError as e:
+            return await ctx.send(f"❌ {e}")
+        samples = sum(int(line.rsplit(" ", 1)[1]) for line in profile.splitlines())
+        await ctx.send(
+            f"🔬 {samples} stack samples over {seconds}s (collapsed stacks for flamegraph.pl or speedscope)",
+            file=discord.File(io.BytesIO(profile.encode()), "loop-profile.folded")
+        )
+
+    @commands.command()
+    @commands.check(is_admin)
+    async def memory(self, ctx, seconds: int = 0):
+        """[ADMIN] Show memory held by bot state and caches; diff allocations over N seconds if given"""
+        rss = process_rss()
+        lines = [f"🧠 Process RSS: {rss / 1024 ** 2:.1f} MiB" if rss is not None else "🧠 Process RSS: unavailable"]
+        lines.append("**Bot state** (entries, approx. size):")
+        lines.extend(
+            f"`{name}`: {entries}, {size / 1024:.1f} KiB" for name, entries, size in structure_sizes(self.bot)
+        )
+        lines.append("**discord.py caches:** " + ", ".join(f"{n} {name}" for name, n in cache_sizes(self.bot).items()))
+        await ctx.send("\n".join(lines)[:2000])
+
+        if seconds <= 0:
+            return
+        seconds = min(seconds, MAX_WINDOW_SECONDS)
+        await ctx.send(f"📸 Tracing allocations for {seconds}s...")
+        sites, listing = await allocation_diff(seconds)
+        if not sites:
+            return await ctx.send(f"✅ No allocation growth over {seconds}s")
+        await ctx.send(
+            f"📈 Top allocation growth over {seconds}s:\n```" + "\n".join(sites)[:1800] + "```",
+            file=discord.File(io.BytesIO(listing.encode()), "allocations.txt")
+        )
+
+
+async def setup(bot):
+    await bot.add_cog(Reporting(bot))
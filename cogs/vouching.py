@@ -0,0 +1,313 @@
+"""Core vouching: vouch commands, the vouch ticket button and member self-service."""
+import re
+import sqlite3
+import time
+import asyncio
+import datetime
+import functools
+
+import discord
+from discord import ui, app_commands, Interaction
+from discord.ext import commands
+
+from common import (
+    DECAY_HALF_LIFE_DAYS, get_decayed_score, get_displayed_vouches, get_trust_score, get_vouches, has_vouched,
+    is_admin, is_admin_member, is_tracking_enabled, is_unvouchable, member_locks, notify_admins, notify_ring_suspects,
+    outbound, queue_send, record_community_vouch, store, update_nickname,
+)
+from outbound import PRIORITY_DM, PRIORITY_REPLY
+from storage import DEFAULT_REASON
+
+
+class VouchModal(ui.Modal, title="Submit a Vouch"):
+    person_name = ui.TextInput(label="Person Name", placeholder="Their Discord name or mention", required=True)
+    reason = ui.TextInput(label="Reason", placeholder="Optional", required=False, style=discord.TextStyle.paragraph)
+
+    def __init__(self, cog, interaction):
+        super().__init__()
+        self.cog = cog
+        self.interaction = interaction
+
+    async def on_submit(self, interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        guild = interaction.guild
+        target = None
+        content = self.person_name.value.strip()
+
+        match = re.match(r'<@!?(\d+)>', content)
+        if match:
+            target_id = int(match.group(1))
+            target = guild.get_member(target_id)
+        else:
+            for member in guild.members:
+                if member.name.lower() == content.lower():
+                    target = member
+                    break
+
+        if not target:
+            return await interaction.followup.send(f"❌ Could not find user `{content}` in this server.", ephemeral=True)
+
+        # Prevent self-vouch
+        if interaction.user.id == target.id:
+            return await interaction.followup.send("❌ You can't vouch yourself!", ephemeral=True)
+
+        # prevent double vouching
+        if has_vouched(guild.id, interaction.user.id, target.id):
+            return await interaction.followup.send("❌ You've already vouched this user!", ephemeral=True)
+
+        reason = self.reason.value.strip() or DEFAULT_REASON
+        async def reply(content=None, **kwargs):
+            return await outbound.submit(
+                PRIORITY_REPLY, ("interaction", interaction.id),
+                lambda: interaction.followup.send(content, ephemeral=True, **kwargs)
+            )
+        await self.cog.process_vouch(interaction.user, guild, target, reason, reply)
+
+
+class VouchButtonView(discord.ui.View):
+    def __init__(self, cog):
+        super().__init__(timeout=None)
+        self.cog = cog
+
+    @discord.ui.button(label="Submit A Vouch", style=discord.ButtonStyle.primary, emoji="🎟️",custom_id="submit_vouch_button")
+    async def submit_vouch_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(VouchModal(self.cog, interaction))
+
+
+class Vouching(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        # Re-registering the persistent view points existing buttons at the reloaded code
+        self.bot.add_view(VouchButtonView(self))
+
+    def release_vouch_spam(self, user_id):
+        """Drop one recent vouch from a user's anti-spam counter"""
+        if user_id in self.bot.vouch_spam:
+            self.bot.vouch_spam[user_id] -= 1
+            if self.bot.vouch_spam[user_id] <= 0:
+                del self.bot.vouch_spam[user_id]
+
+    async def process_vouch(self, author, guild, member, reason, send):
+        """Shared vouch pipeline for !vouch, /vouch and the vouch modal; replies go through send()"""
+        vouch_spam = self.bot.vouch_spam
+        try:
+            admin = is_admin_member(guild, author)
+
+            # Anti-spam check
+            if not admin:
+                if vouch_spam.get(author.id, 0) >= 3:
+                    return await send("❌ You're vouching too fast!")
+                vouch_spam[author.id] = vouch_spam.get(author.id, 0) + 1
+                asyncio.get_running_loop().call_later(60, self.release_vouch_spam, author.id)
+
+                # Cooldown check
+                last_vouch_time = store.get_last_vouch_time(guild.id, author.id)
+                if last_vouch_time:
+                    remaining = 180 - (time.time() - last_vouch_time)
+                    if remaining > 0:
+                        return await send(f"❌ You can vouch again in {int(remaining // 60)} minutes and {int(remaining % 60)} seconds!")
+
+            # Checks, write and nickname run under the member's lock so concurrent
+            # vouches and admin changes to the same member take turns
+            async with member_locks.hold(guild.id, member.id):
+                # Original validations
+                if not admin:
+                    if author == member:
+                        return await send("❌ You can't vouch yourself!")
+                    if has_vouched(guild.id, author.id, member.id):
+                        return await send("❌ You already vouched them!")
+                    if is_unvouchable(guild.id, member.id):
+                        return await send("❌ This user is unvouchable!")
+                    if not is_tracking_enabled(guild.id, member.id):
+                        return await send("❌ User hasn't enabled tracking!")
+
+                # Process vouch
+                if admin:
+                    new_count = store.adjust_vouches(guild.id, member.id, 1, author.id, int(time.time()))
+                    if new_count is None:
+                        return await send("❌ Database error!")
+                else:
+                    timestamp = int(time.time())
+                    try:
+                        new_count = await record_community_vouch(guild.id, author.id, member.id, reason, timestamp)
+                    except sqlite3.IntegrityError:
+                        return await send("❌ You already vouched them!")
+                    except sqlite3.Error as e:
+                        print(f"Database error: {e}")
+                        return await send("❌ Database error!")
+
+                # Confirm as soon as the vouch is stored; the rest is follow-up work
+                await send(f"✅ {member.mention} now has {new_count} vouches! Reason: {reason[:50]}")
+
+                await update_nickname(member)
+
+            if not admin:
+                findings = self.bot.add_vouch_edge(guild.id, author.id, member.id, timestamp)
+                if findings:
+                    await notify_ring_suspects(guild, findings)
+
+            # ============================================
+            # NEW: Send DM notification to the vouched user
+            # ============================================
+            try:
+                embed = discord.Embed(
+                    title="🎉 You've received a vouch!",
+                    description=f"**{author.display_name}** vouched for you in {guild.name}",
+                    color=discord.Color.green()
+                )
+                embed.add_field(name="Reason", value=reason[:1024], inline=False)
+                embed.add_field(name="Total Vouches", value=new_count)
+                embed.set_footer(text=f"Vouched at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+                await queue_send(PRIORITY_DM, member, embed=embed)
+            except discord.Forbidden:
+                # User has DMs disabled or blocked the bot - silently fail
+                pass
+            except Exception as e:
+                print(f"Failed to send vouch DM: {e}")
+            # ============================================
+
+        except Exception as e:
+            await send("❌ Failed to process vouch. Please try again.")
+            print(f"Vouch error: {e}")
+
+    @commands.hybrid_command(extras={"ephemeral": True})
+    @app_commands.describe(member="Who are you vouching for?", reason="Why are you vouching them?")
+    async def vouch(self, ctx, member: discord.Member, *, reason: str = DEFAULT_REASON):
+        """Vouch for a user (now with cooldown, reason, and DM notification)"""
+        await self.process_vouch(ctx.author, ctx.guild, member, reason, functools.partial(ctx.send, ephemeral=True))
+
+    @commands.hybrid_command(extras={"ephemeral": True})
+    @commands.check(is_admin)
+    async def setupvouchticket(self, ctx):
+        """[ADMIN] Set up the Submit A Vouch button in this channel."""
+        view = VouchButtonView(self)
+        await ctx.channel.send("📝 Click below to submit a vouch!", view=view)
+        await ctx.send("✅ Vouch ticket system is ready.")
+
+    @commands.command()
+    async def checkunvouchable(self, ctx, member: discord.Member = None):
+        """Check if a user is unvouchable"""
+        target = member or ctx.author
+        status = "🔒 UNVOUCHABLE" if is_unvouchable(ctx.guild.id, target.id) else "🔓 Vouchable"
+        await ctx.send(f"{target.mention}: {status}")
+
+    @commands.hybrid_command(extras={"ephemeral": True})
+    async def enablevouch(self, ctx):
+        """Enable vouch tracking"""
+        async with member_locks.hold(ctx.guild.id, ctx.author.id):
+            if not store.set_tracking(ctx.guild.id, ctx.author.id, True):
+                return await ctx.send("❌ Database error!")
+            await update_nickname(ctx.author)
+        await ctx.send(f"✅ Vouch tracking enabled for {ctx.author.mention}!")
+
+    @commands.hybrid_command(extras={"ephemeral": True})
+    async def disablevouch(self, ctx):
+        """Disable vouch tracking"""
+        async with member_locks.hold(ctx.guild.id, ctx.author.id):
+            if not store.set_tracking(ctx.guild.id, ctx.author.id, False):
+                return await ctx.send("❌ Database error!")
+            await update_nickname(ctx.author)
+        await ctx.send(f"✅ Vouch tracking disabled for {ctx.author.mention}!")
+
+    @commands.hybrid_command(extras={"ephemeral": True})
+    async def myvouches(self, ctx):
+        """Check your own vouch count and status"""
+        count = get_vouches(ctx.guild.id, ctx.author.id)
+        last_vouch_time = store.get_last_vouch_time(ctx.guild.id, ctx.author.id)
+
+        msg = f"You have {count} legitimate vouches"
+        if last_vouch_time:
+            remaining = max(0, 180 - (time.time() - last_vouch_time))
+            if remaining > 0:
+                msg += f"\n⏳ You can vouch again in {int(remaining // 60)}m {int(remaining % 60)}s"
+
+        await ctx.send(msg)
+
+    @commands.hybrid_command()
+    @app_commands.describe(member="Optional: check another member's vouch status")
+    async def verify(self, ctx, member: discord.Member = None):
+        """Verify vouch count with admin vouch context"""
+        target = member or ctx.author
+
+        # 1. Get all data in one query
+        data = store.verify_summary(ctx.guild.id, target.id)
+        trust_score = get_trust_score(ctx.guild.id, target.id)
+        recent_score = get_decayed_score(ctx.guild.id, target.id)
+
+        # 2. Parse data
+        vouch_count = data['vouch_count'] if data else 0
+        total_vouches = data['total_vouches'] if data else 0
+        admin_vouches = data['admin_vouches'] if data else 0
+        tracking_enabled = data['tracking_enabled'] if data else False
+        is_unvouchable = data['is_unvouchable'] if data else False
+        admin_adjustments = data['adjustments'] if data else 0
+        last_adjustment_time = data['last_adjustment_time'] if data else 0
+
+        community_vouches = total_vouches - admin_vouches
+
+        # 3. Check nickname tags
+        displayed_vouches = get_displayed_vouches(target.display_name)
+
+        # 4. Build response
+        response = [
+            f"**Verification for {target.mention}**",
+            f"• Displayed: {displayed_vouches}V",
+            f"• Database: {vouch_count} vouches",
+            f"┣ Community: {community_vouches}",
+            f"┣ Admin: {admin_vouches}",
+            f"┗ Adjustments: {admin_adjustments:+d}",
+        ]
+        if trust_score is not None:
+            response.append(f"• Trust score: {trust_score:.2f} (1.00 = average)")
+        if recent_score is not None:
+            response.append(f"• Recency score: {recent_score:.1f} (vouches halve in weight every {DECAY_HALF_LIFE_DAYS} days)")
+
+        # 5. Determine status
+        if is_unvouchable:
+            status = "🔒 UNVOUCHABLE"
+        elif not tracking_enabled:
+            status = "⚙️ TRACKING OFF"
+        elif displayed_vouches > vouch_count:
+            status = "🚨 FAKE TAGS"
+            await notify_admins(ctx.guild, target,
+                f"⚠️ Fake Tags Detected\n"
+                f"Shows: {displayed_vouches}V\n"
+                f"Actual: {vouch_count} vouches"
+            )
+        elif admin_adjustments != 0:
+            # Differentiate between recent admin actions and old adjustments
+            days_since_adjustment = (time.time() - last_adjustment_time)/86400 if last_adjustment_time else 999
+
+            if days_since_adjustment < 7:  # Recent admin action
+                status = f"🛡️ {admin_adjustments:+d} ADMIN-SET (Recent)"
+                response.append(f"• Last adjusted: {days_since_adjustment:.1f} days ago")
+            else:  # Historical/admin-approved
+                status = f"🛡️ {admin_adjustments:+d} ADMIN-SET (Legacy)"
+        else:
+            status = "✅ VERIFIED"
+
+        response.append(f"• Status: {status}")
+        await ctx.send("\n".join(response))
+
+    @app_commands.command(name="help", description="List available commands")
+    async def slash_help(self, interaction: Interaction):
+        help_text = (
+            "**🛠️ Available Commands:**\n\n"
+            "• `/vouch` — Vouch for a user\n"
+            "• `/enablevouch` — Enable vouch tracking\n"
+            "• `/disablevouch` — Disable vouch tracking\n"
+            "• `/myvouches` — View your vouch count and cooldown\n"
+            "• `/verify` — Check vouch authenticity and status\n"
+            "• `/setconfig` — Configure bot (Server Owner only)\n"
+            "• `/setupvouchticket` — Post the vouch ticket button (Admins only)\n"
+            "\nType the slash `/` to see full autocomplete!"
+        )
+        await interaction.response.send_message(help_text, ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(Vouching(bot))
@@ -0,0 +1,793 @@
+"""Shared state and helpers used by every cog.
+
+This module is imported once and is not reloaded with the extensions, so it
+holds everything that must outlive a `!reload`: the database store and its
+write coalescer, the WAL archiver, the outbound scheduler, the loop watchdog, and helpers that
+more than one cog needs. Cog-specific code belongs in the cog.
+"""
+import asyncio
+import collections
+import re
+import math
+import sqlite3
+import time
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import discord
+
+from storage import (
+    PAGE_SIZE, UNASSIGNED_GUILD, ReadModelStore, SQLiteStore, WriteCoalescer, keyset_page, partition_by_guild,
+)
+from outbound import OutboundScheduler, PRIORITY_ALERT, PRIORITY_DM
+from loopwatch import LoopWatchdog
+from memberlocks import MemberLocks
+from walarchive import WAL_ARCHIVE_DIR, WalArchiver
+
+ADMIN_ALERTS_CHANNEL_ID = 1354897882271977744
+
+# The schema is created and the read model warmed by open_database() from the
+# bot's setup hook, not at import
+store = ReadModelStore(SQLiteStore("vouches.db", init=False))
+# Vouch bursts (giveaways, trade events) share one transaction per few milliseconds
+vouch_writes = WriteCoalescer(store)
+# Continuous point-in-time archive when VOUCH_WAL_ARCHIVE is set; started in the bot's setup hook
+wal_archiver = WalArchiver(store.engine, WAL_ARCHIVE_DIR) if WAL_ARCHIVE_DIR else None
+outbound = OutboundScheduler()  # Priority queue for every outbound API call
+watchdog = LoopWatchdog()  # Event-loop lag and stall stacks; started in the bot's setup hook
+member_locks = MemberLocks()  # Serializes mutations of one member's rows and nickname
+bot_nick_edits = {}  # (guild_id, member_id) -> deque of (nickname the bot set, expiry), oldest first
+compute_pool = None  # Worker process for CPU-bound work, created by run_in_process on first use
+
+def use_database(path):
+    """compute_pool initializer: point the worker's store at the bot's database"""
+    store.engine.path = path
+
+async def run_in_process(func, *args):
+    """Run CPU-bound pure-Python work in the worker process and return its result.
+
+    A thread would still hold the GIL through long C-level list and sort
+    calls and stall the event loop; a process cannot. `func`, its arguments
+    and its result must pickle. The worker is spawned, not forked, so it
+    never inherits locks held by the bot's other threads.
+    """
+    global compute_pool
+    if compute_pool is None:
+        compute_pool = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+            initializer=use_database, initargs=(store.engine.path,),
+        )
+    return await asyncio.get_running_loop().run_in_executor(compute_pool, func, *args)
+
+# Admin channel configuration
+
+def get_staff_channel(guild):
+    staff_channel_id, _ = get_config(guild.id)
+    return guild.get_channel(staff_channel_id)
+
+def get_config(guild_id):
+    return store.get_config(guild_id)
+
+
+# Database setup with error handling
+def get_db():
+    return store.connect()
+
+# SQLite-only analytics tables, partitioned by guild like the core tables
+ANALYTICS_TABLES = {
+    # Daily rollups for analytics, keyed by UTC day number (timestamp // 86400)
+    "vouch_daily_received": """
+    CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER,
+        day INTEGER,
+        count INTEGER DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id, day)
+    )
+    """,
+    "vouch_daily_given": """
+    CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER,
+        day INTEGER,
+        count INTEGER DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id, day)
+    )
+    """,
+    # Recency-weighted vouch scores as (value at last_update, last_update);
+    # rank_key orders members by their current score (see decay_rank_key)
+    "decayed_scores": """
+    CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        value REAL NOT NULL,
+        last_update INTEGER NOT NULL,
+        rank_key REAL NOT NULL,
+        PRIMARY KEY (guild_id, user_id)
+    ) WITHOUT ROWID
+    """,
+    # Cached graph-weighted trust scores (1.0 = average member of the guild)
+    "trust_scores": """
+    CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER,
+        score REAL,
+        computed_at INTEGER,
+        PRIMARY KEY (guild_id, user_id)
+    )
+    """,
+}
+
+def init_db():
+    """Create the SQLite-only analytics and job tables (core tables belong to the store)"""
+    with get_db() as conn:
+        partition_by_guild(conn, ANALYTICS_TABLES)
+        for name, create in ANALYTICS_TABLES.items():
+            conn.execute(create.format(name=name))
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_received_day ON vouch_daily_received(guild_id, day)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_given_day ON vouch_daily_given(guild_id, day)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_decayed_rank ON decayed_scores(guild_id, rank_key)")
+        # Bulk admin jobs; members are walked in ID order and `cursor` is the last one finished
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER,
+            message_id INTEGER,
+            started_by INTEGER,
+            status TEXT DEFAULT 'queued',
+            cursor INTEGER DEFAULT 0,
+            done INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            updated INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            created_at INTEGER,
+            finished_at INTEGER
+        )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_guild ON jobs(guild_id, job_id)")
+        # Small key/value facts the bot keeps across restarts (e.g. the synced command fingerprint)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS bot_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """)
+
+def open_database():
+    """Create or migrate every table and warm the read model; called once before any extension loads"""
+    store.init_schema()
+    init_db()
+    seconds = store.warm()
+    usage = store.memory_usage()
+    print(f"Warmed read model: {usage['users']} users, {usage['vouches']} vouches in {usage['guilds']} guilds, "
+          f"{usage['bytes'] / 1024:.0f} KiB in {seconds:.2f}s")
+
+# Database operations with error handling
+def db_execute(query, params=()):
+    try:
+        with get_db() as conn:
+            conn.execute(query, params)
+        return True
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return False
+
+def db_fetchone(query, params=()):
+    try:
+        with get_db() as conn:
+            return conn.execute(query, params).fetchone()
+    except sqlite3.Error:
+        return None
+
+def db_fetchall(query, params=()):
+    try:
+        with get_db() as conn:
+            return conn.execute(query, params).fetchall()
+    except sqlite3.Error:
+        return []
+
+def get_meta(key):
+    row = db_fetchone("SELECT value FROM bot_meta WHERE key = ?", (key,))
+    return row[0] if row else None
+
+def set_meta(key, value):
+    return db_execute("""
+        INSERT INTO bot_meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (key, value))
+
+def has_unassigned_rows():
+    """True while data from before guild partitioning is waiting for a guild to claim it"""
+    row = db_fetchone("""
+        SELECT EXISTS(SELECT 1 FROM vouches WHERE guild_id = ?)
+            OR EXISTS(SELECT 1 FROM vouch_records WHERE guild_id = ?)
+            OR EXISTS(SELECT 1 FROM unvouchable_users WHERE guild_id = ?)
+    """, (UNASSIGNED_GUILD,) * 3)
+    return bool(row and row[0])
+
+async def claim_unassigned_rows(guild_id):
+    """Move pre-partitioning data, analytics included, into one guild; returns rows moved"""
+    moved = await asyncio.to_thread(claim_unassigned_tables, guild_id)
+    await store.refresh()
+    return moved
+
+def claim_unassigned_tables(guild_id):
+    """The database half of claim_unassigned_rows; safe to run off the loop"""
+    moved = store.engine.claim_unassigned(guild_id)
+    try:
+        with get_db() as conn:
+            conn.execute("BEGIN")
+            for name in ANALYTICS_TABLES:
+                moved += conn.execute(
+                    f"UPDATE OR IGNORE {name} SET guild_id = ? WHERE guild_id = ?", (guild_id, UNASSIGNED_GUILD)
+                ).rowcount
+            conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+    refresh_decayed_scores(guild_id)
+    return moved
+
+# Core functions
+def is_admin_member(guild, member):
+    _, admin_roles_id = get_config(guild.id)
+    return any(role.id in admin_roles_id for role in member.roles)
+
+def is_admin(ctx):
+    return is_admin_member(ctx.guild, ctx.author)
+
+def is_guild_owner(ctx):
+    return ctx.guild is not None and ctx.author.id == ctx.guild.owner_id
+
+NICK_TAG_PATTERN = re.compile(r'(\s*[\[]([^\]\]]*)[\]]\s*)|(\s*［([^］］]*)］\s*)')
+NICK_BRACKETS = ("[", "]", "［", "］")
+DISPLAYED_VOUCHES_PATTERN = re.compile(r'[\[［](\d+)V[\]］,]')
+
+def strip_brackets(text):
+    """Remove any orphaned bracket characters"""
+    for bracket in NICK_BRACKETS:
+        text = text.replace(bracket, "")
+    return text.strip()
+
+def clean_nickname(nick):
+    """Remove ALL vouch tags while preserving special characters"""
+    if not nick:
+        return nick
+
+    # This pattern handles all bracket types safely
+    clean = NICK_TAG_PATTERN.sub('', str(nick)).strip()
+
+    # Remove any remaining orphaned brackets
+    return strip_brackets(clean)
+
+@functools.lru_cache(maxsize=4096)
+def render_nickname(display_name, username, vouches, unvouchable):
+    """Pure nickname renderer: same inputs always give the same tagged nickname"""
+    # More robust cleaning with fallbacks
+    base_name = clean_nickname(display_name) or ""
+
+    # Double-check cleaning worked
+    if not base_name.strip() or any(bracket in base_name for bracket in NICK_BRACKETS):
+        base_name = username  # Fallback to pure username
+
+    # Final sanitization
+    base_name = strip_brackets(base_name)
+    if not base_name:  # Ultimate fallback
+        base_name = username
+
+    # Build new tags
+    new_tags = []
+    if vouches > 0:
+        new_tags.append(f"{vouches}V")
+    if unvouchable:
+        new_tags.append("unvouchable")
+
+    # Construct new nickname
+    new_nick = f"{base_name} [{', '.join(new_tags)}]" if new_tags else base_name
+    return new_nick.replace("[", "［").replace("]", "］")[:32]
+
+def get_displayed_vouches(display_name):
+    """Parse the vouch count shown in a nickname tag (0 if none)"""
+    match = DISPLAYED_VOUCHES_PATTERN.search(display_name or "")
+    return int(match.group(1)) if match else 0
+
+def build_nickname_plan(guild):
+    """Compute target nicknames for every tracked member from one bulk query.
+
+    Returns (changes, tracked) where changes is a list of (member, new_nick)
+    for members whose nickname actually differs.
+    """
+    changes = []
+    tracked = 0
+    for user_id, vouch_count, unvouchable in store.tracked_states(guild.id):
+        member = guild.get_member(user_id)
+        if not member:
+            continue
+        tracked += 1
+        new_nick = render_nickname(member.display_name, member.name, vouch_count, unvouchable)
+        if new_nick != member.display_name:
+            changes.append((member, new_nick))
+    return changes, tracked
+
+def queue_send(priority, target, *args, **kwargs):
+    """Send to a channel or user through the outbound scheduler"""
+    bucket = ("dm", target.id) if isinstance(target, (discord.User, discord.Member)) else ("channel", target.id)
+    return outbound.submit(priority, bucket, lambda: target.send(*args, **kwargs))
+
+NICK_ECHO_TTL = 120  # Seconds to wait for the member_update echoing one of our nickname edits
+
+def expect_nick_echo(key, nick):
+    """Remember a nickname the bot is setting; returns the entry for forget_nick_echo"""
+    now = time.monotonic()
+    for other in list(bot_nick_edits):
+        pending = bot_nick_edits[other]
+        while pending and pending[0][1] <= now:
+            pending.popleft()
+        if not pending:
+            del bot_nick_edits[other]
+    entry = (nick, now + NICK_ECHO_TTL)
+    bot_nick_edits.setdefault(key, collections.deque()).append(entry)
+    return entry
+
+def forget_nick_echo(key, entry):
+    pending = bot_nick_edits.get(key)
+    if pending and entry in pending:
+        pending.remove(entry)
+        if not pending:
+            del bot_nick_edits[key]
+
+def is_nick_echo(key, nick):
+    """True if a nickname change is one of our own edits, consuming it and any older edits it superseded"""
+    pending = bot_nick_edits.get(key)
+    if not pending:
+        return False
+    now = time.monotonic()
+    for index, (expected, expires) in enumerate(pending):
+        if expected == nick and expires > now:
+            for _ in range(index + 1):
+                pending.popleft()
+            if not pending:
+                del bot_nick_edits[key]
+            return True
+    return False
+
+async def edit_nickname(member, nick, priority=PRIORITY_DM):
+    """Edit a nickname, remembering it so on_member_update ignores our own change"""
+    key = (member.guild.id, member.id)
+    # An edit that keeps the displayed name sends no member_update to wait for
+    entry = expect_nick_echo(key, nick) if nick != member.display_name else None
+    try:
+        await outbound.submit(priority, ("members", member.guild.id), lambda: member.edit(nick=nick))
+    except Exception:
+        if entry:
+            forget_nick_echo(key, entry)
+        raise
+
+async def sync_nickname(member, priority=PRIORITY_DM):
+    """Bring a tracked member's nickname in line with the database; True if it was edited"""
+    tracking, vouch_count, unvouchable = get_nickname_state(member.guild.id, member.id)
+    if not tracking:
+        return False
+    new_nick = render_nickname(member.display_name, member.name, vouch_count, unvouchable)
+    if new_nick == member.display_name:
+        return False
+    await edit_nickname(member, new_nick, priority)
+    return True
+
+async def update_nickname(member):
+    """Atomic nickname update with verification"""
+    try:
+        await sync_nickname(member)
+    except Exception as e:
+        print(f"Nickname update failed for {member.display_name}: {str(e)}")
+
+
+def get_vouches(guild_id, user_id):
+    return store.get_vouches(guild_id, user_id)
+
+def is_tracking_enabled(guild_id, user_id):
+    return store.is_tracking_enabled(guild_id, user_id)
+
+def is_unvouchable(guild_id, user_id):
+    return store.is_unvouchable(guild_id, user_id)
+
+def has_vouched(guild_id, voucher_id, vouched_id):
+    return store.has_vouched(guild_id, voucher_id, vouched_id)
+
+def get_nickname_state(guild_id, user_id):
+    """Return (tracking_enabled, vouch_count, is_unvouchable) in one query"""
+    return store.get_nickname_state(guild_id, user_id)
+
+def get_trust_score(guild_id, user_id):
+    row = db_fetchone("SELECT score FROM trust_scores WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
+    return row[0] if row else None
+
+# Daily rollups record vouch activity as it happens, so clearing vouches
+# later does not rewrite history
+def bump_vouch_rollup(conn, guild_id, voucher_id, vouched_id, timestamp):
+    """Count one vouch in the daily rollup tables (on the caller's transaction)"""
+    day = timestamp // 86400
+    for table, user_id in (("vouch_daily_received", vouched_id), ("vouch_daily_given", voucher_id)):
+        conn.execute(f"""
+        INSERT INTO {table} (guild_id, user_id, day, count) VALUES (?, ?, ?, 1)
+        ON CONFLICT(guild_id, user_id, day) DO UPDATE SET count = count + 1
+        """, (guild_id, user_id, day))
+
+# Recency-weighted scores: a vouch is worth 1 when given and its weight halves
+# every DECAY_HALF_LIFE_DAYS. A member's score is stored as the value it had
+# at last_update, so each new vouch folds in with O(1) work and reads decay
+# it to the present lazily. Since every score decays at the same rate,
+# ln(value) + DECAY_RATE * last_update ranks members by their current score
+# at any moment, and the leaderboard reads straight off an index.
+DECAY_HALF_LIFE_DAYS = 180
+DECAY_RATE = math.log(2) / (DECAY_HALF_LIFE_DAYS * 86400)
+
+def decay_add(value, last_update, timestamp):
+    """Fold one vouch given at `timestamp` into a (value, last_update) pair"""
+    if value is None:
+        return 1.0, timestamp
+    if timestamp >= last_update:
+        return value * math.exp(-DECAY_RATE * (timestamp - last_update)) + 1.0, timestamp
+    # A vouch older than the pair (backfills, out-of-order commits) is decayed up to last_update
+    return value + math.exp(-DECAY_RATE * (last_update - timestamp)), last_update
+
+def decay_rank_key(value, last_update):
+    return math.log(value) + DECAY_RATE * last_update
+
+def decayed_value(value, last_update, now=None):
+    """A stored (value, last_update) pair evaluated at `now`"""
+    return value * math.exp(-DECAY_RATE * max(0, (now or time.time()) - last_update))
+
+def bump_decayed_score(conn, guild_id, user_id, timestamp):
+    """Fold one received vouch into a member's decayed score (on the caller's transaction)"""
+    row = conn.execute(
+        "SELECT value, last_update FROM decayed_scores WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+    ).fetchone()
+    value, last_update = decay_add(*(row or (None, None)), timestamp)
+    conn.execute("""
+    INSERT INTO decayed_scores (guild_id, user_id, value, last_update, rank_key) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        value = excluded.value, last_update = excluded.last_update, rank_key = excluded.rank_key
+    """, (guild_id, user_id, value, last_update, decay_rank_key(value, last_update)))
+
+def refresh_decayed_scores(guild_id=None, user_id=None):
+    """Recompute decayed scores from vouch records for one member, one guild or everything.
+
+    Only needed when records are removed or moved; new vouches go through bump_decayed_score.
+    """
+    score_scope = record_scope = ""
+    params = ()
+    if guild_id is not None:
+        score_scope = record_scope = " AND guild_id = ?"
+        params = (guild_id,)
+        if user_id is not None:
+            score_scope += " AND user_id = ?"
+            record_scope += " AND vouched_id = ?"
+            params += (user_id,)
+    try:
+        with get_db() as conn:
+            conn.execute("BEGIN")
+            conn.execute(f"DELETE FROM decayed_scores WHERE 1{score_scope}", params)
+            scores = {}
+            records = conn.execute(f"""
+                SELECT guild_id, vouched_id AS user_id, timestamp FROM vouch_records
+                WHERE timestamp > 0{record_scope}
+            """, params)
+            for row_guild, row_user, timestamp in records:
+                key = (row_guild, row_user)
+                scores[key] = decay_add(*scores.get(key, (None, None)), timestamp)
+            conn.executemany(
+                "INSERT INTO decayed_scores (guild_id, user_id, value, last_update, rank_key) VALUES (?, ?, ?, ?, ?)",
+                [(*key, value, last_update, decay_rank_key(value, last_update))
+                 for key, (value, last_update) in scores.items()]
+            )
+            conn.execute("COMMIT")
+            return len(scores)
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return 0
+
+def decayed_scores_need_backfill():
+    """True when records exist but decayed scores have never been computed"""
+    row = db_fetchone("""
+        SELECT NOT EXISTS(SELECT 1 FROM decayed_scores)
+           AND EXISTS(SELECT 1 FROM vouch_records WHERE timestamp > 0)
+    """)
+    return bool(row and row[0])
+
+def get_decayed_score(guild_id, user_id):
+    row = db_fetchone(
+        "SELECT value, last_update FROM decayed_scores WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+    )
+    return decayed_value(row[0], row[1]) if row else None
+
+def write_community_vouch(conn, guild_id, voucher_id, vouched_id, reason, timestamp):
+    """Record, count, cooldown, rollups and decayed score for one vouch; runs inside a group commit"""
+    new_count = store.write_vouch(conn, guild_id, voucher_id, vouched_id, reason, timestamp)
+    bump_vouch_rollup(conn, guild_id, voucher_id, vouched_id, timestamp)
+    bump_decayed_score(conn, guild_id, vouched_id, timestamp)
+    return new_count
+
+async def record_community_vouch(guild_id, voucher_id, vouched_id, reason, timestamp):
+    """Group-commit one community vouch, then apply it to the read model; returns the new count"""
+    new_count = await vouch_writes.submit(write_community_vouch, guild_id, voucher_id, vouched_id, reason, timestamp)
+    store.vouch_recorded(guild_id, voucher_id, vouched_id, new_count)
+    return new_count
+
+def backfill_vouch_rollups():
+    """Rebuild the daily rollups from existing vouch_records timestamps"""
+    with get_db() as conn:
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM vouch_daily_received")
+        conn.execute("DELETE FROM vouch_daily_given")
+        conn.execute("""
+        INSERT INTO vouch_daily_received (guild_id, user_id, day, count)
+        SELECT guild_id, vouched_id, timestamp / 86400, COUNT(*) FROM vouch_records
+        WHERE timestamp > 0 GROUP BY guild_id, vouched_id, timestamp / 86400
+        """)
+        conn.execute("""
+        INSERT INTO vouch_daily_given (guild_id, user_id, day, count)
+        SELECT guild_id, voucher_id, timestamp / 86400, COUNT(*) FROM vouch_records
+        WHERE timestamp > 0 GROUP BY guild_id, voucher_id, timestamp / 86400
+        """)
+        conn.execute("COMMIT")
+        return conn.execute("SELECT COALESCE(SUM(count), 0) FROM vouch_daily_received").fetchone()[0]
+
+def fill_missing_timestamps(guild_id, timestamp):
+    """Stamp a guild's undated records with `timestamp` and count them in that day's rollups; returns rows fixed.
+
+    Undated records were never in the rollups, so they are added rather than
+    rebuilding the guild's history. Decayed scores are recomputed afterwards.
+    """
+    try:
+        with get_db() as conn:
+            conn.execute("BEGIN")
+            for table, column in (("vouch_daily_received", "vouched_id"), ("vouch_daily_given", "voucher_id")):
+                conn.execute(f"""
+                INSERT INTO {table} (guild_id, user_id, day, count)
+                SELECT guild_id, {column}, ?, COUNT(*) FROM vouch_records
+                WHERE guild_id = ? AND (timestamp = 0 OR timestamp IS NULL) GROUP BY {column}
+                ON CONFLICT(guild_id, user_id, day) DO UPDATE SET count = count + excluded.count
+                """, (timestamp // 86400, guild_id))
+            fixed = conn.execute("""
+                UPDATE vouch_records SET timestamp = ?
+                WHERE guild_id = ? AND (timestamp = 0 OR timestamp IS NULL)
+            """, (timestamp, guild_id)).rowcount
+            conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return 0
+    if fixed:
+        refresh_decayed_scores(guild_id)
+    return fixed
+
+def rollups_need_backfill():
+    """True when records exist but the rollups have never been filled"""
+    row = db_fetchone("""
+        SELECT NOT EXISTS(SELECT 1 FROM vouch_daily_received)
+           AND EXISTS(SELECT 1 FROM vouch_records WHERE timestamp > 0)
+    """)
+    return bool(row and row[0])
+
+def get_vouch_analytics(guild_id, days, member_id=None):
+    """Read a guild's per-day totals and top members for the last `days` days from rollups only"""
+    since = int(time.time()) // 86400 - days + 1
+    if member_id is None:
+        per_day = db_fetchall("""
+            SELECT day, SUM(count) AS count FROM vouch_daily_received
+            WHERE guild_id = ? AND day >= ? GROUP BY day ORDER BY day
+        """, (guild_id, since))
+    else:
+        per_day = db_fetchall("""
+            SELECT day, count FROM vouch_daily_received
+            WHERE guild_id = ? AND user_id = ? AND day >= ? ORDER BY day
+        """, (guild_id, member_id, since))
+    top = {}
+    for table in ("vouch_daily_given", "vouch_daily_received"):
+        top[table] = db_fetchall(f"""
+            SELECT user_id, SUM(count) AS count FROM {table}
+            WHERE guild_id = ? AND day >= ? GROUP BY user_id ORDER BY count DESC LIMIT 5
+        """, (guild_id, since))
+    return per_day, top["vouch_daily_given"], top["vouch_daily_received"]
+
+def fts_query(text):
+    """Quote each search term so user input can't break FTS5 syntax"""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+def search_vouch_reasons(guild_id, query, member_id=None, since=None, offset=0, limit=PAGE_SIZE):
+    """One page of a guild's reasons matching `query`, best matches first"""
+    filters = " AND r.guild_id = ?"
+    params = [fts_query(query), guild_id]
+    if member_id is not None:
+        filters += " AND r.vouched_id = ?"
+        params.append(member_id)
+    if since is not None:
+        filters += " AND v.timestamp >= ?"
+        params.append(since)
+    rows = db_fetchall(f"""
+        SELECT r.voucher_id, r.vouched_id, v.timestamp,
+               snippet(vouch_reasons_fts, 0, '**', '**', '…', 12) AS excerpt
+        FROM vouch_reasons_fts f
+        JOIN vouch_reasons r ON r.reason_id = f.rowid
+        JOIN vouch_records v ON v.guild_id = r.guild_id AND v.vouched_id = r.vouched_id AND v.voucher_id = r.voucher_id
+        WHERE vouch_reasons_fts MATCH ?{filters}
+        ORDER BY f.rank
+        LIMIT ? OFFSET ?
+    """, (*params, limit + 1, offset))
+    # Ranked results page by offset; the key is where the next page starts
+    return keyset_page(rows, limit, lambda row: offset + limit)
+
+class AdminActionView(discord.ui.View):
+    def __init__(self, member_id):
+        super().__init__(timeout=None)  # Persistent
+        self.member_id = member_id
+        self.action_taken = False
+        self.action_by = None
+
+        # Add buttons with proper custom IDs
+        self.add_item(AdminActionButton("confirm"))
+        self.add_item(AdminActionButton("reject"))
+
+    async def disable_all_buttons(self, interaction: discord.Interaction):
+        """Disable buttons and update message"""
+        for item in self.children:
+            if isinstance(item, discord.ui.Button):
+                item.disabled = True
+        self.action_taken = True
+        await interaction.message.edit(view=self)
+
+class AdminActionButton(discord.ui.Button):
+    def __init__(self, action_type: str):
+        super().__init__(
+            style=discord.ButtonStyle.green if action_type == "confirm" else discord.ButtonStyle.red,
+            label="✅ Confirm" if action_type == "confirm" else "❌ Reject",
+            custom_id=f"admin_{action_type}",
+            row=0
+        )
+        self.action_type = action_type
+
+    async def callback(self, interaction: discord.Interaction):
+        view = self.view
+        if view.action_taken:
+            return await interaction.response.send_message(
+                f"Action already taken by {view.action_by.mention}",
+                ephemeral=True
+            )
+
+        # Mark action as taken
+        view.action_by = interaction.user
+        await view.disable_all_buttons(interaction)
+
+        # Handle the action
+        member = interaction.guild.get_member(view.member_id)
+        if not member:
+            return await interaction.followup.send("Member left the server", ephemeral=True)
+
+        if self.action_type == "confirm":
+            # Reset vouches
+            async with member_locks.hold(interaction.guild.id, member.id):
+                store.set_vouch_count(interaction.guild.id, member.id, 0, interaction.user.id, int(time.time()))
+                await edit_nickname(member, clean_nickname(member.display_name))
+            msg = f"✅ {member.mention}'s vouches reset by {interaction.user.mention}"
+        else:
+            msg = f"❌ Action rejected by {interaction.user.mention}"
+
+        await interaction.channel.send(f"✅ Action confirmed by {interaction.user.mention}")
+
+class KeysetPageView(discord.ui.View):
+    """Prev/next browser that fetches a single keyset page per click"""
+    def __init__(self, author_id, title, fetch_page, format_rows):
+        super().__init__(timeout=180)
+        self.author_id = author_id
+        self.title = title
+        self.fetch_page = fetch_page  # after_key -> (rows, next_key)
+        self.format_rows = format_rows  # rows -> list of lines
+        self.keys = [None]  # Start key of every page visited so far
+        self.next_key = None
+        self.lines = []
+
+    def load(self):
+        rows, self.next_key = self.fetch_page(self.keys[-1])
+        self.lines = self.format_rows(rows)
+        self.previous_page.disabled = len(self.keys) == 1
+        self.next_page.disabled = self.next_key is None
+
+    def render(self):
+        return (f"{self.title} (page {len(self.keys)})\n" + "\n".join(self.lines))[:2000]
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ Only the command author can change pages.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.keys.pop()
+        self.load()
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.keys.append(self.next_key)
+        self.load()
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+async def send_paginated(ctx, title, fetch_page, format_rows, empty_message):
+    """Send the first page of a keyset browser, adding buttons only if needed"""
+    view = KeysetPageView(ctx.author.id, title, fetch_page, format_rows)
+    view.load()
+    if not view.lines:
+        return await ctx.send(empty_message)
+    await ctx.send(view.render(), view=view if view.next_key is not None else None)
+
+def format_member_rows(guild):
+    """Resolve a page of user IDs into member lines"""
+    def format_rows(user_ids):
+        lines = []
+        for user_id in user_ids:
+            member = guild.get_member(user_id)
+            lines.append(f"{member.mention} ({member.display_name})" if member else f"Unknown User ({user_id})")
+        return lines
+    return format_rows
+
+async def notify_admins(guild, member, reason):
+    """Send admin alerts with action buttons"""
+    _, admin_roles = get_config(guild.id)
+    staff_channel = get_staff_channel(guild)
+
+    embed = discord.Embed(
+        title="🚨 Vouch Discrepancy Detected",
+        color=discord.Color.orange(),
+        description=(
+            f"**Member:** {member.mention}\n"
+            f"**Issue:** {reason}\n\n"
+            "**Action Required:** Verify and choose an option below"
+        )
+    )
+    embed.set_thumbnail(url=member.display_avatar.url)
+
+    # Create persistent view with member context
+    view = AdminActionView(member.id)
+
+    # Try staff channel first
+    if staff_channel:
+        try:
+            await queue_send(
+                PRIORITY_ALERT, staff_channel,
+                content=" ".join(f"<@&{rid}>" for rid in admin_roles) if admin_roles else "",
+                embed=embed,
+                view=view
+            )
+            return
+        except discord.HTTPException:
+            pass
+
+    # Fallback to DM admins
+    notified = False
+    for role_id in admin_roles:
+        role = guild.get_role(role_id)
+        if role:
+            for admin in role.members:
+                if not admin.bot:
+                    try:
+                        await queue_send(PRIORITY_ALERT, admin, embed=embed, view=view)
+                        notified = True
+                    except discord.Forbidden:
+                        continue
+
+    if not notified:
+        print(f"Failed to notify admins about {member}")
+
+async def notify_ring_suspects(guild, lines, title="🕵️ Vouch Ring Suspects"):
+    """Send ring detection findings to the staff channel"""
+    staff_channel = get_staff_channel(guild)
+    if not staff_channel or not lines:
+        return
+    embed = discord.Embed(title=title, color=discord.Color.red(), description="\n".join(lines)[:4000])
+    try:
+        await queue_send(PRIORITY_ALERT, staff_channel, embed=embed)
+    except discord.HTTPException as e:
+        print(f"Failed to send ring report in {guild.name}: {e}")
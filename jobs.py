@@ -0,0 +1,159 @@
+"""Resumable bulk admin jobs.
+
+A job walks a guild's members in ID order and checkpoints the last member
+it finished, so a restart resumes where it stopped. Job tasks live on
+`bot.jobs` rather than in a cog, so reloading the admin or nickname cogs
+never interrupts a running job.
+"""
+import asyncio
+import time
+
+import discord
+
+from common import db_execute, db_fetchall, db_fetchone, get_db, member_locks, outbound, queue_send, store
+from common import build_nickname_plan, sync_nickname
+from outbound import PRIORITY_ALERT, PRIORITY_BULK
+
+JOBS_PER_GUILD = 1  # Bulk jobs in one guild share its member-edit rate limit
+JOB_PROGRESS_INTERVAL = 5  # Seconds between progress edits and checkpoints
+JOB_STEP_DELAY = 0.5  # Pause after each member edit
+
+def nickname_fix_targets(guild):
+    return [member for member, _ in build_nickname_plan(guild)[0]]
+
+def tracked_members(guild):
+    members = (guild.get_member(user_id) for user_id, _, _ in store.tracked_states(guild.id))
+    return [member for member in members if member]
+
+def untracked_members(guild):
+    tracked = {user_id for user_id, _, _ in store.tracked_states(guild.id)}
+    return [member for member in guild.members if member.id not in tracked]
+
+async def bulk_sync_nickname(member):
+    return await sync_nickname(member, PRIORITY_BULK)
+
+async def enable_tracking_step(member):
+    if not store.set_tracking(member.guild.id, member.id, True):
+        return None
+    await sync_nickname(member, PRIORITY_BULK)
+    return True
+
+async def disable_tracking_step(member):
+    return store.set_tracking(member.guild.id, member.id, False) or None
+
+# kind -> (title, select members, step, delay after each change)
+# Steps return True if the member changed, False if nothing was needed and None on failure
+BULK_JOBS = {
+    "fixnicks": ("Nickname cleanup", nickname_fix_targets, bulk_sync_nickname, JOB_STEP_DELAY),
+    "refreshnicks": ("Nickname refresh", tracked_members, bulk_sync_nickname, JOB_STEP_DELAY),
+    "enablevouches_all": ("Enable tracking", untracked_members, enable_tracking_step, JOB_STEP_DELAY),
+    "disablevouches_all": ("Disable tracking", tracked_members, disable_tracking_step, 0),
+}
+
+def get_job(job_id):
+    return db_fetchone("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+
+def format_job(job):
+    title = BULK_JOBS[job['kind']][0]
+    icon = {"queued": "⏳", "running": "🔄", "done": "✅", "cancelled": "🛑", "failed": "❌"}.get(job['status'], "•")
+    return (f"{icon} Job #{job['job_id']} {title}: {job['done']}/{job['total']} members "
+            f"({job['updated']} updated, {job['failed']} failed) - {job['status']}")
+
+def save_job_progress(job_id, **fields):
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    db_execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+async def report_job(job_id, channel):
+    """Edit the job's progress message, posting a fresh one if it is gone"""
+    job = get_job(job_id)
+    if job is None or channel is None:
+        return
+    try:
+        if job['message_id']:
+            message = channel.get_partial_message(job['message_id'])
+            await outbound.submit(
+                PRIORITY_ALERT, ("channel", channel.id), lambda: message.edit(content=format_job(job))
+            )
+            return
+    except discord.HTTPException:
+        pass
+    try:
+        message = await queue_send(PRIORITY_ALERT, channel, format_job(job))
+        save_job_progress(job_id, message_id=message.id)
+    except discord.HTTPException as e:
+        print(f"Job {job_id} progress message failed: {e}")
+
+def start_job(bot, kind, guild, channel, started_by):
+    """Queue a bulk job and run it in the background; returns the job ID"""
+    with get_db() as conn:
+        job_id = conn.execute("""
+            INSERT INTO jobs (kind, guild_id, channel_id, started_by, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (kind, guild.id, channel.id, started_by, int(time.time()))).lastrowid
+    bot.jobs[job_id] = asyncio.create_task(run_job(bot, job_id))
+    return job_id
+
+def resume_jobs(bot):
+    """Restart jobs that were queued or running when the bot last stopped"""
+    for job in db_fetchall("SELECT job_id FROM jobs WHERE status IN ('queued', 'running') ORDER BY job_id"):
+        if job['job_id'] not in bot.jobs:
+            bot.jobs[job['job_id']] = asyncio.create_task(run_job(bot, job['job_id']))
+
+async def run_job(bot, job_id):
+    """Walk a job's members from its checkpoint, one guild job at a time"""
+    job = get_job(job_id)
+    if job is None:
+        print(f"Job {job_id} not found; nothing to run")
+        bot.jobs.pop(job_id, None)
+        return
+    guild = bot.get_guild(job['guild_id'])
+    if guild is None:
+        save_job_progress(job_id, status="failed", finished_at=int(time.time()))
+        bot.jobs.pop(job_id, None)
+        return
+    channel = guild.get_channel(job['channel_id'])
+    _, select_members, step, delay = BULK_JOBS[job['kind']]
+    done, updated, failed, cursor = job['done'], job['updated'], job['failed'], job['cursor']
+    await report_job(job_id, channel)
+
+    slot = bot.job_slots.setdefault(guild.id, asyncio.Semaphore(JOBS_PER_GUILD))
+    try:
+        async with slot:
+            members = sorted((m for m in select_members(guild) if m.id > cursor), key=lambda m: m.id)
+            save_job_progress(job_id, status="running", total=done + len(members))
+            last_report = time.monotonic()
+            for member in members:
+                try:
+                    async with member_locks.hold(guild.id, member.id):
+                        changed = await step(member)
+                except discord.HTTPException as e:
+                    print(f"Job {job_id} failed on {member.id}: {e}")
+                    changed = None
+                if changed is None:
+                    failed += 1
+                elif changed:
+                    updated += 1
+                done += 1
+                cursor = member.id
+                if time.monotonic() - last_report >= JOB_PROGRESS_INTERVAL:
+                    save_job_progress(job_id, cursor=cursor, done=done, updated=updated, failed=failed)
+                    await report_job(job_id, channel)
+                    last_report = time.monotonic()
+                if changed and delay:
+                    await asyncio.sleep(delay)  # Rate limiting
+        save_job_progress(job_id, status="done", cursor=cursor, done=done, updated=updated,
+                          failed=failed, finished_at=int(time.time()))
+    except asyncio.CancelledError:
+        # Only !canceljob marks a job cancelled; on shutdown the checkpoint is kept for resume
+        save_job_progress(job_id, cursor=cursor, done=done, updated=updated, failed=failed)
+        job = get_job(job_id)
+        if job is not None and job['status'] == "cancelled":
+            await report_job(job_id, channel)
+        raise
+    except Exception as e:
+        print(f"Job {job_id} crashed: {e}")
+        save_job_progress(job_id, status="failed", cursor=cursor, done=done, updated=updated,
+                          failed=failed, finished_at=int(time.time()))
+    finally:
+        bot.jobs.pop(job_id, None)
+    await report_job(job_id, channel)
@@ -0,0 +1,173 @@
+"""Event-loop lag watchdog.
+
+The database helpers are synchronous, so a slow query stalls every
+coroutine in the bot. LoopWatchdog measures that continuously. A heartbeat
+task on the loop records how late each of its wake-ups is. A helper thread
+checks that the heartbeat is still beating, and once the loop has been
+blocked for longer than the threshold it captures the loop thread's stack
+from sys._current_frames(). The capture happens while the stall is still
+in progress, so the stack shows the blocking call itself rather than
+whatever ran after it.
+
+The most recent stalls are kept in a ring buffer. report() groups them by
+the innermost frame in the bot's own code to rank the worst offenders.
+profile() samples the loop thread's stack for a number of seconds and
+returns collapsed stacks (one "frame;frame;frame count" line per stack),
+which flamegraph.pl and speedscope read directly.
+"""
+import asyncio
+import collections
+import math
+import os
+import sys
+import threading
+import time
+
+HEARTBEAT_INTERVAL = 0.1  # Seconds between heartbeat wake-ups
+STALL_THRESHOLD = 0.25  # Seconds the loop may be blocked before its stack is captured
+STALL_HISTORY = 50  # Stalls kept in the ring buffer
+LAG_SAMPLES = 3000  # Recent heartbeats kept for percentiles (about five minutes)
+PROFILE_INTERVAL = 0.005  # Seconds between profiler samples
+MAX_PROFILE_SECONDS = 120
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def is_own_code(filename):
+    return filename.startswith(PROJECT_ROOT) and "site-packages" not in filename
+
+
+def frame_label(frame, line=True):
+    filename = frame.f_code.co_filename
+    path = os.path.relpath(filename, PROJECT_ROOT) if is_own_code(filename) else os.path.basename(filename)
+    return f"{frame.f_code.co_name} ({path}:{frame.f_lineno})" if line else f"{frame.f_code.co_name} ({path})"
+
+
+def stack_labels(frame, line=True):
+    """Labels from the outermost frame to `frame`"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame, line))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class Stall:
+    """One stall: captured by the helper thread, timed by the heartbeat that ends it"""
+    __slots__ = ("at", "duration", "stack", "culprit")
+
+    def __init__(self, frame):
+        self.at = time.time()
+        self.duration = None
+        self.stack = stack_labels(frame)
+        culprit = frame
+        while culprit is not None and not is_own_code(culprit.f_code.co_filename):
+            culprit = culprit.f_back
+        self.culprit = frame_label(culprit or frame)
+
+
+class LoopWatchdog:
+    def __init__(self, threshold=STALL_THRESHOLD, interval=HEARTBEAT_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.lag = collections.deque(maxlen=LAG_SAMPLES)
+        self.stalls = collections.deque(maxlen=STALL_HISTORY)
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self.last_beat = time.monotonic()
+        self.pending = None  # Stall in progress, finished by the next heartbeat
+        self.loop_thread_id = None
+        self.task = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.profiling = threading.Lock()
+
+    def start(self):
+        """Start the heartbeat on the running loop and the helper thread; safe to call again"""
+        if self.task is not None and not self.task.done():
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.task = asyncio.get_running_loop().create_task(self.heartbeat())
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.watch, name="loop-watchdog", daemon=True)
+            self.thread.start()
+
+    async def heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            with self.lock:
+                self.last_beat = now
+                self.lag.append(lag)
+                self.max_lag = max(self.max_lag, lag)
+                if self.pending is not None:
+                    self.pending.duration = lag
+                    self.stalls.append(self.pending)
+                    self.pending = None
+
+    def watch(self):
+        """Helper thread: capture the loop thread's stack once per stall"""
+        while True:
+            time.sleep(self.threshold / 2)
+            if self.task is None or self.task.done():
+                continue
+            with self.lock:
+                blocked = time.monotonic() - self.last_beat - self.interval
+                if blocked < self.threshold or self.pending is not None:
+                    continue
+                frame = sys._current_frames().get(self.loop_thread_id)
+                if frame is not None:
+                    self.pending = Stall(frame)
+                    self.stall_count += 1
+
+    def report(self, limit=5):
+        """Lag percentiles plus the worst offenders among recent stalls, worst first"""
+        with self.lock:
+            lag = list(self.lag)
+            stalls = [stall for stall in self.stalls if stall.duration is not None]
+        offenders = {}
+        for stall in stalls:
+            entry = offenders.setdefault(stall.culprit, {"culprit": stall.culprit, "count": 0, "total": 0.0, "worst": stall})
+            entry["count"] += 1
+            entry["total"] += stall.duration
+            if stall.duration > entry["worst"].duration:
+                entry["worst"] = stall
+        return {
+            "samples": len(lag),
+            "p50": percentile(lag, 0.5),
+            "p99": percentile(lag, 0.99),
+            "max": self.max_lag,
+            "stalls": self.stall_count,
+            "offenders": sorted(offenders.values(), key=lambda entry: -entry["worst"].duration)[:limit],
+        }
+
+    def profile(self, seconds):
+        """Sample the loop thread's stack for `seconds` and return collapsed stacks.
+
+        Blocks the calling thread, so run it with asyncio.to_thread().
+        """
+        if not self.profiling.acquire(blocking=False):
+            raise RuntimeError("A loop profile is already running")
+        try:
+            counts = collections.Counter()
+            deadline = time.monotonic() + min(seconds, MAX_PROFILE_SECONDS)
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(self.loop_thread_id)
+                if frame is not None:
+                    counts[";".join(stack_labels(frame, line=False))] += 1
+                time.sleep(PROFILE_INTERVAL)
+        finally:
+            self.profiling.release()
+        return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
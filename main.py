@@ -1,1305 +1,224 @@
-import re
-import datetime
-import traceback
-import discord
-from discord import ui
-from discord.ext import commands
-from discord import app_commands
-from discord import Interaction, Member
-import sqlite3
 import os
-import time
-import asyncio
-from threading import Thread
-from io import StringIO
 import json
+import asyncio
+import hashlib
+import contextlib
+import discord
+from discord.ext import commands
+from common import (
+    ADMIN_ALERTS_CHANNEL_ID, AdminActionView, get_meta, is_admin, open_database, outbound,
+    queue_send, set_meta, wal_archiver, watchdog,
+)
+from graph import VouchGraph
+from outbound import MAX_RATELIMIT_WAIT, PRIORITY_ALERT, PRIORITY_REPLY
+from tracing import TraceRecorder
 
 # Setup bot
 TOKEN = os.environ.get('DISCORD_BOT_TOKEN')
-if TOKEN is None:
-    raise ValueError("No Discord token found!")
+# Append every command and interaction to this JSONL file for replay.py
+TRACE_PATH = os.environ.get('VOUCH_TRACE_PATH')
 intents = discord.Intents.default()
 intents.guilds = True
 intents.messages = True
 intents.message_content = True
 intents.members = True
-bot = commands.Bot(command_prefix="!", intents=intents)
-bot.vouch_spam = {}  # Anti-spam tracking
-bot.discrepancy_notifications = {}
-ADMIN_ALERTS_CHANNEL_ID = 1354897882271977744
-# Admin channel configuration
-
-def get_staff_channel(guild):
-    staff_channel_id, _ = get_config(guild.id)
-    return guild.get_channel(staff_channel_id)
-
-def get_config(guild_id):
-    row = db_fetchone("SELECT staff_channel_id, admin_roles_id FROM config WHERE guild_id = ?", (guild_id,))
-    if row:
-        return int(row['staff_channel_id']), json.loads(row['admin_roles_id'])
-    return 0, []
-
-
-# Database setup with error handling
-def get_db():
-    conn = sqlite3.connect("vouches.db", timeout=30, isolation_level=None)
-    conn.execute("PRAGMA busy_timeout = 30000")
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db():
-    with get_db() as conn:
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS vouches (
-            user_id INTEGER PRIMARY KEY,
-            vouch_count INTEGER DEFAULT 0,
-            tracking_enabled INTEGER DEFAULT 0
-        )
-        """)
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS vouch_records (
-            voucher_id INTEGER,
-            vouched_id INTEGER,
-            timestamp INTEGER DEFAULT 0,
-            PRIMARY KEY (voucher_id, vouched_id)
-        )
-        """)
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS unvouchable_users (
-            user_id INTEGER PRIMARY KEY
-        )
-        """)
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS vouch_cooldowns (
-            user_id INTEGER PRIMARY KEY,
-            last_vouch_time INTEGER
-        )
-        """)
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS vouch_reasons (
-            voucher_id INTEGER,
-            vouched_id INTEGER,
-            reason TEXT,
-            timestamp INTEGER,
-            PRIMARY KEY (voucher_id, vouched_id)
-        )
-        """)
-        # Add index for faster timestamp queries
-        conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_vouch_timestamp 
-        ON vouch_records(timestamp)
-        """)
-
-init_db()
-
-def init_config():
-    with get_db() as conn:
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS config (
-            guild_id INTEGER PRIMARY KEY,
-            staff_channel_id TEXT DEFAULT '',
-            admin_roles_id TEXT DEFAULT ''
-        )
-        """)
-
-
-init_config()
-
-# Database operations with error handling
-def db_execute(query, params=()):
-    try:
-        with get_db() as conn:
-            conn.execute(query, params)
-        return True
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
-        return False
-
-def db_fetchone(query, params=()):
-    try:
-        with get_db() as conn:
-            return conn.execute(query, params).fetchone()
-    except sqlite3.Error:
-        return None
-
-def db_fetchall(query, params=()):
-    try:
-        with get_db() as conn:
-            return conn.execute(query, params).fetchall()
-    except sqlite3.Error:
-        return []
-
-# Core functions
-def is_admin(ctx):
-    _, admin_roles_id = get_config(ctx.guild.id)
-    return any(role.id in admin_roles_id for role in ctx.author.roles)
-
-def clean_nickname(nick):
-    """Remove ALL vouch tags while preserving special characters"""
-    if not nick:
-        return nick
-    
-    # Escape special characters and use proper character sets
-    import re
-    try:
-        # This pattern handles all bracket types safely
-        pattern = r'(\s*[\[]([^\]\]]*)[\]]\s*)|(\s*［([^］］]*)］\s*)'
-        clean = re.sub(pattern, '', str(nick)).strip()
-        
-        # Remove any remaining orphaned brackets
-        clean = clean.replace("[", "").replace("]", "").replace("［", "").replace("］", "").strip()
-        
-        return clean
-    except re.error:
-        # Fallback to simple cleaning if regex fails
-        return str(nick).replace("[", "").replace("]", "").replace("［", "").replace("］", "").strip()
-
-
-def get_vouches(user_id):
-    row = db_fetchone("SELECT vouch_count FROM vouches WHERE user_id = ?", (user_id,))
-    return row[0] if row else 0
-
-def is_tracking_enabled(user_id):
-    row = db_fetchone("SELECT tracking_enabled FROM vouches WHERE user_id = ?", (user_id,))
-    return row and row[0] == 1
-
-def is_unvouchable(user_id):
-    row = db_fetchone("SELECT 1 FROM unvouchable_users WHERE user_id = ?", (user_id,))
-    return row is not None
-
-def has_vouched(voucher_id, vouched_id):
-    row = db_fetchone("SELECT 1 FROM vouch_records WHERE voucher_id = ? AND vouched_id = ?", (voucher_id, vouched_id))
-    return row is not None
-
-# Add this with your other utility functions (around line 100)
-async def clean_old_notifications():
-    """Clean up old notification records"""
-    while True:
-        await asyncio.sleep(3600)  # Every hour
-        current_time = time.time()
-        to_delete = []
-        
-        for msg_id, data in bot.discrepancy_notifications.items():
-            if current_time - data.get('timestamp', 0) > 86400:  # 24 hours
-                to_delete.append(msg_id)
-        
-        for msg_id in to_delete:
-            del bot.discrepancy_notifications[msg_id]
-
-async def update_nickname(member):
-    """Atomic nickname update with verification"""
-    try:
-        if not is_tracking_enabled(member.id):
-            return
-    
-        current_nick = member.display_name
-        
-        # More robust cleaning with fallbacks
-        base_name = clean_nickname(current_nick)
-        
-        # Double-check cleaning worked
-        if (not base_name.strip() or 
-            any(bracket in base_name for bracket in ["[", "]", "［", "］"])):
-            base_name = member.name  # Fallback to pure username
-            
-        # Final sanitization
-        base_name = base_name.replace("[", "").replace("]", "").replace("［", "").replace("］", "").strip()
-        if not base_name:  # Ultimate fallback
-            base_name = member.name
-
-        # Build new tags
-        new_tags = []
-        vouches = get_vouches(member.id)
-        if vouches > 0:
-            new_tags.append(f"{vouches}V")
-        if is_unvouchable(member.id):
-            new_tags.append("unvouchable")
-
-        # Construct new nickname
-        new_nick = f"{base_name} [{', '.join(new_tags)}]" if new_tags else base_name
-        new_nick = new_nick.replace("[", "［").replace("]", "］")[:32]
-
-        # Verify no duplicate tags
-        if "[" in new_nick and new_nick.count("[") > 1:
-            new_nick = f"{base_name} [{new_tags[-1]}]"  # Use only the last tag
-
-        if new_nick != current_nick:
-            await member.edit(nick=new_nick)
-            
-    except Exception as e:
-        print(f"Nickname update failed for {member.display_name}: {str(e)}")
-
-class VouchModal(ui.Modal, title="Submit a Vouch"):
-    person_name = ui.TextInput(label="Person Name", placeholder="Their Discord name or mention", required=True)
-    reason = ui.TextInput(label="Reason", placeholder="Optional", required=False, style=discord.TextStyle.paragraph)
-
-    def __init__(self, bot, interaction):
-        super().__init__()
-        self.bot = bot
-        self.interaction = interaction
-
-    async def on_submit(self, interaction: discord.Interaction):
-        await interaction.response.defer(thinking=True, ephemeral=True)
-    
-        guild = interaction.guild
-        target = None
-        content = self.person_name.value.strip()
-    
-        match = re.match(r'<@!?(\d+)>', content)
-        if match:
-            target_id = int(match.group(1))
-            target = guild.get_member(target_id)
-        else:
-            for member in guild.members:
-                if member.name.lower() == content.lower():
-                    target = member
-                    break
-    
-        if not target:
-            return await interaction.followup.send(f"❌ Could not find user `{content}` in this server.", ephemeral=True)
-    
-        # Prevent self-vouch
-        if interaction.user.id == target.id:
-            return await interaction.followup.send("❌ You can't vouch yourself!", ephemeral=True)
-
-        # prevent double vouching
-        if has_vouched(interaction.user.id, target.id):
-            return await interaction.followup.send("❌ You've already vouched this user!", ephemeral=True)
-    
-        reason = self.reason.value.strip() or "No reason provided"
-    
-        # Prepare Fake Context for compatibility
-        class FakeCtx:
-            def __init__(self, user, guild, channel):
-                self.author = user
-                self.guild = guild
-                self.channel = channel
-                self.send_output = StringIO()
-    
-            async def send(self, content=None, **kwargs):
-                self.send_output.write(content or "")
-    
-        ctx = FakeCtx(interaction.user, guild, interaction.channel)
-    
-        try:
-            await self.bot.get_command("vouch").callback(ctx, target, reason=reason)
-            output = ctx.send_output.getvalue()
-    
-            if not output:
-                output = f"✅ Vouch sent to **{target.display_name}**\n📄 Reason: *{reason}*"
-    
-            await interaction.followup.send(output, ephemeral=True)
-    
-        except Exception as e:
-            print(f"[VouchModal error] {e}")
-            await interaction.followup.send("❌ Failed to process vouch.", ephemeral=True)
-
-
-class VouchButtonView(discord.ui.View):
-    def __init__(self, bot):
-        super().__init__(timeout=None)
-        self.bot = bot
 
-    @discord.ui.button(label="Submit A Vouch", style=discord.ButtonStyle.primary, emoji="🎟️",custom_id="submit_vouch_button")
-    async def submit_vouch_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.send_modal(VouchModal(self.bot, interaction))
-        
-class AdminActionView(discord.ui.View):
-    def __init__(self, member_id):
-        super().__init__(timeout=None)  # Persistent
-        self.member_id = member_id
-        self.action_taken = False
-        self.action_by = None
-        
-        # Add buttons with proper custom IDs
-        self.add_item(AdminActionButton("confirm"))
-        self.add_item(AdminActionButton("reject"))
-
-    async def disable_all_buttons(self, interaction: discord.Interaction):
-        """Disable buttons and update message"""
-        for item in self.children:
-            if isinstance(item, discord.ui.Button):
-                item.disabled = True
-        self.action_taken = True
-        await interaction.message.edit(view=self)
-
-class AdminActionButton(discord.ui.Button):
-    def __init__(self, action_type: str):
-        super().__init__(
-            style=discord.ButtonStyle.green if action_type == "confirm" else discord.ButtonStyle.red,
-            label="✅ Confirm" if action_type == "confirm" else "❌ Reject",
-            custom_id=f"admin_{action_type}",
-            row=0
+# Loaded at startup, one per subsystem
+EXTENSIONS = ("cogs.vouching", "cogs.admin", "cogs.nicknames", "cogs.reporting")
+# Loaded on first use of any of their commands
+LAZY_EXTENSIONS = {
+    "cogs.maintenance": (
+        "fix_vouch_records", "fix_vouch_timestamps", "dbstats", "retention", "backup_db",
+        "restore_points",
+    ),
+}
+
+class VouchContext(commands.Context):
+    """Context whose replies go through the outbound scheduler ahead of all other traffic"""
+    async def send(self, content=None, **kwargs):
+        bucket = ("interaction", self.interaction.id) if self.interaction else ("channel", self.channel.id)
+        return await outbound.submit(
+            PRIORITY_REPLY, bucket, lambda: super(VouchContext, self).send(content, **kwargs)
         )
-        self.action_type = action_type
-    
-    async def callback(self, interaction: discord.Interaction):
-        view = self.view
-        if view.action_taken:
-            return await interaction.response.send_message(
-                f"Action already taken by {view.action_by.mention}",
-                ephemeral=True
-            )
-        
-        # Mark action as taken
-        view.action_by = interaction.user
-        await view.disable_all_buttons(interaction)
-        
-        # Handle the action
-        member = interaction.guild.get_member(view.member_id)
-        if not member:
-            return await interaction.followup.send("Member left the server", ephemeral=True)
-        
-        if self.action_type == "confirm":
-            # Reset vouches
-            db_execute("UPDATE vouches SET vouch_count = 0 WHERE user_id = ?", (member.id,))
-            await member.edit(nick=clean_nickname(member.display_name))
-            msg = f"✅ {member.mention}'s vouches reset by {interaction.user.mention}"
-        else:
-            msg = f"❌ Action rejected by {interaction.user.mention}"
-        
-        await interaction.channel.send(f"✅ Action confirmed by {interaction.user.mention}")
-
-# COMMANDS
-
-@bot.command()
-@commands.is_owner()
-async def setconfig(ctx, setting: str, *, value: str):
-    """[OWNER] Set staff_channel_id or admin_roles_id (comma-separated IDs)"""
-    setting = setting.lower()
-    if setting not in ("staff_channel_id", "admin_roles_id"):
-        return await ctx.send("❌ Invalid setting. Use `staff_channel_id` or `admin_roles_id`.")
 
-    if setting == "staff_channel_id":
+class VouchBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Runtime state lives on the bot so it survives reloading the cogs that use it
+        self.vouch_spam = {}  # Anti-spam tracking
+        self.discrepancy_notifications = {}
+        self.fake_tag_pending = {}  # guild_id -> {member_id: (displayed, actual)}
+        self.fake_tag_reported = {}  # (guild_id, member_id) -> displayed count already reported
+        self.nick_heal_tasks = {}  # (guild_id, member_id) -> pending debounced update
+        self.vouch_graphs = {}  # guild_id -> VouchGraph loaded on startup for ring detection
+        self.vouch_graph_epochs = {}  # guild_id -> times its graph was dropped after records were cleared
+        self.vouch_graph_loads = {}  # guild_id -> background reload of a dropped graph
+        self.vouch_graph_buffers = {}  # guild_id -> [edges recorded during each graph load in flight]
+        self.trust_refreshed_at = None  # Monotonic time of the last trust score refresh
+        self.jobs = {}  # job_id -> running bulk job task
+        self.job_slots = {}  # guild_id -> Semaphore shared by that guild's bulk jobs
+
+    def forget_vouch_graph(self, guild_id):
+        """Drop a guild's graph after vouch records were cleared; the next vouch reloads it.
+
+        Loads already in flight started before the clear, so vouch_graph_load
+        discards what they return.
+        """
+        self.vouch_graph_epochs[guild_id] = self.vouch_graph_epochs.get(guild_id, 0) + 1
+        self.vouch_graphs.pop(guild_id, None)
+
+    @contextlib.contextmanager
+    def vouch_graph_load(self, guild_id):
+        """Track a graph load for one guild; call the yielded keep(graph) to install what it loaded.
+
+        Vouches recorded while the load runs are buffered and replayed into
+        the loaded graph, which also takes over the current graph's overlay
+        and burst state, so detection carries on across the swap. A load that
+        a clear overtook is discarded.
+        """
+        epoch = self.vouch_graph_epochs.get(guild_id, 0)
+        buffer = []
+        buffers = self.vouch_graph_buffers.setdefault(guild_id, [])
+        buffers.append(buffer)
+
+        def keep(graph):
+            if self.vouch_graph_epochs.get(guild_id, 0) == epoch:
+                graph.catch_up(self.vouch_graphs.get(guild_id), buffer)
+                self.vouch_graphs[guild_id] = graph
         try:
-            channel_id = int(value.strip())
-            channel = ctx.guild.get_channel(channel_id)
-            if channel is None:
-                return await ctx.send("❌ That channel ID doesn't exist in this server!")
-            value = str(channel.id)
-        except ValueError:
-            return await ctx.send("❌ Invalid channel ID format. Use a numeric ID.")
-    
-    elif setting == "admin_roles_id":
+            yield keep
+        finally:
+            buffers[:] = [other for other in buffers if other is not buffer]
+            if not buffers:
+                del self.vouch_graph_buffers[guild_id]
+
+    def add_vouch_edge(self, guild_id, voucher_id, vouched_id, timestamp):
+        """Feed a new community vouch to ring detection; returns the findings it triggers"""
+        for buffer in self.vouch_graph_buffers.get(guild_id, ()):
+            buffer.append((voucher_id, vouched_id))
+        graph = self.vouch_graph(guild_id)
+        return graph.add_edge(voucher_id, vouched_id, timestamp) if graph is not None else []
+
+    def vouch_graph(self, guild_id):
+        """A guild's graph for ring detection; None while a dropped graph reloads in the background"""
+        graph = self.vouch_graphs.get(guild_id)
+        if graph is None and guild_id in self.vouch_graph_epochs and guild_id not in self.vouch_graph_loads:
+            self.vouch_graph_loads[guild_id] = asyncio.create_task(self.reload_vouch_graph(guild_id))
+        return graph
+
+    async def reload_vouch_graph(self, guild_id):
         try:
-            role_ids = [int(r.strip()) for r in value.split(",") if r.strip()]
-            missing = [rid for rid in role_ids if ctx.guild.get_role(rid) is None]
-            if missing:
-                return await ctx.send(f"❌ These role IDs don't exist: {', '.join(map(str, missing))}")
-            value = json.dumps(role_ids)
-        except ValueError:
-            return await ctx.send("❌ Invalid role ID format. Use numeric IDs separated by commas.")
-
-    if not db_execute(f"""
-        INSERT INTO config (guild_id, {setting})
-        VALUES (?, ?)
-        ON CONFLICT(guild_id) DO UPDATE SET {setting} = ?
-    """, (ctx.guild.id, value, value)):
-        return await ctx.send("❌ Failed to update config.")
-    
-    await ctx.send(f"✅ `{setting}` updated.")
-
-@bot.command()
-@commands.check(is_admin)
-async def setupvouchticket(ctx):
-    """[ADMIN] Set up the Submit A Vouch button in this channel."""
-    view = VouchButtonView(bot)
-    await ctx.send("📝 Click below to submit a vouch!", view=view)
-    await ctx.send("✅ Vouch ticket system is ready.")
-
-
-@bot.command()
-@commands.check(is_admin)
-async def unvouchable(ctx, member: discord.Member, action: str = "on"):
-    """[ADMIN] Toggle unvouchable status (on/off)"""
-    action = action.lower()
-    if action in ("on", "enable", "yes", "true", "1"):
-        if not db_execute("INSERT OR IGNORE INTO unvouchable_users VALUES (?)", (member.id,)):
-            return await ctx.send("❌ Failed to update database!")
-        await ctx.send(f"🔒 {member.mention} is now unvouchable!")
-    else:
-        if not db_execute("DELETE FROM unvouchable_users WHERE user_id = ?", (member.id,)):
-            return await ctx.send("❌ Failed to update database!")
-        await ctx.send(f"🔓 {member.mention} can now be vouched!")
-    await update_nickname(member)
-
-@bot.command()
-async def checkunvouchable(ctx, member: discord.Member = None):
-    """Check if a user is unvouchable"""
-    target = member or ctx.author
-    status = "🔒 UNVOUCHABLE" if is_unvouchable(target.id) else "🔓 Vouchable"
-    await ctx.send(f"{target.mention}: {status}")
-
-@bot.command()
-@commands.check(is_admin)
-async def unvouchable_list(ctx):
-    """[ADMIN] List all unvouchable users"""
-    unvouchables = db_fetchall("SELECT user_id FROM unvouchable_users")
-    if not unvouchables:
-        return await ctx.send("No unvouchable users!")
-    
-    members = [ctx.guild.get_member(row[0]) for row in unvouchables]
-    members = [m for m in members if m]
-    
-    msg = "🔒 Unvouchable Users:\n" + "\n".join(f"{m.mention} ({m.display_name})" for m in members)
-    await ctx.send(msg[:2000])
-
-@bot.command()
-async def vouch(ctx, member: discord.Member, *, reason: str = "No reason provided"):
-    """Vouch for a user (now with cooldown, reason, and DM notification)"""
-    try:
-        admin = is_admin(ctx)
-        
-        # Anti-spam check
-        if not admin:
-            if ctx.author.id in bot.vouch_spam:
-                if bot.vouch_spam[ctx.author.id] >= 3:
-                    return await ctx.send("❌ You're vouching too fast!")
-                bot.vouch_spam[ctx.author.id] += 1
-            else:
-                bot.vouch_spam[ctx.author.id] = 1
-            
-            # Cooldown check
-            cooldown = db_fetchone("SELECT last_vouch_time FROM vouch_cooldowns WHERE user_id = ?", (ctx.author.id,))
-            if cooldown and cooldown[0]:
-                remaining = 180 - (time.time() - cooldown[0])
-                if remaining > 0:
-                    return await ctx.send(f"❌ You can vouch again in {int(remaining // 60)} minutes and {int(remaining % 60)} seconds!")
-        
-        # Original validations
-        if not admin:
-            if ctx.author == member:
-                return await ctx.send("❌ You can't vouch yourself!")
-            if has_vouched(ctx.author.id, member.id):
-                return await ctx.send("❌ You already vouched them!")
-            if is_unvouchable(member.id):
-                return await ctx.send("❌ This user is unvouchable!")
-            if not is_tracking_enabled(member.id):
-                return await ctx.send("❌ User hasn't enabled tracking!")
-
-        # Process vouch
-        new_count = get_vouches(member.id) + 1
-        if not db_execute("""
-        INSERT INTO vouches VALUES (?, ?, 1) 
-        ON CONFLICT(user_id) DO UPDATE SET vouch_count = ?
-        """, (member.id, new_count, new_count)):
-            return await ctx.send("❌ Database error!")
-        
-        if not admin:
-            if not db_execute(
-                "INSERT INTO vouch_records (voucher_id, vouched_id, timestamp) VALUES (?, ?, ?)",
-                (ctx.author.id, member.id, int(time.time()))
-            ):
-                return await ctx.send("❌ Database error!")
-        
-            db_execute("""
-            INSERT INTO vouch_reasons (voucher_id, vouched_id, reason, timestamp)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(voucher_id, vouched_id) DO UPDATE SET reason = ?, timestamp = ?
-            """, (ctx.author.id, member.id, reason, int(time.time()), reason, int(time.time())))
-        
-            db_execute("""
-            INSERT INTO vouch_cooldowns (user_id, last_vouch_time)
-            VALUES (?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET last_vouch_time = ?
-            """, (ctx.author.id, int(time.time()), int(time.time())))
-
-        
-        await update_nickname(member)
-        await ctx.send(f"✅ {member.mention} now has {new_count} vouches! Reason: {reason[:50]}")
-
-        # ============================================
-        # NEW: Send DM notification to the vouched user
-        # ============================================
-        try:
-            embed = discord.Embed(
-                title="🎉 You've received a vouch!",
-                description=f"**{ctx.author.display_name}** vouched for you in {ctx.guild.name}",
-                color=discord.Color.green()
-            )
-            embed.add_field(name="Reason", value=reason[:1024], inline=False)
-            embed.add_field(name="Total Vouches", value=new_count)
-            embed.set_footer(text=f"Vouched at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}")
-            
-            await member.send(embed=embed)
-        except discord.Forbidden:
-            # User has DMs disabled or blocked the bot - silently fail
-            pass
+            with self.vouch_graph_load(guild_id) as keep:
+                keep(await asyncio.to_thread(VouchGraph.load, guild_id))
         except Exception as e:
-            print(f"Failed to send vouch DM: {e}")
-        # ============================================
-        
-        # Schedule spam counter reset
-        if not admin:
-            await asyncio.sleep(60)
-            if ctx.author.id in bot.vouch_spam:
-                bot.vouch_spam[ctx.author.id] -= 1
-                if bot.vouch_spam[ctx.author.id] <= 0:
-                    del bot.vouch_spam[ctx.author.id]
-        
-    except Exception as e:
-        await ctx.send("❌ Failed to process vouch. Please try again.")
-        print(f"Vouch error: {e}")
-
-@bot.command()
-@commands.check(is_admin)
-async def clearvouches(ctx, member: discord.Member):
-    """[ADMIN] Reset a user's vouches and allow re-vouching"""
-    with get_db() as conn:
-        # Reset vouch count
-        conn.execute("UPDATE vouches SET vouch_count = 0 WHERE user_id = ?", (member.id,))
-        # Clear vouch history
-        conn.execute("DELETE FROM vouch_records WHERE vouched_id = ?", (member.id,))
-        # Clear cooldowns (NEW)
-        conn.execute("DELETE FROM vouch_cooldowns WHERE user_id = ?", (member.id,))
-    
-    await update_nickname(member)
-    await ctx.send(f"♻️ Completely reset vouches for {member.mention}! Users can now vouch for them again.")
-
-
-@bot.command()
-@commands.check(is_admin)
-async def clearvouches_all(ctx):
-    """[ADMIN] Reset ALL vouches and cooldowns"""
-    with get_db() as conn:
-        # Reset all counts
-        conn.execute("UPDATE vouches SET vouch_count = 0")
-        # Clear all records
-        conn.execute("DELETE FROM vouch_records")
-        # Clear all cooldowns (NEW)
-        conn.execute("DELETE FROM vouch_cooldowns")
-    
-    # Update nicknames
-    for member in ctx.guild.members:
-        if is_tracking_enabled(member.id):
-            await update_nickname(member)
-    
-    await ctx.send("♻️ Completely reset ALL vouches and cooldowns!")
-
-@bot.command()
-@commands.check(is_admin)
-async def fixnicks(ctx):
-    """[ADMIN] Force-clean ALL nicknames"""
-    count = 0
-    failed = 0
-    
-    await ctx.send("🔄 Starting nickname cleanup...")
-    
-    for member in ctx.guild.members:
-        try:
-            if is_tracking_enabled(member.id):
-                # First completely clean the nickname
-                base_name = clean_nickname(member.display_name)
-                await member.edit(nick=base_name)
-                
-                # Then properly update with tags
-                await update_nickname(member)
-                count += 1
-                await asyncio.sleep(0.5)  # Rate limiting
-        except Exception:
-            failed += 1
-    
-    await ctx.send(f"✅ Successfully updated {count} nicknames ({failed} failed)")
-
-@bot.command()
-@commands.check(is_admin)
-async def fix_vouch_records(ctx):
-    """[ADMIN] Reconcile all vouch counts with records"""
-    fixed = 0
-    users = db_fetchall("SELECT user_id, vouch_count FROM vouches")
-    for user in users:
-        records = db_fetchone("SELECT COUNT(*) FROM vouch_records WHERE vouched_id = ?", (user['user_id'],))[0]
-        diff = user['vouch_count'] - records
-        
-        if diff > 0:
-            # Add missing admin vouches
-            db_execute("INSERT INTO vouch_records (voucher_id, vouched_id) VALUES (?, ?)", 
-                      (ctx.author.id, user['user_id']))
-            fixed += diff
-        elif diff < 0:
-            # Remove excess vouches
-            db_execute("""
-            DELETE FROM vouch_records 
-            WHERE rowid IN (
-                SELECT rowid FROM vouch_records 
-                WHERE vouched_id = ? 
-                ORDER BY rowid DESC 
-                LIMIT ?
-            )
-            """, (user['user_id'], abs(diff)))
-            fixed += abs(diff)
-    
-    await ctx.send(f"✅ Fixed {fixed} vouch record mismatches!")
-
-@bot.command()
-@commands.check(is_admin)
-async def nuclear_fix(ctx, member: discord.Member):
-    """[ADMIN] COMPLETELY reset problematic nicknames"""
+            print(f"Reloading the vouch graph for guild {guild_id} failed: {e}")
+        finally:
+            self.vouch_graph_loads.pop(guild_id, None)
+
+    async def get_context(self, origin, /, *, cls=VouchContext):
+        return await super().get_context(origin, cls=cls)
+
+    async def setup_hook(self):
+        watchdog.start()
+        open_database()
+        if wal_archiver is not None:
+            wal_archiver.start()
+        self.add_view(AdminActionView(member_id=0))
+        for extension in EXTENSIONS:
+            await self.load_extension(extension)
+        for extension, names in LAZY_EXTENSIONS.items():
+            for name in names:
+                self.add_command(lazy_command(extension, name))
+        await sync_app_commands()
+
+# Long rate limits raise discord.RateLimited so the outbound scheduler pauses the bucket instead of a worker
+bot = VouchBot(command_prefix="!", intents=intents, max_ratelimit_timeout=MAX_RATELIMIT_WAIT)
+recorder = TraceRecorder(TRACE_PATH) if TRACE_PATH else None
+if recorder is not None:
+    bot.add_listener(recorder.record_interaction, "on_interaction")
+
+def lazy_command(extension, name):
+    """Hidden placeholder that loads `extension` and re-runs the message against the real command"""
+    async def load_and_invoke(ctx):
+        await load_lazy_extension(extension)
+        await bot.invoke(await bot.get_context(ctx.message))
+    # Marked so the trace records only the real command it re-invokes
+    return commands.Command(load_and_invoke, name=name, hidden=True, checks=[is_admin], extras={"lazy": True})
+
+async def load_lazy_extension(extension):
+    for name in LAZY_EXTENSIONS[extension]:
+        bot.remove_command(name)
     try:
-        # Get pure username without discriminator
-        original_name = member.name
-        
-        # Step 1: Reset to pure username
-        await member.edit(nick=original_name)
-        
-        # Step 2: Force update with clean tags
-        await update_nickname(member)
-        
-        await ctx.send(f"✅ Successfully reset {member.mention}'s nickname!")
-    except Exception as e:
-        await ctx.send(f"❌ Failed to reset nickname: {str(e)}")
-
-@bot.command()
-@commands.check(is_admin)
-async def resetnick(ctx, member: discord.Member):
-    """[ADMIN] Completely reset a user's nickname"""
-    base_name = clean_nickname(member.display_name)
-    try:
-        await member.edit(nick=base_name)
-        await ctx.send(f"✅ Reset {member.mention}'s nickname!")
-    except discord.HTTPException:
-        await ctx.send("❌ Failed to reset nickname (missing permissions)")
-
-@bot.command()
-@commands.check(is_admin)
-async def setvouches(ctx, member: discord.Member, count: int):
-    """[ADMIN] Set vouch count with timestamp tracking"""
-    current = get_vouches(member.id)
-    difference = count - current
-    current_time = int(time.time())
-    
-    try:
-        with get_db() as conn:
-            # Update main count
-            conn.execute("""
-                INSERT OR REPLACE INTO vouches 
-                VALUES (?, ?, 1)
-                """, (member.id, count))
-            
-            # Handle adjustments
-            if difference > 0:
-                # Insert with timestamps
-                conn.executemany("""
-                    INSERT OR IGNORE INTO vouch_records 
-                    (voucher_id, vouched_id, timestamp)
-                    VALUES (?, ?, ?)
-                    """, [(ctx.author.id, member.id, current_time)] * difference)
-            elif difference < 0:
-                # Delete oldest vouches first
-                conn.execute("""
-                    DELETE FROM vouch_records 
-                    WHERE rowid IN (
-                        SELECT rowid FROM vouch_records 
-                        WHERE vouched_id = ?
-                        ORDER BY timestamp ASC, rowid ASC
-                        LIMIT ?
-                    )
-                    """, (member.id, abs(difference)))
-        
-        await update_nickname(member)
-        await ctx.send(f"✅ Set {member.mention}'s vouches to {count}")
-    except sqlite3.Error as e:
-        await ctx.send(f"❌ Database error: {str(e)}")
-        print(f"Setvouches error: {traceback.format_exc()}")
-
-@bot.command()
-async def enablevouch(ctx):
-    """Enable vouch tracking"""
-    
-    if not db_execute("""
-    INSERT INTO vouches (user_id, tracking_enabled) VALUES (?, 1) 
-    ON CONFLICT(user_id) DO UPDATE SET tracking_enabled = 1
-    """, (ctx.author.id,)):
-        return await ctx.send("❌ Database error!")
-    
-    await update_nickname(ctx.author)
-    await ctx.send(f"✅ Vouch tracking enabled for {ctx.author.mention}!")
-
-@bot.command()
-async def disablevouch(ctx):
-    """Disable vouch tracking"""
-    
-    if not db_execute("UPDATE vouches SET tracking_enabled = 0 WHERE user_id = ?", (ctx.author.id,)):
-        return await ctx.send("❌ Database error!")
-    await update_nickname(ctx.author)
-    await ctx.send(f"✅ Vouch tracking disabled for {ctx.author.mention}!")
+        await bot.load_extension(extension)
+    except commands.ExtensionError:
+        for name in LAZY_EXTENSIONS[extension]:
+            bot.add_command(lazy_command(extension, name))
+        raise
+
+def resolve_extension(name):
+    return name if name.startswith("cogs.") else f"cogs.{name}"
+
+async def sync_app_commands():
+    """Push slash commands to Discord only when their definitions changed since the last sync"""
+    payload = sorted(
+        (command.to_dict(bot.tree) for command in bot.tree.get_commands()), key=lambda command: command['name']
+    )
+    fingerprint = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    if get_meta("app_commands_fingerprint") == fingerprint:
+        return False
+    await bot.tree.sync()
+    set_meta("app_commands_fingerprint", fingerprint)
+    print(f"Slash commands synced ({len(payload)} commands)")
+    return True
 
-@bot.command()
-@commands.check(is_admin)
-async def enablevouches_all(ctx):
-    """[ADMIN] Enable tracking for all"""
-    count = 0
-    for member in ctx.guild.members:
-        if not is_tracking_enabled(member.id):
-            if db_execute("""
-            INSERT INTO vouches (user_id, tracking_enabled) VALUES (?, 1)
-            ON CONFLICT(user_id) DO UPDATE SET tracking_enabled = 1
-            """, (member.id,)):
-                count += 1
-                await update_nickname(member)
-    
-    await ctx.send(f"✅ Enabled tracking for {count} users!")
+@bot.before_invoke
+async def acknowledge_interaction(ctx):
+    """Defer slash invocations up front so slow commands never miss Discord's 3-second deadline.
 
-@bot.command()
-@commands.check(is_admin)
-async def disablevouches_all(ctx):
-    """[ADMIN] Disable tracking for all"""
-    count = 0
-    for member in ctx.guild.members:
-        if is_tracking_enabled(member.id):
-            if db_execute("UPDATE vouches SET tracking_enabled = 0 WHERE user_id = ?", (member.id,)):
-                count += 1
-                await update_nickname(member)
-    
-    await ctx.send(f"✅ Disabled tracking for {count} users!")
+    Once deferred, every ctx.send from the command goes out as a follow-up.
+    """
+    if recorder is not None and not ctx.command.extras.get("lazy"):
+        recorder.record_command(ctx)
+    if ctx.interaction is not None and not ctx.interaction.response.is_done():
+        await ctx.defer(ephemeral=ctx.command.extras.get("ephemeral", False))
 
 @bot.command()
-@commands.check(is_admin)
-async def reconcile_vouches(ctx, member: discord.Member = None):
-    """[ADMIN] Fix vouch record mismatches safely"""
-    try:
-        if member:
-            # Single user reconciliation
-            vouch_count = get_vouches(member.id)
-            records = db_fetchone("SELECT COUNT(*) FROM vouch_records WHERE vouched_id = ?", (member.id,))[0]
-            
-            if vouch_count > records:
-                needed = vouch_count - records
-                db_execute("""
-                    INSERT OR IGNORE INTO vouch_records 
-                    SELECT DISTINCT ?, ? 
-                    WHERE NOT EXISTS (
-                        SELECT 1 FROM vouch_records 
-                        WHERE voucher_id = ? AND vouched_id = ?
-                    )
-                    LIMIT ?
-                    """, (ctx.author.id, member.id, ctx.author.id, member.id, needed))
-                await ctx.send(f"✅ Added {needed} admin records for {member.mention}")
+@commands.is_owner()
+async def reload(ctx, *names: str):
+    """[OWNER] Reload extensions in place (all loaded ones if none are named)"""
+    extensions = [resolve_extension(name) for name in names] or list(bot.extensions)
+    unknown = [e for e in extensions if e not in EXTENSIONS and e not in LAZY_EXTENSIONS]
+    if unknown:
+        return await ctx.send(f"❌ Unknown extension: {', '.join(f'`{e}`' for e in unknown)}")
+    for extension in extensions:
+        try:
+            if extension in bot.extensions:
+                await bot.reload_extension(extension)
+            elif extension in LAZY_EXTENSIONS:
+                await load_lazy_extension(extension)
             else:
-                await ctx.send(f"ℹ️ {member.mention}'s records are correct")
-        else:
-            # Full server reconciliation
-            fixed = 0
-            users = db_fetchall("SELECT user_id, vouch_count FROM vouches WHERE vouch_count > 0")
-            
-            for user in users:
-                records = db_fetchone("SELECT COUNT(*) FROM vouch_records WHERE vouched_id = ?", (user['user_id'],))[0]
-                if records < user['vouch_count']:
-                    needed = user['vouch_count'] - records
-                    db_execute("""
-                        INSERT OR IGNORE INTO vouch_records 
-                        SELECT DISTINCT ?, ? 
-                        WHERE NOT EXISTS (
-                            SELECT 1 FROM vouch_records 
-                            WHERE voucher_id = ? AND vouched_id = ?
-                        )
-                        LIMIT ?
-                        """, (ctx.author.id, user['user_id'], ctx.author.id, user['user_id'], needed))
-                    fixed += needed
-            
-            await ctx.send(f"✅ Fixed {fixed} vouch record mismatches")
-    except sqlite3.Error as e:
-        await ctx.send(f"❌ Database error during reconciliation: {str(e)}")
-
-@bot.command()
-@commands.check(is_admin)
-async def vouch_history(ctx, member: discord.Member, limit: int = 5):
-    """[ADMIN] Show recent vouch activity for a user"""
-    records = db_fetchall("""
-        SELECT vr.voucher_id, vr.timestamp, uu.user_id IS NOT NULL as is_admin, vr2.reason
-        FROM vouch_records vr
-        LEFT JOIN unvouchable_users uu ON vr.voucher_id = uu.user_id
-        LEFT JOIN vouch_reasons vr2 ON vr.voucher_id = vr2.voucher_id AND vr.vouched_id = vr2.vouched_id
-        WHERE vr.vouched_id = ?
-        ORDER BY vr.timestamp DESC
-        LIMIT ?
-    """, (member.id, limit))
-
-    if not records:
-        return await ctx.send(f"No vouch history found for {member.mention}")
-
-    lines = []
-    for record in records:
-        admin = ctx.guild.get_member(record['voucher_id'])
-        admin_name = admin.mention if admin else f"Unknown User ({record['voucher_id']})"
-        timestamp = datetime.datetime.fromtimestamp(record['timestamp']).strftime('%Y-%m-%d %H:%M')
-        lines.append(
-            f"{timestamp} - {admin_name} "
-            f"{'(ADMIN) ' if record['is_admin'] else ''}"
-            f"- Reason: {record['reason'] or 'None'}"
-        )
-
+                await bot.load_extension(extension)
+        except commands.ExtensionError as e:
+            return await ctx.send(f"❌ `{extension}` failed to load:\n```{e}```"[:2000])
+    synced = await sync_app_commands()
     await ctx.send(
-        f"**Last {limit} vouches for {member.mention}:**\n"
-        + "\n".join(lines)
+        f"🔄 Reloaded {', '.join(f'`{e}`' for e in extensions)}"
+        + (" and synced slash commands" if synced else "")
     )
 
 @bot.command()
-@commands.check(is_admin)
-async def fix_vouch_timestamps(ctx):
-    """[ADMIN] Repair missing timestamps in old records"""
-    count = db_execute("""
-        UPDATE vouch_records 
-        SET timestamp = ?
-        WHERE timestamp = 0 OR timestamp IS NULL
-    """, (int(time.time()),))
-    
-    await ctx.send(f"✅ Updated timestamps for {count} records")
-
-
-@bot.command()
-async def vouch_sources(ctx, member: discord.Member):
-    """Check where a user's vouches came from"""
-    vouchers = db_fetchall("""
-    SELECT voucher_id, COUNT(*) as count 
-    FROM vouch_records 
-    WHERE vouched_id = ?
-    GROUP BY voucher_id
-    """, (member.id,))
-    
-    if not vouchers:
-        return await ctx.send(f"❌ No vouch records found for {member.mention}")
-    
+@commands.is_owner()
+async def extensions(ctx):
+    """[OWNER] List extensions and whether they are loaded"""
     lines = []
-    for v in vouchers:
-        user = ctx.guild.get_member(v['voucher_id'])
-        name = user.mention if user else f"Unknown User ({v['voucher_id']})"
-        lines.append(f"{name}: {v['count']} vouches")
-    
-    await ctx.send(
-        f"**Vouch Sources for {member.mention}**\n" +
-        "\n".join(lines)[:2000]
-    )
-
-@bot.command()
-async def vouchstats(ctx, display: str = "count"):
-    """View vouch statistics"""
-    enabled_users = db_fetchall("SELECT user_id FROM vouches WHERE tracking_enabled = 1")
-    count = len(enabled_users)
-    
-    if display.lower() == "list":
-        if not is_admin(ctx):
-            return await ctx.send("❌ Only admins can view the full list!")
-        
-        users = []
-        for row in enabled_users:
-            if member := ctx.guild.get_member(row[0]):
-                users.append(f"{member.mention} ({member.display_name})")
-        
-        msg = f"📊 Users with tracking ({count}):\n" + "\n".join(users)
-        await ctx.send(msg[:2000])
-    else:
-        await ctx.send(f"📊 {count} users have vouch tracking enabled")
-
-# ========================
-# NEW ENHANCEMENTS (ADDED WITHOUT MODIFYING EXISTING CODE)
-# ========================
-
-@bot.command()
-async def verify(ctx, member: discord.Member = None):
-    """Verify vouch count with admin vouch context"""
-    target = member or ctx.author
-    
-    # 1. Get all data in one query
-    with get_db() as conn:
-        data = conn.execute("""
-            SELECT 
-                v.vouch_count,
-                COUNT(vr.voucher_id) as total_vouches,
-                SUM(CASE WHEN uu.user_id IS NOT NULL THEN 1 ELSE 0 END) as admin_vouches,
-                MAX(vr.timestamp) as last_vouch_time,
-                v.tracking_enabled,
-                EXISTS(SELECT 1 FROM unvouchable_users WHERE user_id = v.user_id) as is_unvouchable
-            FROM vouches v
-            LEFT JOIN vouch_records vr ON vr.vouched_id = v.user_id
-            LEFT JOIN unvouchable_users uu ON vr.voucher_id = uu.user_id
-            WHERE v.user_id = ?
-            GROUP BY v.user_id
-            """, (target.id,)).fetchone()
-
-    # 2. Parse data
-    vouch_count = data[0] if data else 0
-    total_vouches = data[1] if data else 0
-    admin_vouches = data[2] if data else 0
-    last_vouch_time = data[3] if data else 0
-    tracking_enabled = data[4] if data else False
-    is_unvouchable = data[5] if data else False
-    
-    community_vouches = total_vouches - admin_vouches
-    admin_adjustments = max(0, vouch_count - total_vouches)
-    
-    # 3. Check nickname tags
-    displayed_vouches = 0
-    if target.display_name:
-        match = re.search(r'[\[［](\d+)V[\]］]', target.display_name)
-        if match:
-            displayed_vouches = int(match.group(1))
-
-    # 4. Build response
-    response = [
-        f"**Verification for {target.mention}**",
-        f"• Displayed: {displayed_vouches}V",
-        f"• Database: {vouch_count} vouches",
-        f"┣ Community: {community_vouches}",
-        f"┣ Admin: {admin_vouches}",
-        f"┗ Adjustments: {admin_adjustments}",
-    ]
-
-    # 5. Determine status
-    if is_unvouchable:
-        status = "🔒 UNVOUCHABLE"
-    elif not tracking_enabled:
-        status = "⚙️ TRACKING OFF"
-    elif displayed_vouches > vouch_count:
-        status = "🚨 FAKE TAGS"
-        await notify_admins(ctx.guild, target, 
-            f"⚠️ Fake Tags Detected\n"
-            f"Shows: {displayed_vouches}V\n"
-            f"Actual: {vouch_count} vouches"
-        )
-    elif admin_adjustments > 0:
-        # Differentiate between recent admin actions and old adjustments
-        days_since_adjustment = (time.time() - last_vouch_time)/86400 if last_vouch_time else 999
-        
-        if days_since_adjustment < 7:  # Recent admin action
-            status = f"🛡️ {admin_adjustments} ADMIN-SET (Recent)"
-            response.append(f"• Last adjusted: {days_since_adjustment:.1f} days ago")
-        else:  # Historical/admin-approved
-            status = f"🛡️ {admin_adjustments} ADMIN-SET (Legacy)"
-    else:
-        status = "✅ VERIFIED"
-
-    response.append(f"• Status: {status}")
-    await ctx.send("\n".join(response))
-
-async def notify_admins(guild, member, reason):
-    """Send admin alerts with action buttons"""
-    _, admin_roles = get_config(guild.id)
-    staff_channel = get_staff_channel(guild)
-    
-    embed = discord.Embed(
-        title="🚨 Vouch Discrepancy Detected",
-        color=discord.Color.orange(),
-        description=(
-            f"**Member:** {member.mention}\n"
-            f"**Issue:** {reason}\n\n"
-            "**Action Required:** Verify and choose an option below"
-        )
-    )
-    embed.set_thumbnail(url=member.display_avatar.url)
-    
-    # Create persistent view with member context
-    view = AdminActionView(member.id)
-    
-    # Try staff channel first
-    if staff_channel:
-        try:
-            await staff_channel.send(
-                content=" ".join(f"<@&{rid}>" for rid in admin_roles) if admin_roles else "",
-                embed=embed,
-                view=view
-            )
-            return
-        except discord.HTTPException:
-            pass
-    
-    # Fallback to DM admins
-    notified = False
-    for role_id in admin_roles:
-        role = guild.get_role(role_id)
-        if role:
-            for admin in role.members:
-                if not admin.bot:
-                    try:
-                        await admin.send(embed=embed, view=view)
-                        notified = True
-                    except discord.Forbidden:
-                        continue
-    
-    if not notified:
-        print(f"Failed to notify admins about {member}")
-
-@bot.command()
-async def myvouches(ctx):
-    """Check your own vouch count and status"""
-    count = get_vouches(ctx.author.id)
-    cooldown = db_fetchone("SELECT last_vouch_time FROM vouch_cooldowns WHERE user_id = ?", (ctx.author.id,))
-    
-    msg = f"You have {count} legitimate vouches"
-    if cooldown and cooldown[0]:
-        remaining = max(0, 180 - (time.time() - cooldown[0]))
-        if remaining > 0:
-            msg += f"\n⏳ You can vouch again in {int(remaining // 60)}m {int(remaining % 60)}s"
-            
-    await ctx.send(msg)
-
-@bot.command()
-async def vouchboard(ctx, limit: int = 10):
-    """Show top vouched members"""
-    top = db_fetchall("""
-    SELECT user_id, vouch_count 
-    FROM vouches 
-    WHERE tracking_enabled = 1
-    ORDER BY vouch_count DESC 
-    LIMIT ?
-    """, (limit,))
-    
-    msg = "🏆 Top Vouched Members:\n"
-    for i, row in enumerate(top, 1):
-        if member := ctx.guild.get_member(row['user_id']):
-            msg += f"{i}. {member.display_name}: {row['vouch_count']}V\n"
-    
-    await ctx.send(msg[:2000])
-
-@bot.command()
-@commands.check(is_admin)
-async def backup_db(ctx):
-    """[ADMIN] Create a database backup"""
-    try:
-        with open('vouches.db', 'rb') as f:
-            # Send to both the original channel and admin alerts channel
-            await ctx.send("Database backup created successfully!")
-            alert_channel = bot.get_channel(ADMIN_ALERTS_CHANNEL_ID)
-            if alert_channel:
-                await alert_channel.send(
-                    f"Database backup requested by {ctx.author.mention} (ID: {ctx.author.id}):",
-                    file=discord.File(f, 'vouches_backup.db')
-                )
-            else:
-                await ctx.send("⚠️ Could not find admin alerts channel, but backup was created.")
-    except Exception as e:
-        error_msg = f"❌ Backup failed: {str(e)}"
-        await ctx.send(error_msg)
-        # Try to send error to admin channel too
-        try:
-            alert_channel = bot.get_channel(ADMIN_ALERTS_CHANNEL_ID)
-            if alert_channel:
-                await alert_channel.send(error_msg)
-        except:
-            pass
-
-@bot.tree.command(name="vouch", description="Vouch for a user")
-@app_commands.describe(
-    member="Who are you vouching for?",
-    reason="Why are you vouching them?"
-)
-async def slash_vouch(interaction: Interaction, member: Member, reason: str = "No reason provided"):
-    class FakeCtx:
-        def __init__(self, user, guild, channel):
-            self.author = user
-            self.guild = guild
-            self.channel = channel
-            self.send_output = StringIO()
-
-        async def send(self, content=None, **kwargs):
-            self.send_output.write(content or "")
-
-    ctx = FakeCtx(interaction.user, interaction.guild, interaction.channel)
-    try:
-        await bot.get_command("vouch").callback(ctx, member, reason=reason)
-        await interaction.response.send_message(ctx.send_output.getvalue() or "✅ Vouch submitted!", ephemeral=True)
-    except Exception as e:
-        print(f"[Slash Vouch Error] {e}")
-        await interaction.response.send_message("❌ Something went wrong.", ephemeral=True)
-
-@bot.tree.command(name="enablevouch", description="Enable vouch tracking for yourself")
-async def slash_enablevouch(interaction: Interaction):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    try:
-        await bot.get_command("enablevouch").callback(ctx)
-    except Exception as e:
-        print(f"[Slash EnableVouch Error] {e}")
-        await interaction.response.send_message("❌ Could not enable vouch tracking.", ephemeral=True)
-
-@bot.tree.command(name="disablevouch", description="Disable vouch tracking for yourself")
-async def slash_disablevouch(interaction: Interaction):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    try:
-        await bot.get_command("disablevouch").callback(ctx)
-    except Exception as e:
-        print(f"[Slash DisableVouch Error] {e}")
-        await interaction.response.send_message("❌ Could not disable vouch tracking.", ephemeral=True)
-
-@bot.tree.command(name="myvouches", description="Check your vouch count and cooldown status")
-async def slash_myvouches(interaction: Interaction):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    try:
-        await bot.get_command("myvouches").callback(ctx)
-    except Exception as e:
-        print(f"[Slash MyVouches Error] {e}")
-        await interaction.response.send_message("❌ Could not fetch your vouch stats.", ephemeral=True)
-
-@bot.tree.command(name="setconfig", description="[OWNER] Set a config value")
-@app_commands.describe(setting="Which setting to change", value="New value (channel ID or role IDs)")
-async def slash_setconfig(interaction: Interaction, setting: str, value: str):
-    if interaction.user.id != interaction.guild.owner_id:
-        await interaction.response.send_message("❌ Only the server owner can use this command.", ephemeral=True)
-        return
-
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    try:
-        await bot.get_command("setconfig").callback(ctx, setting=setting, value=value)
-    except Exception as e:
-        print(f"[Slash SetConfig Error] {e}")
-        await interaction.response.send_message("❌ Could not update config.", ephemeral=True)
-
-@bot.tree.command(name="setupvouchticket", description="[ADMIN] Post the vouch button")
-async def slash_setupvouchticket(interaction: Interaction):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    try:
-        await bot.get_command("setupvouchticket").callback(ctx)
-    except Exception as e:
-        print(f"[Slash SetupVouchTicket Error] {e}")
-        await interaction.response.send_message("❌ Could not set up vouch ticket.", ephemeral=True)
-
-@bot.tree.command(name="verify", description="Verify vouch count for a user (or yourself)")
-@app_commands.describe(member="Optional: check another member's vouch status")
-async def slash_verify(interaction: Interaction, member: Member = None):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    ctx.guild = interaction.guild
-    try:
-        await interaction.response.defer(thinking=True)
-        await bot.get_command("verify").callback(ctx, member or interaction.user)
-    except Exception as e:
-        print(f"[Slash Verify Error] {e}")
-        if not interaction.response.is_done():
-            await interaction.followup.send("❌ Could not verify vouch count.", ephemeral=True)
-
-@bot.tree.command(name="help", description="List available commands")
-async def slash_help(interaction: Interaction):
-    help_text = (
-        "**🛠️ Available Commands:**\n\n"
-        "• `/vouch` — Vouch for a user\n"
-        "• `/enablevouch` — Enable vouch tracking\n"
-        "• `/disablevouch` — Disable vouch tracking\n"
-        "• `/myvouches` — View your vouch count and cooldown\n"
-        "• `/verify` — Check vouch authenticity and status\n"
-        "• `/setconfig` — Configure bot (Server Owner only)\n"
-        "• `/setupvouchticket` — Post the vouch ticket button (Admins only)\n"
-        "\nType the slash `/` to see full autocomplete!"
-    )
-    await interaction.response.send_message(help_text, ephemeral=True)
-
-@bot.tree.command(name="unvouchable", description="[ADMIN] Toggle unvouchable status for a user")
-@app_commands.describe(member="User to modify", action="Enable or disable unvouchable status (on/off)")
-async def slash_unvouchable(interaction: Interaction, member: Member, action: str = "on"):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    if not is_admin(ctx):
-        await interaction.response.send_message("❌ Admins only.", ephemeral=True)
-        return
-    await bot.get_command("unvouchable").callback(ctx, member, action)
-    await interaction.response.defer()
-
-@bot.tree.command(name="unvouchable_list", description="[ADMIN] List all unvouchable users")
-async def slash_unvouchable_list(interaction: Interaction):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    if not is_admin(ctx):
-        await interaction.response.send_message("❌ Admins only.", ephemeral=True)
-        return
-    await bot.get_command("unvouchable_list").callback(ctx)
-    await interaction.response.defer()
-
-@bot.tree.command(name="setvouches", description="[ADMIN] Set a user's vouch count")
-@app_commands.describe(member="User to modify", count="New vouch count")
-async def slash_setvouches(interaction: Interaction, member: Member, count: int):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    if not is_admin(ctx):
-        await interaction.response.send_message("❌ Admins only.", ephemeral=True)
-        return
-    await bot.get_command("setvouches").callback(ctx, member, count)
-    await interaction.response.defer()
-
-@bot.tree.command(name="clearvouches", description="[ADMIN] Reset a user's vouches")
-@app_commands.describe(member="User to reset")
-async def slash_clearvouches(interaction: Interaction, member: Member):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    if not is_admin(ctx):
-        await interaction.response.send_message("❌ Admins only.", ephemeral=True)
-        return
-    await bot.get_command("clearvouches").callback(ctx, member)
-    await interaction.response.defer()
-
-@bot.tree.command(name="clearvouches_all", description="[ADMIN] Reset all vouches in the server")
-async def slash_clearvouches_all(interaction: Interaction):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    if not is_admin(ctx):
-        await interaction.response.send_message("❌ Admins only.", ephemeral=True)
-        return
-    await bot.get_command("clearvouches_all").callback(ctx)
-    await interaction.response.defer()
-
-@bot.tree.command(name="vouch_sources", description="See who vouched for a user")
-@app_commands.describe(member="User to check")
-async def slash_vouch_sources(interaction: Interaction, member: Member):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    await bot.get_command("vouch_sources").callback(ctx, member)
-    await interaction.response.defer()
-
-@bot.tree.command(name="vouchboard", description="Show top vouched members")
-@app_commands.describe(limit="Number of users to display (default 10)")
-async def slash_vouchboard(interaction: Interaction, limit: int = 10):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    await bot.get_command("vouchboard").callback(ctx, limit)
-    await interaction.response.defer()
-
-@bot.tree.command(name="vouchstats", description="View vouch tracking stats")
-@app_commands.describe(display="Show user count or list ('count' or 'list')")
-async def slash_vouchstats(interaction: Interaction, display: str = "count"):
-    ctx = await bot.get_context(interaction)
-    ctx.author = interaction.user
-    await bot.get_command("vouchstats").callback(ctx, display)
-    await interaction.response.defer()
-
+    for extension in (*EXTENSIONS, *LAZY_EXTENSIONS):
+        state = "loaded" if extension in bot.extensions else "lazy, not loaded yet"
+        lines.append(f"`{extension}`: {state}")
+    await ctx.send("\n".join(lines))
 
 @bot.event
 async def on_ready():
-    
-    bot.add_view(AdminActionView(member_id=0))
-    bot.add_view(VouchButtonView(bot))
-    
     print(f'Logged in as {bot.user.name}')
-    await bot.wait_until_ready()
-    await bot.tree.sync()
-    print(f"Slash commands synced as {bot.user.name}")
-    
-    bot.loop.create_task(clean_old_notifications())
-
-    for guild in bot.guilds:
-        staff_channel_name, admin_roles = get_config(guild.id)
-
-        # Check staff channel
-        channel = discord.utils.get(guild.text_channels, name=staff_channel_name)
-        missing_channel = channel is None
-
-        # Check admin roles
-        missing_roles = [rid for rid in admin_roles if guild.get_role(rid) is None]
-
-        # DM owner
-        if missing_channel or missing_roles:
-            try:
-                owner = guild.owner
-                msg = "**⚠️ VouchBot Configuration Warning**\n"
-                if missing_channel:
-                    msg += f"• Staff channel `{staff_channel_name}` not found.\n"
-                if missing_roles:
-                    msg += f"• Missing admin roles: `{', '.join(missing_roles)}`\n"
-                msg += "Use `!setconfig` to update them."
-                await owner.send(msg)
-            except Exception as e:
-                print(f"Failed to DM owner in {guild.name}: {e}")
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -1313,128 +232,78 @@ async def on_command_error(ctx, error):
                     available_commands.append(cmd.name)
             except:
                 continue
-        
+
         # Find similar commands
         invoked = ctx.invoked_with.lower()
         suggestions = []
-        
+
         # Check admin commands first if user is admin
         if is_admin(ctx):
             admin_commands = [cmd.name for cmd in bot.commands if cmd.checks]
             suggestions.extend(
-                cmd for cmd in admin_commands 
+                cmd for cmd in admin_commands
                 if cmd.startswith(invoked[:3])  # Match first 3 letters
             )
-        
+
         # Check regular commands
         regular_commands = [cmd.name for cmd in bot.commands if not cmd.checks]
         suggestions.extend(
             cmd for cmd in regular_commands
             if cmd.startswith(invoked[:3])
         )
-        
+
         # Remove duplicates and the failed command itself
         suggestions = list(set(suggestions) - {invoked})
-        
+
         # Build response
         if suggestions:
             response = f"❌ Command `!{invoked}` not found. Did you mean:\n"
             response += "\n".join(f"• `!{cmd}`" for cmd in suggestions[:3])  # Max 3 suggestions
         else:
             response = f"❌ Command `!{invoked}` not found. Use `!help` for available commands."
-        
+
         await ctx.send(response)
         return
-    
+
     # Special case for !myroles typo (keep your original behavior)
     if ctx.invoked_with == "myroles":
         await ctx.send("❌ Command not found. Did you mean `!myvouches`?")
         return
-    
+
+    # Slash invocations always need an answer or Discord shows a failed interaction
+    if ctx.interaction is not None and isinstance(error, commands.CheckFailure):
+        await ctx.send("❌ You don't have permission to use this command.", ephemeral=True)
+        return
+
     # Missing Permissions
     if isinstance(error, commands.MissingPermissions):
         await ctx.send("❌ You don't have permission to use this command.")
         return
-    
+
     # Bad Arguments (e.g., invalid number)
     if isinstance(error, commands.BadArgument):
         await ctx.send(f"❌ Invalid argument: {str(error)}")
         return
-    
+
+    if ctx.interaction is not None:
+        await ctx.send("❌ Something went wrong.", ephemeral=True)
+
     # Log unexpected errors to admin channel
     error_channel = bot.get_channel(ADMIN_ALERTS_CHANNEL_ID)  # Make sure this exists!
     if error_channel:
-        await error_channel.send(
+        await queue_send(
+            PRIORITY_ALERT, error_channel,
             f"⚠️ **Error in `{ctx.command or 'N/A'}`**\n"
             f"• User: {ctx.author.mention}\n"
             f"• Error: ```{str(error)[:1000]}```\n"
             f"[Jump to Message]({ctx.message.jump_url})"
         )
-    
+
     # Print to console for debugging
     print(f"[ERROR] {type(error)}: {error}")
 
-@bot.event
-async def on_raw_reaction_add(payload):
 
-    if not hasattr(bot, 'discrepancy_notifications'):
-        return
-    
-    if payload.message_id not in bot.discrepancy_notifications:
-        return
-    
-    # Skip bot's own reactions
-    if payload.user_id == bot.user.id:
-        return
-    
-    try:
-        data = bot.discrepancy_notifications[payload.message_id]
-        guild = bot.get_guild(payload.guild_id)
-        if not guild:
-            return
-
-        _, admin_roles = get_config(guild.id)
-        
-        # Get the member in question
-        member = guild.get_member(data['member_id'])
-        if not member:
-            return
-        
-        # Check if reaction is from admin
-        reactor = guild.get_member(payload.user_id)
-        if not reactor or not any(r.id in admin_roles for r in reactor.roles):
-            return
-
-        # Handle the action
-        if str(payload.emoji) == "✅":
-            # Reset vouches
-            db_execute("UPDATE vouches SET vouch_count = 0 WHERE user_id = ?", (member.id,))
-            db_execute("DELETE FROM vouch_records WHERE vouched_id = ?", (member.id,))
-            
-            # Clean nickname
-            try:
-                await member.edit(nick=clean_nickname(member.display_name))
-            except discord.HTTPException:
-                pass
-            
-            # Send confirmation where it came from
-            if data['admin_id'] == guild.me.id:  # Staff channel
-                channel = guild.get_channel(payload.channel_id)
-                if channel:
-                    await channel.send(f"✅ {reactor.mention} reset vouches for {member.mention}")
-            else:  # DM
-                try:
-                    await reactor.send(f"✅ Reset vouches for {member.mention}")
-                except discord.Forbidden:
-                    pass
-        
-        # Clean up
-        del bot.discrepancy_notifications[payload.message_id]
-        
-    except Exception as e:
-        print(f"Reaction handling error: {e}")
-        if payload.message_id in bot.discrepancy_notifications:
-            del bot.discrepancy_notifications[payload.message_id]
-            
-            
-bot.run(TOKEN)
+if __name__ == "__main__":
+    if TOKEN is None:
+        raise ValueError("No Discord token found!")
+    bot.run(TOKEN)
@@ -0,0 +1,159 @@
+"""Per-member locks for mutations.
+
+Commands, buttons and reactions that change one member's count, records,
+flags or nickname run inside member_locks.hold(guild_id, member_id). Two
+admins acting on the same member, or a vouch racing setvouches, then take
+turns instead of interleaving their reads, writes and nickname edits.
+Different members still proceed in parallel; nothing takes a global lock.
+
+Keys are hashed onto a fixed set of asyncio.Lock stripes, so memory stays
+bounded however many members the bot sees. Two members that share a
+stripe serialize with each other. That is rare with enough stripes, and
+metrics() counts it separately as a collision. The locks are not
+reentrant: code holding one member's lock must not take another's.
+
+Bulk jobs (jobs.py) take each member's lock around that member's step, so a
+job and a command never interleave on one member. A guild-wide clear
+(clearvouches_all) takes no member locks: it is one SQLite transaction, so
+a racing single-member write lands wholly before or after it, and the
+nickname refresh job it starts then re-syncs every member under their lock.
+
+Run `python memberlocks.py` to check the locking against a simulated race.
+"""
+import asyncio
+import collections
+import contextlib
+import time
+
+STRIPES = 1024  # Locks shared by all (guild, member) keys
+CONTENTION_HISTORY = 200  # Recent waits kept for the hottest-members report
+
+
+class MemberLocks:
+    def __init__(self, stripes=STRIPES):
+        self.locks = [None] * stripes  # Created on first use, inside the running loop
+        self.users = {}  # stripe -> Counter of keys holding or waiting for it
+        self.recent = collections.deque(maxlen=CONTENTION_HISTORY)  # (key, seconds waited)
+        self.acquired = 0
+        self.contended = 0  # Acquisitions that found their stripe busy
+        self.collisions = 0  # ... busy with at least one other member's key
+        self.waiting = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+        self.held = 0.0  # Total seconds locks were held
+
+    def stripe(self, key):
+        return hash(key) % len(self.locks)
+
+    @contextlib.asynccontextmanager
+    async def hold(self, guild_id, member_id):
+        """Hold the lock for one member for the duration of the block"""
+        key = (guild_id, member_id)
+        index = self.stripe(key)
+        users = self.users.setdefault(index, collections.Counter())
+        contended = bool(users)
+        if contended:
+            self.contended += 1
+            self.collisions += any(k != key for k in users)
+        users[key] += 1
+        lock = self.locks[index]
+        if lock is None:
+            lock = self.locks[index] = asyncio.Lock()
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._leave(index, key)
+            raise
+        finally:
+            self.waiting -= 1
+        acquired = time.monotonic()
+        self.acquired += 1
+        if contended:
+            self.waited += acquired - started
+            self.max_wait = max(self.max_wait, acquired - started)
+            self.recent.append((key, acquired - started))
+        try:
+            yield
+        finally:
+            self.held += time.monotonic() - acquired
+            lock.release()
+            self._leave(index, key)
+
+    def _leave(self, index, key):
+        users = self.users[index]
+        users[key] -= 1
+        if users[key] <= 0:
+            del users[key]
+        if not users:
+            del self.users[index]
+
+    def metrics(self, limit=5):
+        """Counters plus the members who waited longest recently, worst first"""
+        hot = collections.defaultdict(lambda: [0, 0.0])
+        for key, wait in self.recent:
+            hot[key][0] += 1
+            hot[key][1] += wait
+        return {
+            "stripes": len(self.locks),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "collisions": self.collisions,
+            "busy": sum(1 for lock in self.locks if lock is not None and lock.locked()),
+            "waiting": self.waiting,
+            "avg_wait_ms": self.waited / self.contended * 1000 if self.contended else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+            "avg_hold_ms": self.held / self.acquired * 1000 if self.acquired else 0.0,
+            "hot": sorted(
+                ((key, count, total * 1000) for key, (count, total) in hot.items()), key=lambda entry: -entry[2]
+            )[:limit],
+        }
+
+
+def check_member_locks():
+    """Race read-modify-write updates and check one member's run in turn while others overlap"""
+    locks = MemberLocks(stripes=8)
+    counts = collections.Counter()
+    inside = collections.Counter()
+    overlap = []
+
+    async def bump(member_id):
+        async with locks.hold(1, member_id):
+            inside[member_id] += 1
+            assert inside[member_id] == 1, "two holders for one member"
+            overlap.append(sum(1 for n in inside.values() if n))
+            count = counts[member_id]
+            await asyncio.sleep(0.001)
+            counts[member_id] = count + 1
+            inside[member_id] -= 1
+
+    async def race():
+        await asyncio.gather(*(bump(i % 20) for i in range(400)))
+
+        async def cancelled():
+            async with locks.hold(1, 0):
+                await asyncio.sleep(1)
+        task = asyncio.create_task(cancelled())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(bump(0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        task.cancel()
+        await asyncio.gather(task, waiter, return_exceptions=True)
+
+    started = time.perf_counter()
+    asyncio.run(race())
+    metrics = locks.metrics()
+    assert counts == {i: 20 for i in range(20)}, counts
+    assert max(overlap) > 1, "different members never overlapped"
+    assert metrics["acquired"] == 401 and metrics["contended"] > 0 and metrics["collisions"] > 0, metrics
+    assert not locks.users and metrics["busy"] == 0 and metrics["waiting"] == 0, metrics
+    return metrics, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    metrics, seconds = check_member_locks()
+    print(f"memberlocks: {metrics['acquired']} acquisitions, {metrics['contended']} waited "
+          f"({metrics['collisions']} on a shared stripe), max wait {metrics['max_wait_ms']:.1f} ms, "
+          f"in {seconds:.2f}s")
@@ -0,0 +1,128 @@
+"""Memory footprint of the bot's own state and discord.py's caches.
+
+structure_sizes() walks the long-lived containers the bot keeps on itself
+and in common.py and estimates their deep size. The walk follows builtin
+containers and the bot's own classes but stops at discord.py objects, so a
+member referenced from bot state is not counted as the whole member cache
+again. cache_sizes() counts what discord.py holds. allocation_diff()
+compares two tracemalloc snapshots taken a window apart, which shows the
+lines that allocated memory and did not release it during that window.
+"""
+import asyncio
+import collections
+import os
+import sys
+import tracemalloc
+from array import array
+
+from common import bot_nick_edits, member_locks, outbound, store, watchdog
+from loopwatch import is_own_code
+
+TRACEMALLOC_FRAMES = 10  # Frames kept per allocation while tracing
+MAX_WINDOW_SECONDS = 600
+CONTAINERS = (dict, list, set, frozenset, tuple, collections.deque)
+
+
+def is_own_object(obj):
+    module = sys.modules.get(type(obj).__module__)
+    return is_own_code(getattr(module, "__file__", None) or "")
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate bytes held by obj through builtin containers and the bot's own objects"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, CONTAINERS):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif not isinstance(obj, (str, bytes, int, float, array)) and is_own_object(obj):
+        size += deep_sizeof(getattr(obj, "__dict__", {}), seen)
+        for name in getattr(type(obj), "__slots__", ()):
+            size += deep_sizeof(getattr(obj, name, None), seen)
+    return size
+
+
+def structure_sizes(bot):
+    """(name, entries, approximate bytes) for every long-lived structure the bot owns, largest first"""
+    structures = {
+        "bot.vouch_spam": bot.vouch_spam,
+        "bot.discrepancy_notifications": bot.discrepancy_notifications,
+        "bot.fake_tag_pending": bot.fake_tag_pending,
+        "bot.fake_tag_reported": bot.fake_tag_reported,
+        "bot.nick_heal_tasks": bot.nick_heal_tasks,
+        "bot.vouch_graphs": bot.vouch_graphs,
+        "bot.jobs": bot.jobs,
+        "bot.job_slots": bot.job_slots,
+        "bot_nick_edits": bot_nick_edits,
+        "outbound.queue": outbound.queue,
+        "outbound.cooldowns": outbound.cooldowns,
+        "watchdog.lag": watchdog.lag,
+        "watchdog.stalls": watchdog.stalls,
+        "member_locks.users": member_locks.users,
+        "member_locks.recent": member_locks.recent,
+    }
+    sizes = [(name, len(value), deep_sizeof(value)) for name, value in structures.items()]
+    usage = store.memory_usage()
+    sizes.append(("read model", usage["users"] + usage["vouches"], usage["bytes"]))
+    return sorted(sizes, key=lambda size: -size[2])
+
+
+def cache_sizes(bot):
+    """Entry counts for discord.py's caches"""
+    return {
+        "guilds": len(bot.guilds),
+        "members": sum(len(guild.members) for guild in bot.guilds),
+        "users": len(bot.users),
+        "messages": len(bot.cached_messages),
+        "persistent views": len(bot.persistent_views),
+        "emojis": len(bot.emojis),
+    }
+
+
+def process_rss():
+    """Resident set size in bytes, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+async def allocation_diff(seconds, limit=10):
+    """Top allocation sites by growth over a window of `seconds`, as (lines, full listing).
+
+    tracemalloc is started for the window and stopped again unless it was
+    already running, since tracing slows every allocation. Snapshots are
+    taken and compared off the event loop.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        before = await asyncio.to_thread(tracemalloc.take_snapshot)
+        await asyncio.sleep(min(seconds, MAX_WINDOW_SECONDS))
+        after = await asyncio.to_thread(tracemalloc.take_snapshot)
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    def compare(key_type):
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+        stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), key_type)
+        return [stat for stat in stats if stat.size_diff > 0]
+
+    sites = await asyncio.to_thread(compare, "lineno")
+    lines = [
+        f"{os.path.basename(stat.traceback[-1].filename)}:{stat.traceback[-1].lineno}: "
+        f"+{stat.size_diff / 1024:.1f} KiB ({stat.count_diff:+d} blocks)"
+        for stat in sites[:limit]
+    ]
+    listing = []
+    for stat in (await asyncio.to_thread(compare, "traceback"))[:100]:
+        listing.append(f"+{stat.size_diff / 1024:.1f} KiB ({stat.count_diff:+d} blocks), {stat.size / 1024:.1f} KiB total")
+        listing.extend(f"    {line}" for line in stat.traceback.format(most_recent_first=True))
+    return lines, "\n".join(listing) + "\n"
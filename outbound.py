@@ -0,0 +1,175 @@
+"""Priority scheduler for outbound Discord API calls.
+
+Every call the bot makes on its own initiative goes through one
+OutboundScheduler so user-facing work is never stuck behind bulk work:
+interaction and command replies go first, then staff alerts, then DMs and
+single nickname updates, then bulk nickname jobs.
+
+Calls are grouped into buckets that mirror Discord's rate-limit scopes (a
+channel, an interaction, a DM recipient, a guild's member edits). Only one
+call per bucket is in flight at a time. discord.py sleeps through short rate
+limits itself, and the bucket stays busy while it does. The bot is built
+with max_ratelimit_timeout=MAX_RATELIMIT_WAIT, so a longer wait, whether
+from a 429 or from discord.py's own bucket tracking, raises
+discord.RateLimited instead. The bucket is then paused for its retry-after
+and the worker moves on to other buckets. A plain 429 HTTPException (a
+Cloudflare ban, or discord.py out of retries) pauses the bucket for
+RATE_LIMIT_BACKOFF.
+
+Each priority class has a cap on concurrent calls and on queued calls;
+callers past the queue cap wait in submit(), which is the backpressure bulk
+jobs feel when replies are busy.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+
+import discord
+
+PRIORITY_REPLY = 0
+PRIORITY_ALERT = 1
+PRIORITY_DM = 2
+PRIORITY_BULK = 3
+PRIORITY_NAMES = {
+    PRIORITY_REPLY: "replies",
+    PRIORITY_ALERT: "alerts",
+    PRIORITY_DM: "dms",
+    PRIORITY_BULK: "bulk",
+}
+
+# Concurrent calls per class; replies may use every slot
+CLASS_CONCURRENCY = {PRIORITY_REPLY: 4, PRIORITY_ALERT: 2, PRIORITY_DM: 2, PRIORITY_BULK: 1}
+# Queued calls per class before submit() starts waiting
+CLASS_QUEUE_LIMIT = {PRIORITY_REPLY: 1000, PRIORITY_ALERT: 200, PRIORITY_DM: 500, PRIORITY_BULK: 50}
+RATE_LIMIT_BACKOFF = 5  # Seconds to pause a bucket on a 429 without retry-after
+MAX_RATELIMIT_WAIT = 30.0  # Longest rate-limit sleep left to discord.py (its minimum); longer ones pause the bucket
+
+
+class ClassStats:
+    __slots__ = ("submitted", "completed", "failed", "rate_limited", "waited", "in_flight", "queued")
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.waited = 0.0  # Total seconds spent queued by completed calls
+        self.in_flight = 0
+        self.queued = 0
+
+
+class OutboundScheduler:
+    """Dispatch coroutine factories by priority, one call per rate-limit bucket at a time"""
+
+    def __init__(self, workers=4, concurrency=None, queue_limits=None):
+        self.workers = workers
+        self.concurrency = dict(concurrency or CLASS_CONCURRENCY)
+        self.queue_limits = dict(queue_limits or CLASS_QUEUE_LIMIT)
+        self.queue = []  # heap of (priority, seq, bucket, factory, future, enqueued_at)
+        self.seq = itertools.count()
+        self.in_flight = 0
+        self.busy_buckets = set()
+        self.cooldowns = {}  # bucket -> monotonic time it may be used again
+        self.wakeup = None
+        self.slots = {}  # priority -> Semaphore bounding queued + running calls
+        self.stats = {priority: ClassStats() for priority in PRIORITY_NAMES}
+
+    async def submit(self, priority, bucket, factory):
+        """Run factory() when its turn comes and return its result (or raise its error)"""
+        slot = self.slots.get(priority)
+        if slot is None:
+            slot = self.slots[priority] = asyncio.Semaphore(self.queue_limits[priority])
+        async with slot:
+            stats = self.stats[priority]
+            stats.submitted += 1
+            stats.queued += 1
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.queue, (priority, next(self.seq), bucket, factory, future, time.monotonic()))
+            self._dispatch()
+            return await future
+
+    def _dispatch(self):
+        now = time.monotonic()
+        skipped = []
+        while self.queue and self.in_flight < self.workers:
+            item = heapq.heappop(self.queue)
+            priority, _, bucket, _, future, _ = item
+            if future.done():  # Caller gave up
+                self.stats[priority].queued -= 1
+                continue
+            if (bucket in self.busy_buckets or self.cooldowns.get(bucket, 0) > now
+                    or self.stats[priority].in_flight >= self.concurrency[priority]):
+                skipped.append(item)
+                continue
+            self._start(item, now)
+        for item in skipped:
+            heapq.heappush(self.queue, item)
+        self._schedule_wakeup(now)
+
+    def _start(self, item, now):
+        priority, _, bucket, factory, future, enqueued_at = item
+        stats = self.stats[priority]
+        stats.queued -= 1
+        stats.in_flight += 1
+        stats.waited += now - enqueued_at
+        self.in_flight += 1
+        self.busy_buckets.add(bucket)
+        asyncio.get_running_loop().create_task(self._run(priority, bucket, factory, future))
+
+    async def _run(self, priority, bucket, factory, future):
+        stats = self.stats[priority]
+        try:
+            result = await factory()
+        except Exception as e:
+            stats.failed += 1
+            if isinstance(e, discord.RateLimited):
+                self._pause(bucket, e.retry_after)
+                stats.rate_limited += 1
+            elif isinstance(e, discord.HTTPException) and e.status == 429:
+                self._pause(bucket, RATE_LIMIT_BACKOFF)
+                stats.rate_limited += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            stats.completed += 1
+            if not future.done():
+                future.set_result(result)
+        finally:
+            stats.in_flight -= 1
+            self.in_flight -= 1
+            self.busy_buckets.discard(bucket)
+            self._dispatch()
+
+    def _pause(self, bucket, seconds):
+        self.cooldowns[bucket] = time.monotonic() + seconds
+
+    def _schedule_wakeup(self, now):
+        """Re-run dispatch when the earliest paused bucket with queued work reopens"""
+        for bucket, until in list(self.cooldowns.items()):
+            if until <= now:
+                del self.cooldowns[bucket]
+        if self.wakeup is not None or not self.cooldowns or not self.queue:
+            return
+        delay = min(self.cooldowns.values()) - now
+
+        def wake():
+            self.wakeup = None
+            self._dispatch()
+        self.wakeup = asyncio.get_running_loop().call_later(delay, wake)
+
+    def metrics(self):
+        """Per-class counters plus how many buckets are paused"""
+        classes = {}
+        for priority, stats in self.stats.items():
+            finished = stats.completed + stats.failed
+            classes[PRIORITY_NAMES[priority]] = {
+                "queued": stats.queued,
+                "in_flight": stats.in_flight,
+                "submitted": stats.submitted,
+                "completed": stats.completed,
+                "failed": stats.failed,
+                "rate_limited": stats.rate_limited,
+                "avg_wait_ms": stats.waited / finished * 1000 if finished else 0.0,
+            }
+        return {"classes": classes, "paused_buckets": len(self.cooldowns), "in_flight": self.in_flight}
@@ -0,0 +1,403 @@
+"""Replay a recorded trace against the bot offline and report latency.
+
+    python replay.py trace.jsonl [--speed 10] [--db vouches.db] [--max-gap 30] [--seed 1]
+
+The real bot and every extension are loaded without logging in. Discord's
+HTTP layer is replaced by MockDiscordAPI, which adds simulated latency and
+per-route rate limits. The database is a scratch SQLite file: an empty one,
+or a copy of --db so the replay sees production-sized tables. Commands are
+fed in at their recorded spacing divided by --speed (0 sends them all at
+once), each as its own task as they would arrive from the gateway. The
+report gives end-to-end latency percentiles per command, time to first
+response, event-loop lag and where the loop stalled.
+
+Only commands are replayed. Component and modal events are counted but
+skipped because their views only exist inside the recorded session.
+Owner-only commands fail their checks because there is no owner to match.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter, defaultdict, deque
+from itertools import count
+
+from discord.ext import commands
+
+import common
+from graph import VouchGraph
+from loopwatch import percentile
+from outbound import PRIORITY_REPLY
+from tracing import load_trace
+
+# (calls, per seconds) for each simulated route, keyed further by the bucket
+# id, roughly matching Discord's published per-route limits
+ROUTE_LIMITS = {
+    "message": (5, 5.0),        # per channel
+    "dm": (5, 5.0),             # per user
+    "member_edit": (10, 10.0),  # per guild
+    "interaction": (5, 1.0),    # per interaction (defer + follow-ups)
+}
+
+
+class MockDiscordAPI:
+    """Stand-in for Discord's HTTP layer.
+
+    Every call takes the base latency plus random jitter. A call that would
+    exceed its route's limit counts as a 429 and waits for the window to
+    reset before going through, the way discord.py's HTTP client does.
+    """
+
+    def __init__(self, latency=0.06, jitter=0.04, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.windows = defaultdict(deque)  # (route, bucket id) -> monotonic times of recent calls
+        self.calls = Counter()
+        self.rate_limited = Counter()
+
+    async def call(self, route, bucket_id):
+        limit, per = ROUTE_LIMITS[route]
+        window = self.windows[(route, bucket_id)]
+        while True:
+            now = time.monotonic()
+            while window and now - window[0] >= per:
+                window.popleft()
+            if len(window) < limit:
+                break
+            self.rate_limited[route] += 1
+            await asyncio.sleep(per - (now - window[0]))
+        window.append(now)
+        self.calls[route] += 1
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+    async def sync(self):
+        """Replaces bot.tree.sync"""
+        return []
+
+
+class ReplayAsset:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+
+class ReplayRole:
+    def __init__(self, role_id):
+        self.id = role_id
+        self.members = []
+
+
+class ReplayMessage:
+    def __init__(self, api, channel, content):
+        self.api = api
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content=None, **kwargs):
+        await self.api.call("message", self.channel.id)
+        self.content = content
+
+
+class ReplayChannel:
+    def __init__(self, api, channel_id):
+        self.api = api
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.mention = f"<#{channel_id}>"
+
+    async def send(self, content=None, **kwargs):
+        await self.api.call("message", self.id)
+        return ReplayMessage(self.api, self, content)
+
+
+class ReplayMember:
+    def __init__(self, api, guild, member_id):
+        self.api = api
+        self.guild = guild
+        self.id = member_id
+        self.name = f"user{member_id}"
+        self.nick = None
+        self.roles = []
+        self.bot = False
+        self.mention = f"<@{member_id}>"
+        self.display_avatar = ReplayAsset()
+
+    @property
+    def display_name(self):
+        return self.nick or self.name
+
+    async def edit(self, nick=None, **kwargs):
+        await self.api.call("member_edit", self.guild.id)
+        self.nick = nick
+
+    async def send(self, content=None, **kwargs):
+        await self.api.call("dm", self.id)
+        return ReplayMessage(self.api, self, content)
+
+    def __str__(self):
+        return self.name
+
+
+class ReplayGuild:
+    """Members, channels and roles are created the first time the trace mentions them"""
+
+    def __init__(self, api, guild_id):
+        self.api = api
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+        self.owner_id = 0
+        self.member_map = {}
+        self.channels = {}
+        self.role_map = {}
+
+    @property
+    def members(self):
+        return list(self.member_map.values())
+
+    @property
+    def text_channels(self):
+        return list(self.channels.values())
+
+    def get_member(self, member_id):
+        return self.member_map.get(member_id)
+
+    def get_channel(self, channel_id):
+        # Configured staff channels are assumed to exist
+        return self.channel(channel_id) if channel_id else None
+
+    def get_role(self, role_id):
+        return self.role_map.get(role_id)
+
+    def channel(self, channel_id):
+        if channel_id not in self.channels:
+            self.channels[channel_id] = ReplayChannel(self.api, channel_id)
+        return self.channels[channel_id]
+
+    def role(self, role_id):
+        if role_id not in self.role_map:
+            self.role_map[role_id] = ReplayRole(role_id)
+        return self.role_map[role_id]
+
+    def member(self, data):
+        """Member for a recorded {"id", "name", "nick", "roles"} dict, refreshed from it"""
+        member = self.member_map.get(data["id"])
+        if member is None:
+            member = self.member_map[data["id"]] = ReplayMember(self.api, self, data["id"])
+            member.name = data.get("name") or member.name
+            # Later nickname changes come from the bot itself, so only the first sighting sets it
+            member.nick = data.get("nick")
+        for role in member.roles:
+            role.members.remove(member)
+        member.roles = [self.role(role_id) for role_id in data.get("roles", ())]
+        for role in member.roles:
+            role.members.append(member)
+        return member
+
+
+class ReplayInteractionResponse:
+    def __init__(self):
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+
+class ReplayInteraction:
+    ids = count(1)
+
+    def __init__(self, client, ctx):
+        self.id = next(self.ids)
+        self.client = client
+        self.response = ReplayInteractionResponse()
+        # Hybrid command checks find their context through the interaction
+        self._baton = ctx
+
+
+class ReplayContext:
+    """The parts of commands.Context the cogs use; replies go through the outbound scheduler like VouchContext"""
+
+    def __init__(self, bot, api, command, guild, channel, author, slash):
+        self.bot = bot
+        self.api = api
+        self.command = command
+        self.cog = command.cog
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.interaction = ReplayInteraction(bot, self) if slash else None
+        self.message = None
+        self.invoked_with = command.name
+        self.responded_at = None  # Monotonic time the first defer or reply completed
+
+    def responded(self):
+        if self.responded_at is None:
+            self.responded_at = time.monotonic()
+
+    async def defer(self, ephemeral=False, **kwargs):
+        await self.api.call("interaction", self.interaction.id)
+        self.interaction.response.done = True
+        self.responded()
+
+    async def reply(self, content):
+        if self.interaction is None:
+            return await self.channel.send(content)
+        await self.api.call("interaction", self.interaction.id)
+        self.interaction.response.done = True
+        return ReplayMessage(self.api, self.channel, content)
+
+    async def send(self, content=None, **kwargs):
+        bucket = ("interaction", self.interaction.id) if self.interaction else ("channel", self.channel.id)
+        message = await common.outbound.submit(PRIORITY_REPLY, bucket, lambda: self.reply(content))
+        self.responded()
+        return message
+
+
+class ReplayHarness:
+    def __init__(self, bot, api):
+        self.bot = bot
+        self.api = api
+        self.guilds = {}  # guild_id -> ReplayGuild
+        self.latencies = defaultdict(list)  # command name -> seconds from arrival to completion
+        self.first_response = []  # seconds from arrival to the first defer or reply
+        self.outcomes = Counter()
+        self.errors = Counter()  # (command name, error) -> occurrences
+
+    def guild(self, guild_id):
+        if guild_id not in self.guilds:
+            self.guilds[guild_id] = ReplayGuild(self.api, guild_id)
+        return self.guilds[guild_id]
+
+    def decode(self, guild, value):
+        if isinstance(value, dict):
+            if "member" in value:
+                return guild.member(value["member"])
+            if "role" in value:
+                return guild.role(value["role"])
+            if "channel" in value:
+                return guild.channel(value["channel"])
+        return value
+
+    async def run_event(self, event, arrived):
+        """Run one recorded event; latency is measured from when it was due, not when it started"""
+        command = self.bot.get_command(event["name"]) if event["kind"] == "command" else None
+        if command is None or event.get("guild_id") is None:
+            self.outcomes["skipped"] += 1
+            return
+        guild = self.guild(event["guild_id"])
+        ctx = ReplayContext(
+            self.bot, self.api, command, guild, guild.channel(event["channel_id"]),
+            guild.member(event["author"]), event.get("slash", False),
+        )
+        args = [self.decode(guild, value) for value in event.get("args", ())]
+        kwargs = {key: self.decode(guild, value) for key, value in event.get("kwargs", {}).items()}
+        try:
+            if not await command.can_run(ctx):
+                raise commands.CheckFailure()
+            await command.call_before_hooks(ctx)
+            if command.cog is not None:
+                await command.callback(command.cog, ctx, *args, **kwargs)
+            else:
+                await command.callback(ctx, *args, **kwargs)
+            self.outcomes["ok"] += 1
+        except commands.CheckFailure:
+            self.outcomes["check failed"] += 1
+        except Exception as e:
+            self.outcomes["error"] += 1
+            self.errors[(command.qualified_name, f"{type(e).__name__}: {e}")] += 1
+        finally:
+            self.latencies[command.qualified_name].append(time.monotonic() - arrived)
+            if ctx.responded_at is not None:
+                self.first_response.append(ctx.responded_at - arrived)
+
+    async def replay(self, events, speed, max_gap=None):
+        started = time.monotonic()
+        offset, previous, tasks = 0.0, None, []
+        for event in events:
+            if previous is not None:
+                gap = event["at"] - previous
+                offset += min(gap, max_gap) if max_gap is not None else gap
+            previous = event["at"]
+            due = started + offset / speed if speed else time.monotonic()
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.run_event(event, due)))
+        await asyncio.gather(*tasks)
+        return time.monotonic() - started
+
+    def report(self, elapsed, speed):
+        ms = lambda seconds: f"{seconds * 1000:8.1f}"
+        total = sum(self.outcomes.values())
+        print(f"\nReplayed {total} events in {elapsed:.1f}s {f'at {speed}x' if speed else 'with no gaps'}: "
+              + ", ".join(f"{n} {outcome}" for outcome, n in self.outcomes.most_common()))
+        print(f"\n{'command':<24}{'count':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms, arrival to completion)")
+        for name, values in sorted(self.latencies.items(), key=lambda item: -len(item[1])):
+            print(f"{name:<24}{len(values):>6}{ms(percentile(values, 0.5))} {ms(percentile(values, 0.95))}"
+                  f" {ms(percentile(values, 0.99))} {ms(max(values))}")
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        print(f"{'all':<24}{len(all_latencies):>6}{ms(percentile(all_latencies, 0.5))} "
+              f"{ms(percentile(all_latencies, 0.95))} {ms(percentile(all_latencies, 0.99))} "
+              f"{ms(max(all_latencies, default=0.0))}")
+        print(f"{'first response':<24}{len(self.first_response):>6}{ms(percentile(self.first_response, 0.5))} "
+              f"{ms(percentile(self.first_response, 0.95))} {ms(percentile(self.first_response, 0.99))} "
+              f"{ms(max(self.first_response, default=0.0))}")
+        loop_lag = list(common.watchdog.lag)
+        print(f"{'event loop lag':<24}{len(loop_lag):>6}{ms(percentile(loop_lag, 0.5))} "
+              f"{ms(percentile(loop_lag, 0.95))} {ms(percentile(loop_lag, 0.99))} "
+              f"{ms(max(loop_lag, default=0.0))}")
+        for entry in common.watchdog.report()["offenders"]:
+            print(f"Loop stall in {entry['culprit']}: {entry['count']}x, worst {entry['worst'].duration * 1000:.1f}ms")
+        print("\nSimulated API calls: " + ", ".join(
+            f"{route} {n} ({self.api.rate_limited[route]} rate limited)" for route, n in sorted(self.api.calls.items())
+        ))
+        for priority, stats in common.outbound.metrics()["classes"].items():
+            if stats["submitted"]:
+                print(f"Outbound {priority}: {stats['completed']} sent, {stats['failed']} failed, "
+                      f"avg wait {stats['avg_wait_ms']:.1f}ms")
+        for (name, error), n in self.errors.most_common(10):
+            print(f"[ERROR] {name} x{n}: {error}")
+
+
+async def run(args):
+    events = load_trace(args.trace)
+    if not events:
+        raise SystemExit(f"{args.trace} has no events")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "replay.db")
+        if args.db:
+            shutil.copyfile(args.db, path)
+        common.store.engine.path = path
+
+        import main
+        main.recorder = None  # Never record the replay itself
+        api = MockDiscordAPI(seed=args.seed)
+        bot = main.bot
+        bot.tree.sync = api.sync
+        bot.owner_id = -1  # No one matches, instead of fetching application info
+        # Background loops wait for a gateway connection that never comes
+        bot.wait_until_ready = asyncio.Event().wait
+        # Keep every heartbeat of the run, not just the last few minutes
+        common.watchdog.lag = deque()
+        await bot.setup_hook()
+        for extension in main.LAZY_EXTENSIONS:
+            await main.load_lazy_extension(extension)
+
+        harness = ReplayHarness(bot, api)
+        for guild_id in {event["guild_id"] for event in events if event.get("guild_id") is not None}:
+            bot.vouch_graphs[guild_id] = VouchGraph.load(guild_id)
+        print(f"Replaying {len(events)} events from {args.trace}")
+        elapsed = await harness.replay(events, args.speed, args.max_gap)
+        harness.report(elapsed, args.speed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace", help="JSONL trace written with VOUCH_TRACE_PATH set")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression factor; 0 replays with no gaps")
+    parser.add_argument("--db", help="database to copy as the starting state (default: empty)")
+    parser.add_argument("--max-gap", type=float, help="cap idle gaps between events at this many recorded seconds")
+    parser.add_argument("--seed", type=int, help="seed for simulated API latency jitter")
+    asyncio.run(run(parser.parse_args()))
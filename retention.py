@@ -0,0 +1,216 @@
+"""Retention for the hot vouch database.
+
+Vouch records stay in the main file for good because duplicate detection,
+count reconciliation and the trust graph all read them. Their custom reason
+text, however, is rarely read once a vouch is old. archive_reasons() moves
+the reasons of records older than the retention age into an attached
+archive database that sits next to the main file (vouches_archive.db for
+vouches.db). It also negates each record's reason_id so the record points
+at its archived row. Vouch history shows ARCHIVED_REASON for those records,
+and reason search no longer matches them.
+
+prune_cooldowns() drops cooldown rows that expired long ago. vacuum_step()
+hands freed pages back to the filesystem a slice at a time with PRAGMA
+incremental_vacuum.
+
+run_retention() does all of this in short transactions off the event loop.
+It pauses between slices so vouch writes never wait behind it for long.
+
+Run `python retention.py` to check a retention pass against a scratch database.
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from storage import ARCHIVED_REASON, SQLiteStore
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("VOUCH_ARCHIVE_AFTER_DAYS", 365))
+COOLDOWN_RETENTION = 86400  # Cooldowns last three minutes, so day-old rows are dead weight
+RETENTION_INTERVAL = 24 * 3600  # Seconds between scheduled runs
+ARCHIVE_BATCH = 500  # Reasons moved per transaction
+VACUUM_SLICE = 256  # Pages released per incremental_vacuum step
+SLICE_PAUSE = 0.05  # Seconds between steps so other writers get the lock
+
+# An archived reason belongs to the record that points at it, so it is keyed
+# by that record plus the reason_id the record negated
+ARCHIVE_TABLE = """
+CREATE TABLE IF NOT EXISTS archive.{name} (
+    archive_id INTEGER PRIMARY KEY,
+    reason_id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    voucher_id INTEGER,
+    vouched_id INTEGER,
+    timestamp INTEGER,
+    reason TEXT,
+    archived_at INTEGER,
+    UNIQUE (guild_id, vouched_id, voucher_id, reason_id)
+)
+"""
+ARCHIVE_COLUMNS = "reason_id, guild_id, voucher_id, vouched_id, timestamp, reason, archived_at"
+
+
+def archive_path(store):
+    root, _ = os.path.splitext(store.path)
+    return f"{root}_archive.db"
+
+
+def attach_archive(conn, store):
+    """Attach the archive, creating or upgrading its table, and keep new reason IDs past archived ones"""
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path(store),))
+    columns = [row[1] for row in conn.execute("PRAGMA archive.table_info(vouch_reasons)")]
+    if columns and "archive_id" not in columns:
+        # Archives written while reason_id was the key
+        conn.execute("BEGIN")
+        try:
+            conn.execute("ALTER TABLE archive.vouch_reasons RENAME TO vouch_reasons_old")
+            conn.execute(ARCHIVE_TABLE.format(name="vouch_reasons"))
+            conn.execute(
+                f"INSERT INTO archive.vouch_reasons ({ARCHIVE_COLUMNS}) "
+                f"SELECT {ARCHIVE_COLUMNS} FROM archive.vouch_reasons_old"
+            )
+            conn.execute("DROP TABLE archive.vouch_reasons_old")
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+    conn.execute(ARCHIVE_TABLE.format(name="vouch_reasons"))
+    # IDs archived before vouch_reasons had AUTOINCREMENT may be above its sequence
+    archived = conn.execute("SELECT MAX(reason_id) FROM archive.vouch_reasons").fetchone()[0]
+    if archived:
+        raised = conn.execute(
+            "UPDATE main.sqlite_sequence SET seq = ? WHERE name = 'vouch_reasons' AND seq < ?", (archived, archived)
+        ).rowcount
+        if not raised and not conn.execute("SELECT 1 FROM main.sqlite_sequence WHERE name = 'vouch_reasons'").fetchone():
+            conn.execute("INSERT INTO main.sqlite_sequence (name, seq) VALUES ('vouch_reasons', ?)", (archived,))
+
+
+def archive_reasons(store, cutoff, after=0):
+    """Archive one batch of reasons for records older than `cutoff`.
+
+    Walks vouch_reasons in reason_id order from `after`; returns (reasons
+    moved, key to continue from, or None once the table is exhausted).
+    """
+    with store.connect() as conn:
+        attach_archive(conn, store)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("""
+                SELECT r.reason_id, r.guild_id, r.voucher_id, r.vouched_id, vr.timestamp, r.reason
+                FROM vouch_reasons r
+                JOIN vouch_records vr
+                  ON vr.guild_id = r.guild_id AND vr.vouched_id = r.vouched_id
+                 AND vr.voucher_id = r.voucher_id AND vr.reason_id = r.reason_id
+                WHERE r.reason_id > ?
+                ORDER BY r.reason_id
+                LIMIT ?
+            """, (after, ARCHIVE_BATCH)).fetchall()
+            # A zero timestamp is an unknown age, not an old vouch
+            old = [row for row in rows if row["timestamp"] and row["timestamp"] < cutoff]
+            # A plain INSERT, so a key collision fails the batch instead of overwriting a reason
+            conn.executemany(
+                f"INSERT INTO archive.vouch_reasons ({ARCHIVE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(*row, int(time.time())) for row in old]
+            )
+            conn.executemany(
+                "UPDATE vouch_records SET reason_id = -reason_id WHERE guild_id = ? AND vouched_id = ? AND voucher_id = ?",
+                [(row["guild_id"], row["vouched_id"], row["voucher_id"]) for row in old]
+            )
+            conn.executemany("DELETE FROM vouch_reasons WHERE reason_id = ?", [(row["reason_id"],) for row in old])
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+    return len(old), rows[-1]["reason_id"] if len(rows) == ARCHIVE_BATCH else None
+
+
+def prune_cooldowns(store, before):
+    """Delete cooldowns last used before `before`; returns rows deleted"""
+    with store.connect() as conn:
+        return conn.execute("DELETE FROM vouch_cooldowns WHERE last_vouch_time < ?", (before,)).rowcount
+
+
+def free_pages(store):
+    with store.connect() as conn:
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def vacuum_step(store):
+    """Release up to VACUUM_SLICE free pages; returns free pages left"""
+    with store.connect() as conn:
+        # Each step of the pragma frees a page, so it has to be stepped to completion
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_SLICE})").fetchall()
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+async def run_retention(store, days=ARCHIVE_AFTER_DAYS):
+    """Archive old reasons, prune dead cooldowns and release free pages; returns what was done"""
+    started = time.perf_counter()
+    cutoff = int(time.time()) - days * 86400
+    archived, after = 0, 0
+    while after is not None:
+        moved, after = await asyncio.to_thread(archive_reasons, store, cutoff, after)
+        archived += moved
+        await asyncio.sleep(SLICE_PAUSE)
+
+    pruned = await asyncio.to_thread(prune_cooldowns, store, int(time.time()) - COOLDOWN_RETENTION)
+
+    free = initial = await asyncio.to_thread(free_pages, store)
+    while free:
+        left = await asyncio.to_thread(vacuum_step, store)
+        if left >= free:
+            break  # Not in incremental mode, or another writer is freeing pages as fast
+        free = left
+        await asyncio.sleep(SLICE_PAUSE)
+
+    with store.connect() as conn:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return {
+        "archived": archived,
+        "cooldowns": pruned,
+        "bytes_freed": (initial - free) * page_size,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def check_retention(path):
+    """Fill a database, run retention and check nothing but old reason text left it"""
+    store = SQLiteStore(path)
+    now = int(time.time())
+    old, recent = now - 400 * 86400, now - 86400
+    for i in range(1, 1201):
+        store.add_vouch(1, i, 1 + i % 7, f"trade number {i} " * 20, old if i <= 1000 else recent)
+        store.set_last_vouch_time(1, i, old if i % 2 else now)
+    pairs = sorted(store.vouch_pairs())
+    result = asyncio.run(run_retention(store, 365))
+    assert result["archived"] == 1000 and result["cooldowns"] == 600 and result["bytes_freed"] > 0, result
+    assert sorted(store.vouch_pairs()) == pairs and store.has_vouched(1, 5, 6)
+    rows, _ = store.vouch_page(1, 1 + 1001 % 7, limit=200)
+    assert {row['reason'] == ARCHIVED_REASON for row in rows} == {True, False}
+    assert store.get_last_vouch_time(1, 2) == now and store.get_last_vouch_time(1, 3) is None
+    with store.connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM vouch_reasons").fetchone()[0] == 200
+        assert conn.execute("SELECT COUNT(*) FROM vouch_reasons_fts WHERE vouch_reasons_fts MATCH 'trade'").fetchone()[0] == 200
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path(store),))
+        assert conn.execute("SELECT COUNT(*) FROM archive.vouch_reasons").fetchone()[0] == 1000
+    # Clearing a member drops hot reasons and leaves archived ones alone
+    assert store.clear_records(1, 1 + 1001 % 7)
+    assert asyncio.run(run_retention(store, 365))["archived"] == 0
+    # Archiving the newest reason must not let its ID be handed out again
+    for voucher_id, reason in ((2001, "first late trade"), (2002, "second late trade")):
+        store.add_vouch(2, voucher_id, 9, reason, old)
+        assert asyncio.run(run_retention(store, 365))["archived"] == 1
+    with store.connect() as conn:
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path(store),))
+        reasons = conn.execute("SELECT reason_id, reason FROM archive.vouch_reasons WHERE guild_id = 2").fetchall()
+        assert sorted(reason for _, reason in reasons) == ["first late trade", "second late trade"], reasons
+        assert len({reason_id for reason_id, _ in reasons}) == 2
+    return result
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        result = check_retention(os.path.join(directory, "retention.db"))
+        print(f"retention: archived {result['archived']} reasons, pruned {result['cooldowns']} cooldowns, "
+              f"freed {result['bytes_freed'] / 1024:.0f} KiB in {result['seconds']:.2f}s")
@@ -0,0 +1,1854 @@
+"""Storage engines for the vouch bot.
+
+VouchStore is the interface every engine implements: vouch counts and
+tracking, vouch records and reasons, cooldowns, unvouchable users and guild
+config, all partitioned by guild. SQLiteStore is the production engine and MemoryStore keeps
+everything in plain dicts for tests and benchmarks. WriteCoalescer batches
+bursts of SQLite writes into group commits, and ReadModelStore wraps an
+engine to serve the hot per-user lookups from memory.
+
+Analytics (daily rollups, trust scores, reason search, the vouch graph) read
+SQLite directly and are not part of this interface.
+
+Run `python storage.py` to check both engines against the conformance suite.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_REASON = "No reason provided"
+ARCHIVED_REASON = "📦 Archived"  # Shown for reasons moved to the archive database (see retention.py)
+PAGE_SIZE = 10
+CONFIG_SETTINGS = ("staff_channel_id", "admin_roles_id")
+REFRESH_ATTEMPTS = 3  # Snapshots ReadModelStore.refresh() reads before warming on the loop instead
+
+
+def keyset_page(rows, limit, key_of):
+    """Trim a `limit + 1` row fetch to one page and compute the next key (None on the last page)"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, key_of(rows[-1])
+    return rows, None
+
+
+class VouchStore:
+    """Interface shared by all storage engines.
+
+    Everything about a member is scoped to one guild: every per-user method
+    takes the guild_id first, and a member's count, records, cooldown and
+    unvouchable flag in one guild are invisible to every other guild.
+
+    Write methods return True on success and False on failure, mirroring the
+    bot's db_execute helper; reads return empty values when nothing is found.
+    """
+
+    # Vouch counts and tracking
+    def get_vouches(self, guild_id, user_id):
+        raise NotImplementedError
+
+    def is_tracking_enabled(self, guild_id, user_id):
+        raise NotImplementedError
+
+    def set_tracking(self, guild_id, user_id, enabled):
+        raise NotImplementedError
+
+    def set_vouch_count(self, guild_id, user_id, count, admin_id=None, timestamp=0):
+        """Bring a count to `count` with one adjustment; new users are created with tracking enabled"""
+        raise NotImplementedError
+
+    def adjust_vouches(self, guild_id, user_id, delta, admin_id=None, timestamp=0):
+        """Store a signed admin adjustment; returns the new count, or None on failure"""
+        raise NotImplementedError
+
+    def recount_vouches(self, guild_id):
+        """Rebuild a guild's counts from records and adjustments; returns how many were wrong"""
+        raise NotImplementedError
+
+    def get_nickname_state(self, guild_id, user_id):
+        """(tracking_enabled, vouch_count, is_unvouchable)"""
+        raise NotImplementedError
+
+    def tracked_states(self, guild_id):
+        """[(user_id, vouch_count, is_unvouchable)] for every tracked user"""
+        raise NotImplementedError
+
+    def positive_counts(self, guild_id):
+        """{user_id: vouch_count} for users with at least one vouch"""
+        raise NotImplementedError
+
+    def all_counts(self, guild_id):
+        """[(user_id, vouch_count)] for every known user"""
+        raise NotImplementedError
+
+    def count_tracked(self, guild_id):
+        raise NotImplementedError
+
+    def tracked_page(self, guild_id, after=None, limit=PAGE_SIZE):
+        """One page of tracked user IDs, ascending"""
+        raise NotImplementedError
+
+    def verify_summary(self, guild_id, user_id):
+        """Counts used by `verify` (the count is total_vouches plus adjustments), or None for unknown users"""
+        raise NotImplementedError
+
+    # Records and reasons
+    def has_vouched(self, guild_id, voucher_id, vouched_id):
+        raise NotImplementedError
+
+    def add_vouch(self, guild_id, voucher_id, vouched_id, reason, timestamp):
+        """Store a vouch and its reason; False if it already exists"""
+        raise NotImplementedError
+
+    def record_vouch(self, guild_id, voucher_id, vouched_id, reason, timestamp):
+        """Atomically store a community vouch, bump the count and start the voucher's cooldown.
+
+        Returns the new vouch count, or None if the pair already exists.
+        """
+        raise NotImplementedError
+
+    def add_record(self, guild_id, voucher_id, vouched_id, timestamp=0):
+        """Store a bare record unless one exists for the pair; like every record it adds one to the count"""
+        raise NotImplementedError
+
+    def record_count(self, guild_id, vouched_id):
+        raise NotImplementedError
+
+    def remove_records(self, guild_id, vouched_id, count, newest_first=False):
+        raise NotImplementedError
+
+    def clear_records(self, guild_id, vouched_id):
+        raise NotImplementedError
+
+    def clear_vouches(self, guild_id, user_id=None):
+        """Reset counts, received records, adjustments and cooldowns for one user (or the whole guild)"""
+        raise NotImplementedError
+
+    def vouch_page(self, guild_id, vouched_id, after=None, limit=PAGE_SIZE):
+        """One page of a member's vouches, newest first.
+
+        Rows are dicts with voucher_id, timestamp, is_admin and reason.
+        """
+        raise NotImplementedError
+
+    def fill_missing_timestamps(self, guild_id, timestamp):
+        raise NotImplementedError
+
+    # Cooldowns
+    def get_last_vouch_time(self, guild_id, user_id):
+        raise NotImplementedError
+
+    def set_last_vouch_time(self, guild_id, user_id, timestamp):
+        raise NotImplementedError
+
+    # Unvouchable users
+    def is_unvouchable(self, guild_id, user_id):
+        raise NotImplementedError
+
+    def set_unvouchable(self, guild_id, user_id, unvouchable):
+        raise NotImplementedError
+
+    def unvouchable_page(self, guild_id, after=None, limit=PAGE_SIZE):
+        raise NotImplementedError
+
+    # Guild config
+    def get_config(self, guild_id):
+        """(staff_channel_id, admin_role_ids)"""
+        raise NotImplementedError
+
+    def set_config(self, guild_id, setting, value):
+        raise NotImplementedError
+
+    # Guild partitions
+    def claim_unassigned(self, guild_id):
+        """Move rows written before partitioning (UNASSIGNED_GUILD) into a guild; returns rows moved.
+
+        Rows that would collide with the guild's own data stay unassigned.
+        """
+        raise NotImplementedError
+
+    # Bulk reads for ReadModelStore
+    def user_states(self):
+        """[(guild_id, user_id, vouch_count, tracking_enabled)] for every known user"""
+        raise NotImplementedError
+
+    def unvouchable_ids(self):
+        """[(guild_id, user_id)]"""
+        raise NotImplementedError
+
+    def vouch_pairs(self, guild_id=None, vouched_id=None):
+        """[(guild_id, voucher_id, vouched_id)] for every record, or only those one member received"""
+        raise NotImplementedError
+
+
+# Every per-member table is keyed by guild_id first, so lookups, scans and
+# deletes for one guild only touch that guild's slice of each index.
+# Templates take the table name so migrations can build a copy beside the old one.
+GUILD_TABLES = {
+    # vouch_count is derived: the member's records plus their adjustments,
+    # kept in step by the triggers in create_vouch_counters()
+    "vouches": """
+    CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        vouch_count INTEGER DEFAULT 0,
+        tracking_enabled INTEGER DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id)
+    ) WITHOUT ROWID
+    """,
+    "unvouchable_users": """
+    CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (guild_id, user_id)
+    ) WITHOUT ROWID
+    """,
+    "vouch_cooldowns": """
+    CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        last_vouch_time INTEGER,
+        PRIMARY KEY (guild_id, user_id)
+    ) WITHOUT ROWID
+    """,
+    # One clustered row per vouch, ordered by the member who received it.
+    # Default reasons are stored as NULL so most vouches write a single row,
+    # and a negative reason_id points at a reason moved to the archive database.
+    "vouch_records": """
+    CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        vouched_id INTEGER NOT NULL,
+        voucher_id INTEGER NOT NULL,
+        timestamp INTEGER DEFAULT 0,
+        reason_id INTEGER,
+        PRIMARY KEY (guild_id, vouched_id, voucher_id)
+    ) WITHOUT ROWID
+    """,
+    # Custom reason text lives outside the hot row. AUTOINCREMENT keeps the
+    # IDs of reasons moved to the archive from being handed out again.
+    "vouch_reasons": """
+    CREATE TABLE IF NOT EXISTS {name} (
+        reason_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id INTEGER NOT NULL,
+        voucher_id INTEGER,
+        vouched_id INTEGER,
+        reason TEXT
+    )
+    """,
+    # Signed admin corrections to a count, one row per adjustment
+    "vouch_adjustments": """
+    CREATE TABLE IF NOT EXISTS {name} (
+        adjustment_id INTEGER PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        delta INTEGER NOT NULL,
+        admin_id INTEGER,
+        timestamp INTEGER DEFAULT 0
+    )
+    """,
+}
+UNASSIGNED_GUILD = 0  # Partition for rows written before data was split by guild
+
+
+def partition_by_guild(conn, tables):
+    """Rebuild tables that predate guild partitioning, parking their rows in UNASSIGNED_GUILD.
+
+    `tables` maps names to CREATE templates like GUILD_TABLES. A rebuilt
+    table loses its indexes and triggers with the old copy; the caller's
+    usual create step puts them back. Returns the names that were rebuilt.
+    """
+    pending = []
+    for name in tables:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({name})")]
+        if columns and "guild_id" not in columns:
+            pending.append((name, ", ".join(columns)))
+    if not pending:
+        return []
+
+    # Keep triggers on other tables pointing at the original names while tables are swapped
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    conn.execute("BEGIN")
+    try:
+        for name, columns in pending:
+            conn.execute(tables[name].format(name=f"{name}_partitioned"))
+            conn.execute(
+                f"INSERT INTO {name}_partitioned (guild_id, {columns}) SELECT ?, {columns} FROM {name}",
+                (UNASSIGNED_GUILD,)
+            )
+            conn.execute(f"DROP TABLE {name}")
+            conn.execute(f"ALTER TABLE {name}_partitioned RENAME TO {name}")
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+    print(f"Partitioned {', '.join(name for name, _ in pending)} by guild")
+    return [name for name, _ in pending]
+
+
+def create_vouch_storage(conn):
+    """Create the compact vouch tables, their indexes and the reason search index"""
+    conn.execute(GUILD_TABLES["vouch_records"].format(name="vouch_records"))
+    conn.execute(GUILD_TABLES["vouch_reasons"].format(name="vouch_reasons"))
+    # Keyset pagination over a member's vouches
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_vouch_vouched_time
+    ON vouch_records(guild_id, vouched_id, timestamp)
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS vouch_records_ad AFTER DELETE ON vouch_records
+    WHEN old.reason_id IS NOT NULL BEGIN
+        DELETE FROM vouch_reasons WHERE reason_id = old.reason_id;
+    END
+    """)
+
+    # Full-text index over vouch reasons, kept in sync by triggers
+    fts_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'vouch_reasons_fts'"
+    ).fetchone()
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS vouch_reasons_fts
+    USING fts5(reason, content='vouch_reasons', content_rowid='reason_id')
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS vouch_reasons_ai AFTER INSERT ON vouch_reasons BEGIN
+        INSERT INTO vouch_reasons_fts(rowid, reason) VALUES (new.reason_id, new.reason);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS vouch_reasons_ad AFTER DELETE ON vouch_reasons BEGIN
+        INSERT INTO vouch_reasons_fts(vouch_reasons_fts, rowid, reason) VALUES ('delete', old.reason_id, old.reason);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS vouch_reasons_au AFTER UPDATE ON vouch_reasons BEGIN
+        INSERT INTO vouch_reasons_fts(vouch_reasons_fts, rowid, reason) VALUES ('delete', old.reason_id, old.reason);
+        INSERT INTO vouch_reasons_fts(rowid, reason) VALUES (new.reason_id, new.reason);
+    END
+    """)
+    if not fts_exists:
+        # Index reasons written before the FTS table existed
+        conn.execute("INSERT INTO vouch_reasons_fts(vouch_reasons_fts) VALUES ('rebuild')")
+
+
+# Every change to vouch_records or vouch_adjustments moves the count it feeds,
+# in the same statement, so a stored count cannot disagree with its sources
+VOUCH_COUNT_TRIGGERS = {
+    "vouch_records_count_ai": """
+    AFTER INSERT ON vouch_records BEGIN
+        INSERT INTO vouches (guild_id, user_id, vouch_count) VALUES (new.guild_id, new.vouched_id, 1)
+        ON CONFLICT(guild_id, user_id) DO UPDATE SET vouch_count = vouch_count + 1;
+    END
+    """,
+    "vouch_records_count_ad": """
+    AFTER DELETE ON vouch_records BEGIN
+        UPDATE vouches SET vouch_count = vouch_count - 1 WHERE guild_id = old.guild_id AND user_id = old.vouched_id;
+    END
+    """,
+    "vouch_records_count_au": """
+    AFTER UPDATE OF guild_id, vouched_id ON vouch_records BEGIN
+        UPDATE vouches SET vouch_count = vouch_count - 1 WHERE guild_id = old.guild_id AND user_id = old.vouched_id;
+        INSERT INTO vouches (guild_id, user_id, vouch_count) VALUES (new.guild_id, new.vouched_id, 1)
+        ON CONFLICT(guild_id, user_id) DO UPDATE SET vouch_count = vouch_count + 1;
+    END
+    """,
+    "vouch_adjustments_count_ai": """
+    AFTER INSERT ON vouch_adjustments BEGIN
+        INSERT INTO vouches (guild_id, user_id, vouch_count) VALUES (new.guild_id, new.user_id, new.delta)
+        ON CONFLICT(guild_id, user_id) DO UPDATE SET vouch_count = vouch_count + new.delta;
+    END
+    """,
+    "vouch_adjustments_count_ad": """
+    AFTER DELETE ON vouch_adjustments BEGIN
+        UPDATE vouches SET vouch_count = vouch_count - old.delta WHERE guild_id = old.guild_id AND user_id = old.user_id;
+    END
+    """,
+    "vouch_adjustments_count_au": """
+    AFTER UPDATE OF guild_id, user_id, delta ON vouch_adjustments BEGIN
+        UPDATE vouches SET vouch_count = vouch_count - old.delta WHERE guild_id = old.guild_id AND user_id = old.user_id;
+        INSERT INTO vouches (guild_id, user_id, vouch_count) VALUES (new.guild_id, new.user_id, new.delta)
+        ON CONFLICT(guild_id, user_id) DO UPDATE SET vouch_count = vouch_count + new.delta;
+    END
+    """,
+}
+
+
+def create_vouch_counters(conn):
+    """Create vouch_adjustments and the triggers that derive vouch_count from records and adjustments.
+
+    On the first run every stored count that disagrees with its records
+    keeps its value through one legacy adjustment (no admin, timestamp 0)
+    for the difference, so no displayed count changes.
+    """
+    existing = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'vouch_adjustments'").fetchone()
+    conn.execute("BEGIN")
+    try:
+        conn.execute(GUILD_TABLES["vouch_adjustments"].format(name="vouch_adjustments"))
+        # Covers the per-member sum
+        conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_adjustments_user
+        ON vouch_adjustments(guild_id, user_id, delta)
+        """)
+        migrated = 0
+        if not existing:
+            migrated = conn.execute("""
+            INSERT INTO vouch_adjustments (guild_id, user_id, delta, admin_id, timestamp)
+            SELECT guild_id, user_id, SUM(n), NULL, 0 FROM (
+                SELECT guild_id, user_id, vouch_count AS n FROM vouches
+                UNION ALL
+                SELECT guild_id, vouched_id, -COUNT(*) FROM vouch_records GROUP BY guild_id, vouched_id
+            )
+            GROUP BY guild_id, user_id
+            HAVING SUM(n) != 0
+            """).rowcount
+        for name, body in VOUCH_COUNT_TRIGGERS.items():
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+    if migrated:
+        print(f"Kept {migrated} counts that differed from their records as legacy adjustments")
+
+
+def recount_vouches(conn, guild_id):
+    """Rewrite a guild's counts from records and adjustments; returns counts that were wrong"""
+    conn.execute("""
+    INSERT OR IGNORE INTO vouches (guild_id, user_id)
+    SELECT guild_id, vouched_id FROM vouch_records WHERE guild_id = ?
+    UNION SELECT guild_id, user_id FROM vouch_adjustments WHERE guild_id = ?
+    """, (guild_id, guild_id))
+    return conn.execute("""
+    UPDATE vouches SET vouch_count = derived.n
+    FROM (
+        SELECT v.user_id,
+               (SELECT COUNT(*) FROM vouch_records r WHERE r.guild_id = v.guild_id AND r.vouched_id = v.user_id)
+             + (SELECT COALESCE(SUM(a.delta), 0) FROM vouch_adjustments a
+                WHERE a.guild_id = v.guild_id AND a.user_id = v.user_id) AS n
+        FROM vouches v WHERE v.guild_id = ?
+    ) AS derived
+    WHERE vouches.guild_id = ? AND vouches.user_id = derived.user_id AND vouches.vouch_count IS NOT derived.n
+    """, (guild_id, guild_id)).rowcount
+
+
+def enable_incremental_vacuum(conn):
+    """Switch the file to incremental auto-vacuum so freed pages can be released a slice at a time.
+
+    An existing file only changes mode after one full VACUUM, which runs here once.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    existing = conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is not None
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    if existing:
+        started = time.perf_counter()
+        conn.execute("VACUUM")
+        print(f"Enabled incremental vacuum in {time.perf_counter() - started:.2f}s")
+
+
+def migrate_compact_vouch_storage(conn):
+    """Rewrite the old rowid vouch_records/vouch_reasons pair into the compact schema"""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'vouch_records'").fetchone()
+    if row is None or "WITHOUT ROWID" in row[0].upper():
+        return
+
+    has_reasons = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vouch_reasons'").fetchone()
+    conn.execute("BEGIN")
+    try:
+        for trigger in ("vouch_reasons_ai", "vouch_reasons_ad", "vouch_reasons_au"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP TABLE IF EXISTS vouch_reasons_fts")
+        conn.execute("DROP INDEX IF EXISTS idx_vouch_timestamp")
+        conn.execute("DROP INDEX IF EXISTS idx_vouch_vouched_time")
+        conn.execute("ALTER TABLE vouch_records RENAME TO vouch_records_old")
+        if has_reasons:
+            conn.execute("ALTER TABLE vouch_reasons RENAME TO vouch_reasons_old")
+
+        create_vouch_storage(conn)
+        if has_reasons:
+            # Reasons of cleared vouches have no record left and are dropped
+            conn.execute("""
+            INSERT INTO vouch_reasons (guild_id, voucher_id, vouched_id, reason)
+            SELECT ?, o.voucher_id, o.vouched_id, o.reason
+            FROM vouch_reasons_old o
+            JOIN vouch_records_old r ON r.voucher_id = o.voucher_id AND r.vouched_id = o.vouched_id
+            WHERE o.reason IS NOT NULL AND o.reason != ?
+            """, (UNASSIGNED_GUILD, DEFAULT_REASON))
+        conn.execute("""
+        INSERT OR IGNORE INTO vouch_records (guild_id, vouched_id, voucher_id, timestamp, reason_id)
+        SELECT ?, r.vouched_id, r.voucher_id, COALESCE(r.timestamp, 0), n.reason_id
+        FROM vouch_records_old r
+        LEFT JOIN vouch_reasons n ON n.voucher_id = r.voucher_id AND n.vouched_id = r.vouched_id
+        WHERE r.voucher_id IS NOT NULL AND r.vouched_id IS NOT NULL
+        """, (UNASSIGNED_GUILD,))
+        conn.execute("DROP TABLE vouch_records_old")
+        if has_reasons:
+            conn.execute("DROP TABLE vouch_reasons_old")
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+    print("Migrated vouch storage to the compact schema")
+
+
+def migrate_reason_ids(conn):
+    """Rebuild vouch_reasons with AUTOINCREMENT, keeping every reason_id; returns True if rebuilt"""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'vouch_reasons'").fetchone()
+    if row is None or "AUTOINCREMENT" in row[0].upper():
+        return False
+
+    # The search index and vouch_records_ad refer to vouch_reasons by name and survive the swap;
+    # the table's own triggers go with the old copy and create_vouch_storage() puts them back
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    conn.execute("BEGIN")
+    try:
+        conn.execute(GUILD_TABLES["vouch_reasons"].format(name="vouch_reasons_autoinc"))
+        conn.execute("""
+        INSERT INTO vouch_reasons_autoinc (reason_id, guild_id, voucher_id, vouched_id, reason)
+        SELECT reason_id, guild_id, voucher_id, vouched_id, reason FROM vouch_reasons
+        """)
+        conn.execute("DROP TABLE vouch_reasons")
+        conn.execute("ALTER TABLE vouch_reasons_autoinc RENAME TO vouch_reasons")
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+    print("Rebuilt vouch_reasons so reason IDs are never reused")
+    return True
+
+
+class SQLiteStore(VouchStore):
+    """Production engine backed by a single SQLite file"""
+
+    def __init__(self, path="vouches.db", init=True):
+        self.path = path
+        self.autocheckpoint = None  # WAL pages per automatic checkpoint; 0 while walarchive.py owns checkpoints
+        if init:
+            self.init_schema()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout = 30000")
+        if self.autocheckpoint is not None:
+            conn.execute(f"PRAGMA wal_autocheckpoint = {int(self.autocheckpoint)}")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def backup(self, path):
+        """Write a consistent copy of the database, including pages still in the WAL, to `path`"""
+        with self.connect() as conn:
+            dest = sqlite3.connect(path)
+            try:
+                conn.backup(dest)
+            finally:
+                dest.close()
+
+    def init_schema(self):
+        with self.connect() as conn:
+            enable_incremental_vacuum(conn)
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS config (
+                guild_id INTEGER PRIMARY KEY,
+                staff_channel_id TEXT DEFAULT '',
+                admin_roles_id TEXT DEFAULT ''
+            )
+            """)
+            migrate_compact_vouch_storage(conn)
+            partition_by_guild(conn, GUILD_TABLES)
+            migrate_reason_ids(conn)
+            for name in ("vouches", "unvouchable_users", "vouch_cooldowns"):
+                conn.execute(GUILD_TABLES[name].format(name=name))
+            # Tracked members of one guild, in keyset order
+            conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_vouches_tracked
+            ON vouches(guild_id, tracking_enabled, user_id)
+            """)
+            create_vouch_storage(conn)
+            create_vouch_counters(conn)
+
+    def _execute(self, query, params=()):
+        try:
+            with self.connect() as conn:
+                conn.execute(query, params)
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+
+    def _transaction(self, statements):
+        """Run [(query, params)] atomically"""
+        try:
+            with self.connect() as conn:
+                conn.execute("BEGIN")
+                try:
+                    for query, params in statements:
+                        conn.execute(query, params)
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK")
+                    raise
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+
+    def _write(self, fn, *args):
+        """Run fn(conn, *args) in its own transaction; None on failure"""
+        try:
+            with self.connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result = fn(conn, *args)
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK")
+                    raise
+            return result
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+
+    def _fetchone(self, query, params=()):
+        try:
+            with self.connect() as conn:
+                return conn.execute(query, params).fetchone()
+        except sqlite3.Error:
+            return None
+
+    def _fetchall(self, query, params=()):
+        try:
+            with self.connect() as conn:
+                return conn.execute(query, params).fetchall()
+        except sqlite3.Error:
+            return []
+
+    # Vouch counts and tracking
+    def get_vouches(self, guild_id, user_id):
+        row = self._fetchone("SELECT vouch_count FROM vouches WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
+        return row[0] if row else 0
+
+    def is_tracking_enabled(self, guild_id, user_id):
+        row = self._fetchone(
+            "SELECT tracking_enabled FROM vouches WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+        )
+        return bool(row and row[0] == 1)
+
+    def set_tracking(self, guild_id, user_id, enabled):
+        return self._execute("""
+        INSERT INTO vouches (guild_id, user_id, tracking_enabled) VALUES (?, ?, ?)
+        ON CONFLICT(guild_id, user_id) DO UPDATE SET tracking_enabled = excluded.tracking_enabled
+        """, (guild_id, user_id, int(enabled)))
+
+    def set_vouch_count(self, guild_id, user_id, count, admin_id=None, timestamp=0):
+        def adjust_to(conn):
+            row = conn.execute(
+                "SELECT vouch_count FROM vouches WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+            ).fetchone()
+            delta = count - (row[0] if row else 0)
+            return self.insert_adjustment(conn, guild_id, user_id, delta, admin_id, timestamp)
+        return self._write(adjust_to) is not None
+
+    def adjust_vouches(self, guild_id, user_id, delta, admin_id=None, timestamp=0):
+        return self._write(self.insert_adjustment, guild_id, user_id, delta, admin_id, timestamp)
+
+    @staticmethod
+    def insert_adjustment(conn, guild_id, user_id, delta, admin_id, timestamp):
+        """Store an adjustment on an open transaction and return the new count; new users start tracked"""
+        conn.execute(
+            "INSERT OR IGNORE INTO vouches (guild_id, user_id, tracking_enabled) VALUES (?, ?, 1)", (guild_id, user_id)
+        )
+        if delta:
+            conn.execute(
+                "INSERT INTO vouch_adjustments (guild_id, user_id, delta, admin_id, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (guild_id, user_id, delta, admin_id, timestamp)
+            )
+        return conn.execute(
+            "SELECT vouch_count FROM vouches WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+        ).fetchone()[0]
+
+    def recount_vouches(self, guild_id):
+        return self._write(recount_vouches, guild_id) or 0
+
+    def get_nickname_state(self, guild_id, user_id):
+        row = self._fetchone("""
+            SELECT v.tracking_enabled, v.vouch_count, uu.user_id IS NOT NULL
+            FROM vouches v
+            LEFT JOIN unvouchable_users uu ON uu.guild_id = v.guild_id AND uu.user_id = v.user_id
+            WHERE v.guild_id = ? AND v.user_id = ?
+        """, (guild_id, user_id))
+        if not row:
+            return False, 0, False
+        return row[0] == 1, row[1], bool(row[2])
+
+    def tracked_states(self, guild_id):
+        rows = self._fetchall("""
+            SELECT v.user_id, v.vouch_count, uu.user_id IS NOT NULL
+            FROM vouches v
+            LEFT JOIN unvouchable_users uu ON uu.guild_id = v.guild_id AND uu.user_id = v.user_id
+            WHERE v.guild_id = ? AND v.tracking_enabled = 1
+        """, (guild_id,))
+        return [(row[0], row[1], bool(row[2])) for row in rows]
+
+    def positive_counts(self, guild_id):
+        return dict(self._fetchall(
+            "SELECT user_id, vouch_count FROM vouches WHERE guild_id = ? AND vouch_count > 0", (guild_id,)
+        ))
+
+    def all_counts(self, guild_id):
+        return [
+            tuple(row) for row in self._fetchall("SELECT user_id, vouch_count FROM vouches WHERE guild_id = ?", (guild_id,))
+        ]
+
+    def count_tracked(self, guild_id):
+        row = self._fetchone("SELECT COUNT(*) FROM vouches WHERE guild_id = ? AND tracking_enabled = 1", (guild_id,))
+        return row[0] if row else 0
+
+    def tracked_page(self, guild_id, after=None, limit=PAGE_SIZE):
+        rows = self._fetchall("""
+            SELECT user_id FROM vouches WHERE guild_id = ? AND tracking_enabled = 1 AND user_id > ?
+            ORDER BY user_id LIMIT ?
+        """, (guild_id, after or 0, limit + 1))
+        return keyset_page([row[0] for row in rows], limit, lambda user_id: user_id)
+
+    def verify_summary(self, guild_id, user_id):
+        row = self._fetchone("""
+            SELECT
+                v.vouch_count,
+                COUNT(vr.voucher_id) as total_vouches,
+                SUM(CASE WHEN uu.user_id IS NOT NULL THEN 1 ELSE 0 END) as admin_vouches,
+                MAX(vr.timestamp) as last_vouch_time,
+                v.tracking_enabled,
+                EXISTS(
+                    SELECT 1 FROM unvouchable_users WHERE guild_id = v.guild_id AND user_id = v.user_id
+                ) as is_unvouchable,
+                (
+                    SELECT COALESCE(SUM(delta), 0) FROM vouch_adjustments WHERE guild_id = v.guild_id AND user_id = v.user_id
+                ) as adjustments,
+                (
+                    SELECT MAX(timestamp) FROM vouch_adjustments WHERE guild_id = v.guild_id AND user_id = v.user_id
+                ) as last_adjustment_time
+            FROM vouches v
+            LEFT JOIN vouch_records vr ON vr.guild_id = v.guild_id AND vr.vouched_id = v.user_id
+            LEFT JOIN unvouchable_users uu ON uu.guild_id = vr.guild_id AND uu.user_id = vr.voucher_id
+            WHERE v.guild_id = ? AND v.user_id = ?
+            GROUP BY v.user_id
+        """, (guild_id, user_id))
+        if not row:
+            return None
+        return {
+            "vouch_count": row[0],
+            "total_vouches": row[1],
+            "admin_vouches": row[2] or 0,
+            "last_vouch_time": row[3] or 0,
+            "tracking_enabled": row[4] == 1,
+            "is_unvouchable": bool(row[5]),
+            "adjustments": row[6],
+            "last_adjustment_time": row[7] or 0,
+        }
+
+    # Records and reasons
+    def has_vouched(self, guild_id, voucher_id, vouched_id):
+        row = self._fetchone(
+            "SELECT 1 FROM vouch_records WHERE guild_id = ? AND vouched_id = ? AND voucher_id = ?",
+            (guild_id, vouched_id, voucher_id)
+        )
+        return row is not None
+
+    def add_vouch(self, guild_id, voucher_id, vouched_id, reason, timestamp):
+        return self._write(self.insert_vouch, guild_id, voucher_id, vouched_id, reason, timestamp) is not None
+
+    def record_vouch(self, guild_id, voucher_id, vouched_id, reason, timestamp):
+        return self._write(self.write_vouch, guild_id, voucher_id, vouched_id, reason, timestamp)
+
+    @staticmethod
+    def insert_vouch(conn, guild_id, voucher_id, vouched_id, reason, timestamp):
+        """Insert a record and its reason on an open transaction; raises on a duplicate pair"""
+        reason_id = None
+        if reason and reason != DEFAULT_REASON:
+            reason_id = conn.execute(
+                "INSERT INTO vouch_reasons (guild_id, voucher_id, vouched_id, reason) VALUES (?, ?, ?, ?)",
+                (guild_id, voucher_id, vouched_id, reason)
+            ).lastrowid
+        conn.execute(
+            "INSERT INTO vouch_records (guild_id, vouched_id, voucher_id, timestamp, reason_id) VALUES (?, ?, ?, ?, ?)",
+            (guild_id, vouched_id, voucher_id, timestamp, reason_id)
+        )
+        return True
+
+    @classmethod
+    def write_vouch(cls, conn, guild_id, voucher_id, vouched_id, reason, timestamp):
+        """record_vouch on an open transaction, for use with WriteCoalescer"""
+        conn.execute(
+            "INSERT OR IGNORE INTO vouches (guild_id, user_id, tracking_enabled) VALUES (?, ?, 1)", (guild_id, vouched_id)
+        )
+        # The record's trigger bumps the count
+        cls.insert_vouch(conn, guild_id, voucher_id, vouched_id, reason, timestamp)
+        conn.execute("""
+            INSERT INTO vouch_cooldowns (guild_id, user_id, last_vouch_time) VALUES (?, ?, ?)
+            ON CONFLICT(guild_id, user_id) DO UPDATE SET last_vouch_time = excluded.last_vouch_time
+            """, (guild_id, voucher_id, timestamp))
+        return conn.execute(
+            "SELECT vouch_count FROM vouches WHERE guild_id = ? AND user_id = ?", (guild_id, vouched_id)
+        ).fetchone()[0]
+
+    def add_record(self, guild_id, voucher_id, vouched_id, timestamp=0):
+        return self._execute(
+            "INSERT OR IGNORE INTO vouch_records (guild_id, vouched_id, voucher_id, timestamp) VALUES (?, ?, ?, ?)",
+            (guild_id, vouched_id, voucher_id, timestamp)
+        )
+
+    def record_count(self, guild_id, vouched_id):
+        row = self._fetchone(
+            "SELECT COUNT(*) FROM vouch_records WHERE guild_id = ? AND vouched_id = ?", (guild_id, vouched_id)
+        )
+        return row[0] if row else 0
+
+    def remove_records(self, guild_id, vouched_id, count, newest_first=False):
+        order = "DESC" if newest_first else "ASC"
+        return self._execute(f"""
+            DELETE FROM vouch_records
+            WHERE guild_id = ? AND (vouched_id, voucher_id) IN (
+                SELECT vouched_id, voucher_id FROM vouch_records
+                WHERE guild_id = ? AND vouched_id = ?
+                ORDER BY timestamp {order}, voucher_id {order}
+                LIMIT ?
+            )
+            """, (guild_id, guild_id, vouched_id, count))
+
+    def clear_records(self, guild_id, vouched_id):
+        return self._execute(
+            "DELETE FROM vouch_records WHERE guild_id = ? AND vouched_id = ?", (guild_id, vouched_id)
+        )
+
+    def clear_vouches(self, guild_id, user_id=None):
+        # Counts drop to zero through the record and adjustment triggers
+        if user_id is None:
+            return self._transaction([
+                ("DELETE FROM vouch_records WHERE guild_id = ?", (guild_id,)),
+                ("DELETE FROM vouch_adjustments WHERE guild_id = ?", (guild_id,)),
+                ("DELETE FROM vouch_cooldowns WHERE guild_id = ?", (guild_id,)),
+            ])
+        return self._transaction([
+            ("DELETE FROM vouch_records WHERE guild_id = ? AND vouched_id = ?", (guild_id, user_id)),
+            ("DELETE FROM vouch_adjustments WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)),
+            ("DELETE FROM vouch_cooldowns WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)),
+        ])
+
+    def vouch_page(self, guild_id, vouched_id, after=None, limit=PAGE_SIZE):
+        query = """
+            SELECT vr.voucher_id, vr.timestamp, uu.user_id IS NOT NULL as is_admin,
+                   CASE WHEN vr.reason_id < 0 THEN ? ELSE vr2.reason END
+            FROM vouch_records vr
+            LEFT JOIN unvouchable_users uu ON uu.guild_id = vr.guild_id AND uu.user_id = vr.voucher_id
+            LEFT JOIN vouch_reasons vr2 ON vr2.reason_id = vr.reason_id
+            WHERE vr.guild_id = ? AND vr.vouched_id = ? {}
+            ORDER BY vr.timestamp DESC, vr.voucher_id DESC
+            LIMIT ?
+        """
+        if after is None:
+            rows = self._fetchall(query.format(""), (ARCHIVED_REASON, guild_id, vouched_id, limit + 1))
+        else:
+            rows = self._fetchall(query.format("AND (vr.timestamp, vr.voucher_id) < (?, ?)"),
+                                  (ARCHIVED_REASON, guild_id, vouched_id, *after, limit + 1))
+        rows = [
+            {"voucher_id": row[0], "timestamp": row[1] or 0, "is_admin": bool(row[2]), "reason": row[3]}
+            for row in rows
+        ]
+        return keyset_page(rows, limit, lambda row: (row['timestamp'], row['voucher_id']))
+
+    def fill_missing_timestamps(self, guild_id, timestamp):
+        try:
+            with self.connect() as conn:
+                return conn.execute("""
+                    UPDATE vouch_records
+                    SET timestamp = ?
+                    WHERE guild_id = ? AND (timestamp = 0 OR timestamp IS NULL)
+                """, (timestamp, guild_id)).rowcount
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return 0
+
+    # Cooldowns
+    def get_last_vouch_time(self, guild_id, user_id):
+        row = self._fetchone(
+            "SELECT last_vouch_time FROM vouch_cooldowns WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+        )
+        return row[0] if row else None
+
+    def set_last_vouch_time(self, guild_id, user_id, timestamp):
+        return self._execute("""
+            INSERT INTO vouch_cooldowns (guild_id, user_id, last_vouch_time)
+            VALUES (?, ?, ?)
+            ON CONFLICT(guild_id, user_id) DO UPDATE SET last_vouch_time = excluded.last_vouch_time
+            """, (guild_id, user_id, timestamp))
+
+    # Unvouchable users
+    def is_unvouchable(self, guild_id, user_id):
+        return self._fetchone(
+            "SELECT 1 FROM unvouchable_users WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+        ) is not None
+
+    def set_unvouchable(self, guild_id, user_id, unvouchable):
+        if unvouchable:
+            return self._execute(
+                "INSERT OR IGNORE INTO unvouchable_users (guild_id, user_id) VALUES (?, ?)", (guild_id, user_id)
+            )
+        return self._execute("DELETE FROM unvouchable_users WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
+
+    def unvouchable_page(self, guild_id, after=None, limit=PAGE_SIZE):
+        rows = self._fetchall(
+            "SELECT user_id FROM unvouchable_users WHERE guild_id = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+            (guild_id, after or 0, limit + 1)
+        )
+        return keyset_page([row[0] for row in rows], limit, lambda user_id: user_id)
+
+    # Guild config
+    def get_config(self, guild_id):
+        row = self._fetchone("SELECT staff_channel_id, admin_roles_id FROM config WHERE guild_id = ?", (guild_id,))
+        if row:
+            return int(row['staff_channel_id'] or 0), json.loads(row['admin_roles_id'] or "[]")
+        return 0, []
+
+    def set_config(self, guild_id, setting, value):
+        if setting not in CONFIG_SETTINGS:
+            return False
+        return self._execute(f"""
+            INSERT INTO config (guild_id, {setting})
+            VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET {setting} = excluded.{setting}
+        """, (guild_id, value))
+
+    # Guild partitions
+    def claim_unassigned(self, guild_id):
+        def claim(conn):
+            moved = sum(
+                conn.execute(
+                    f"UPDATE OR IGNORE {name} SET guild_id = ? WHERE guild_id = ?", (guild_id, UNASSIGNED_GUILD)
+                ).rowcount
+                for name in GUILD_TABLES if name != "vouch_adjustments"
+            )
+            # Adjustments never collide by key, so they follow their member's row
+            moved += conn.execute("""
+                UPDATE vouch_adjustments SET guild_id = ?
+                WHERE guild_id = ? AND user_id NOT IN (SELECT user_id FROM vouches WHERE guild_id = ?)
+                """, (guild_id, UNASSIGNED_GUILD, UNASSIGNED_GUILD)).rowcount
+            # Moved vouches rows brought their old counts along; derive them afresh
+            recount_vouches(conn, guild_id)
+            recount_vouches(conn, UNASSIGNED_GUILD)
+            return moved
+        return self._write(claim) or 0
+
+    # Bulk reads for ReadModelStore
+    def user_states(self):
+        rows = self._fetchall("SELECT guild_id, user_id, vouch_count, tracking_enabled FROM vouches")
+        return [(row[0], row[1], row[2], row[3] == 1) for row in rows]
+
+    def unvouchable_ids(self):
+        return [tuple(row) for row in self._fetchall("SELECT guild_id, user_id FROM unvouchable_users")]
+
+    def vouch_pairs(self, guild_id=None, vouched_id=None):
+        if guild_id is None:
+            rows = self._fetchall("SELECT guild_id, voucher_id, vouched_id FROM vouch_records")
+        else:
+            rows = self._fetchall(
+                "SELECT guild_id, voucher_id, vouched_id FROM vouch_records WHERE guild_id = ? AND vouched_id = ?",
+                (guild_id, vouched_id)
+            )
+        return [tuple(row) for row in rows]
+
+
+class WriteCoalescer:
+    """Group commit for bursts of SQLite writes.
+
+    Callers await submit(fn, *args) where fn(conn, *args) runs on an open
+    transaction. Pending writes are flushed together once max_batch of them
+    queue up or max_delay seconds pass, and writes that arrive while a batch
+    is committing form the next batch. Each write runs under its own
+    savepoint, so a failing write is rolled back alone and only its caller
+    sees the exception.
+    """
+
+    def __init__(self, store, max_batch=256, max_delay=0.005):
+        self.store = store
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = []  # [(fn, args, future)]
+        self.timer = None
+        self.inflight = None
+        # One writer thread owns the connection; sqlite3 connections are thread-bound
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vouch-writer")
+        self.conn = None
+        self.batches = 0
+        self.writes = 0
+
+    async def submit(self, fn, *args):
+        """Queue fn(conn, *args) for the next group commit and return its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((fn, args, future))
+        if self.inflight is None:
+            if len(self.pending) >= self.max_batch:
+                self._flush()
+            elif self.timer is None:
+                self.timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.inflight is not None or not self.pending:
+            return
+        batch = self.pending[:self.max_batch]
+        del self.pending[:self.max_batch]
+        loop = asyncio.get_running_loop()
+        self.inflight = loop.run_in_executor(self.executor, self._commit, batch)
+        self.inflight.add_done_callback(lambda done: self._resolve(batch, done))
+
+    def _resolve(self, batch, done):
+        self.inflight = None
+        try:
+            results = done.result()
+        except Exception as e:
+            print(f"Database error: {e}")
+            results = [(False, e)] * len(batch)
+        for (_, _, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        # Anything queued during the commit has already waited long enough
+        self._flush()
+
+    def _commit(self, batch):
+        """Run one batch in a single transaction (writer thread)"""
+        if self.conn is None:
+            self.conn = self.store.connect()
+        conn = self.conn
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for fn, args, _ in batch:
+                conn.execute("SAVEPOINT vouch_write")
+                try:
+                    results.append((True, fn(conn, *args)))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO vouch_write")
+                    results.append((False, e))
+                conn.execute("RELEASE vouch_write")
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        self.batches += 1
+        self.writes += len(batch)
+        return results
+
+
+class MemoryStore(VouchStore):
+    """In-memory engine for tests and benchmarks; nothing touches disk"""
+
+    def __init__(self):
+        # Every table is partitioned by guild_id first, like the SQLite schema
+        self.vouches = {}  # guild_id -> {user_id: [vouch_count, tracking_enabled]}
+        self.records = {}  # guild_id -> {vouched_id: {voucher_id: (timestamp, reason)}}
+        self.adjustments = {}  # guild_id -> {user_id: [(delta, admin_id, timestamp)]}
+        self.cooldowns = {}  # guild_id -> {user_id: last_vouch_time}
+        self.unvouchable = {}  # guild_id -> {user_id}
+        self.config = {}  # guild_id -> {setting: value}
+
+    # Vouch counts and tracking
+    def get_vouches(self, guild_id, user_id):
+        return self.vouches.get(guild_id, {}).get(user_id, (0, False))[0]
+
+    def is_tracking_enabled(self, guild_id, user_id):
+        return self.vouches.get(guild_id, {}).get(user_id, (0, False))[1]
+
+    def set_tracking(self, guild_id, user_id, enabled):
+        self.vouches.setdefault(guild_id, {}).setdefault(user_id, [0, False])[1] = bool(enabled)
+        return True
+
+    def _bump(self, guild_id, user_id, delta):
+        """Move a count the way the SQLite triggers do when a record or adjustment changes"""
+        self.vouches.setdefault(guild_id, {}).setdefault(user_id, [0, False])[0] += delta
+
+    def set_vouch_count(self, guild_id, user_id, count, admin_id=None, timestamp=0):
+        current = self.vouches.setdefault(guild_id, {}).setdefault(user_id, [0, True])[0]
+        return self.adjust_vouches(guild_id, user_id, count - current, admin_id, timestamp) is not None
+
+    def adjust_vouches(self, guild_id, user_id, delta, admin_id=None, timestamp=0):
+        entry = self.vouches.setdefault(guild_id, {}).setdefault(user_id, [0, True])
+        if delta:
+            self.adjustments.setdefault(guild_id, {}).setdefault(user_id, []).append((delta, admin_id, timestamp))
+            entry[0] += delta
+        return entry[0]
+
+    def recount_vouches(self, guild_id):
+        records, adjustments = self.records.get(guild_id, {}), self.adjustments.get(guild_id, {})
+        vouches = self.vouches.setdefault(guild_id, {})
+        for user_id in records.keys() | adjustments.keys():
+            vouches.setdefault(user_id, [0, False])
+        wrong = 0
+        for user_id, entry in vouches.items():
+            derived = len(records.get(user_id, ())) + sum(delta for delta, _, _ in adjustments.get(user_id, ()))
+            if entry[0] != derived:
+                entry[0] = derived
+                wrong += 1
+        return wrong
+
+    def get_nickname_state(self, guild_id, user_id):
+        vouches = self.vouches.get(guild_id, {})
+        if user_id not in vouches:
+            return False, 0, False
+        count, tracking = vouches[user_id]
+        return tracking, count, user_id in self.unvouchable.get(guild_id, ())
+
+    def tracked_states(self, guild_id):
+        unvouchable = self.unvouchable.get(guild_id, ())
+        return [
+            (user_id, count, user_id in unvouchable)
+            for user_id, (count, tracking) in self.vouches.get(guild_id, {}).items() if tracking
+        ]
+
+    def positive_counts(self, guild_id):
+        return {user_id: count for user_id, (count, _) in self.vouches.get(guild_id, {}).items() if count > 0}
+
+    def all_counts(self, guild_id):
+        return [(user_id, count) for user_id, (count, _) in self.vouches.get(guild_id, {}).items()]
+
+    def count_tracked(self, guild_id):
+        return sum(1 for _, tracking in self.vouches.get(guild_id, {}).values() if tracking)
+
+    def tracked_page(self, guild_id, after=None, limit=PAGE_SIZE):
+        ids = sorted(
+            user_id for user_id, (_, tracking) in self.vouches.get(guild_id, {}).items()
+            if tracking and user_id > (after or 0)
+        )
+        return keyset_page(ids[:limit + 1], limit, lambda user_id: user_id)
+
+    def verify_summary(self, guild_id, user_id):
+        vouches = self.vouches.get(guild_id, {})
+        if user_id not in vouches:
+            return None
+        count, tracking = vouches[user_id]
+        received = self.records.get(guild_id, {}).get(user_id, {})
+        adjustments = self.adjustments.get(guild_id, {}).get(user_id, ())
+        unvouchable = self.unvouchable.get(guild_id, ())
+        return {
+            "vouch_count": count,
+            "total_vouches": len(received),
+            "admin_vouches": sum(1 for voucher_id in received if voucher_id in unvouchable),
+            "last_vouch_time": max((timestamp for timestamp, _ in received.values()), default=0),
+            "tracking_enabled": tracking,
+            "is_unvouchable": user_id in unvouchable,
+            "adjustments": sum(delta for delta, _, _ in adjustments),
+            "last_adjustment_time": max((timestamp for _, _, timestamp in adjustments), default=0),
+        }
+
+    # Records and reasons
+    def has_vouched(self, guild_id, voucher_id, vouched_id):
+        return voucher_id in self.records.get(guild_id, {}).get(vouched_id, {})
+
+    def add_vouch(self, guild_id, voucher_id, vouched_id, reason, timestamp):
+        received = self.records.setdefault(guild_id, {}).setdefault(vouched_id, {})
+        if voucher_id in received:
+            return False
+        received[voucher_id] = (timestamp, reason if reason and reason != DEFAULT_REASON else None)
+        self._bump(guild_id, vouched_id, 1)
+        return True
+
+    def record_vouch(self, guild_id, voucher_id, vouched_id, reason, timestamp):
+        if self.has_vouched(guild_id, voucher_id, vouched_id):
+            return None
+        entry = self.vouches.setdefault(guild_id, {}).setdefault(vouched_id, [0, True])
+        self.add_vouch(guild_id, voucher_id, vouched_id, reason, timestamp)
+        self.cooldowns.setdefault(guild_id, {})[voucher_id] = timestamp
+        return entry[0]
+
+    def add_record(self, guild_id, voucher_id, vouched_id, timestamp=0):
+        received = self.records.setdefault(guild_id, {}).setdefault(vouched_id, {})
+        if voucher_id not in received:
+            received[voucher_id] = (timestamp, None)
+            self._bump(guild_id, vouched_id, 1)
+        return True
+
+    def record_count(self, guild_id, vouched_id):
+        return len(self.records.get(guild_id, {}).get(vouched_id, {}))
+
+    def remove_records(self, guild_id, vouched_id, count, newest_first=False):
+        received = self.records.get(guild_id, {}).get(vouched_id, {})
+        ordered = sorted(received, key=lambda voucher_id: (received[voucher_id][0], voucher_id), reverse=newest_first)
+        for voucher_id in ordered[:count]:
+            del received[voucher_id]
+            self._bump(guild_id, vouched_id, -1)
+        return True
+
+    def clear_records(self, guild_id, vouched_id):
+        received = self.records.get(guild_id, {}).pop(vouched_id, {})
+        if received:
+            self._bump(guild_id, vouched_id, -len(received))
+        return True
+
+    def clear_vouches(self, guild_id, user_id=None):
+        vouches = self.vouches.get(guild_id, {})
+        if user_id is None:
+            for entry in vouches.values():
+                entry[0] = 0
+            self.records.pop(guild_id, None)
+            self.adjustments.pop(guild_id, None)
+            self.cooldowns.pop(guild_id, None)
+        else:
+            if user_id in vouches:
+                vouches[user_id][0] = 0
+            self.records.get(guild_id, {}).pop(user_id, None)
+            self.adjustments.get(guild_id, {}).pop(user_id, None)
+            self.cooldowns.get(guild_id, {}).pop(user_id, None)
+        return True
+
+    def vouch_page(self, guild_id, vouched_id, after=None, limit=PAGE_SIZE):
+        received = self.records.get(guild_id, {}).get(vouched_id, {})
+        unvouchable = self.unvouchable.get(guild_id, ())
+        keys = sorted(((timestamp, voucher_id) for voucher_id, (timestamp, _) in received.items()), reverse=True)
+        if after is not None:
+            keys = [key for key in keys if key < tuple(after)]
+        rows = [
+            {
+                "voucher_id": voucher_id,
+                "timestamp": timestamp,
+                "is_admin": voucher_id in unvouchable,
+                "reason": received[voucher_id][1],
+            }
+            for timestamp, voucher_id in keys[:limit + 1]
+        ]
+        return keyset_page(rows, limit, lambda row: (row['timestamp'], row['voucher_id']))
+
+    def fill_missing_timestamps(self, guild_id, timestamp):
+        fixed = 0
+        for received in self.records.get(guild_id, {}).values():
+            for voucher_id, (old, reason) in received.items():
+                if not old:
+                    received[voucher_id] = (timestamp, reason)
+                    fixed += 1
+        return fixed
+
+    # Cooldowns
+    def get_last_vouch_time(self, guild_id, user_id):
+        return self.cooldowns.get(guild_id, {}).get(user_id)
+
+    def set_last_vouch_time(self, guild_id, user_id, timestamp):
+        self.cooldowns.setdefault(guild_id, {})[user_id] = timestamp
+        return True
+
+    # Unvouchable users
+    def is_unvouchable(self, guild_id, user_id):
+        return user_id in self.unvouchable.get(guild_id, ())
+
+    def set_unvouchable(self, guild_id, user_id, unvouchable):
+        if unvouchable:
+            self.unvouchable.setdefault(guild_id, set()).add(user_id)
+        else:
+            self.unvouchable.get(guild_id, set()).discard(user_id)
+        return True
+
+    def unvouchable_page(self, guild_id, after=None, limit=PAGE_SIZE):
+        ids = sorted(user_id for user_id in self.unvouchable.get(guild_id, ()) if user_id > (after or 0))
+        return keyset_page(ids[:limit + 1], limit, lambda user_id: user_id)
+
+    # Guild config
+    def get_config(self, guild_id):
+        settings = self.config.get(guild_id)
+        if not settings:
+            return 0, []
+        return int(settings.get("staff_channel_id") or 0), json.loads(settings.get("admin_roles_id") or "[]")
+
+    def set_config(self, guild_id, setting, value):
+        if setting not in CONFIG_SETTINGS:
+            return False
+        self.config.setdefault(guild_id, {})[setting] = value
+        return True
+
+    # Guild partitions
+    def claim_unassigned(self, guild_id):
+        moved = 0
+        for table in (self.vouches, self.records, self.cooldowns, self.unvouchable):
+            unassigned = table.get(UNASSIGNED_GUILD)
+            if not unassigned:
+                continue
+            target = table.setdefault(guild_id, type(unassigned)())
+            for key in list(unassigned):
+                if key in target:
+                    continue
+                if isinstance(unassigned, set):
+                    target.add(key)
+                    unassigned.discard(key)
+                    moved += 1
+                else:
+                    target[key] = unassigned.pop(key)
+                    moved += len(target[key]) if table is self.records else 1
+        # Adjustments follow their member's row, then counts are derived afresh
+        adjustments = self.adjustments.get(UNASSIGNED_GUILD, {})
+        for user_id in [user_id for user_id in adjustments if user_id not in self.vouches.get(UNASSIGNED_GUILD, {})]:
+            moved += len(adjustments[user_id])
+            self.adjustments.setdefault(guild_id, {}).setdefault(user_id, []).extend(adjustments.pop(user_id))
+        self.recount_vouches(guild_id)
+        self.recount_vouches(UNASSIGNED_GUILD)
+        return moved
+
+    # Bulk reads for ReadModelStore
+    def user_states(self):
+        return [
+            (guild_id, user_id, count, tracking)
+            for guild_id, vouches in self.vouches.items() for user_id, (count, tracking) in vouches.items()
+        ]
+
+    def unvouchable_ids(self):
+        return [(guild_id, user_id) for guild_id, users in self.unvouchable.items() for user_id in users]
+
+    def vouch_pairs(self, guild_id=None, vouched_id=None):
+        if guild_id is None:
+            partitions = self.records
+        else:
+            partitions = {guild_id: {vouched_id: self.records.get(guild_id, {}).get(vouched_id, {})}}
+        return [
+            (guild, voucher_id, vouched)
+            for guild, records in partitions.items()
+            for vouched, received in records.items() for voucher_id in received
+        ]
+
+
+class ReadModelStore:
+    """Wrap an engine and answer the hot per-user reads from a warm in-memory model.
+
+    warm() loads tracking and unvouchable flags, counts and every voucher ->
+    vouched pair in one pass per table, partitioned by guild like the
+    engine. Writes go to the engine first and update the model only if they
+    succeed, so the model never runs ahead of the database. Writes committed
+    outside this wrapper (the group-commit path) must be reported with
+    vouch_recorded(). Everything the model does not hold is delegated to the
+    engine unchanged.
+
+    The model belongs to the event loop. Call the write methods here on the
+    loop only. Engine reads and load() are safe in any thread. Code that
+    writes vouches, unvouchable_users or vouch_records around this wrapper
+    (retention, claiming, maintenance) must `await store.refresh()` on the
+    loop afterwards. refresh() is the one way to bring the model back in line
+    with the database.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.warm_model = False
+        self.counts = {}  # guild_id -> {user_id: vouch_count} for every row in `vouches`
+        self.tracking = {}  # guild_id -> {user_id}
+        self.unvouchable = {}  # guild_id -> {user_id}
+        self.received = {}  # guild_id -> {vouched_id: {voucher_id}}
+        self.generation = 0  # Bumped by every model update, so refresh() can spot a stale snapshot
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def warm(self):
+        """Load the model from the engine on the calling thread; returns seconds taken"""
+        started = time.perf_counter()
+        self.apply(self.load())
+        return time.perf_counter() - started
+
+    async def refresh(self):
+        """Reload the model after writes that bypassed this wrapper; call on the event loop.
+
+        The engine is read in a worker thread. The snapshot is applied only if
+        no update reached the model while it was being read, and is read again
+        otherwise. After REFRESH_ATTEMPTS tries the model is warmed on the loop,
+        so a steady stream of vouches cannot keep it stale.
+        """
+        if not self.warm_model:
+            return
+        for _ in range(REFRESH_ATTEMPTS):
+            generation = self.generation
+            snapshot = await asyncio.to_thread(self.load)
+            if generation == self.generation:
+                self.apply(snapshot)
+                return
+        self.warm()
+
+    def load(self):
+        """Read (counts, tracking, unvouchable, received) from the engine without touching the model"""
+        counts, tracking, unvouchable, received = {}, {}, {}, {}
+        for guild_id, user_id, count, enabled in self.engine.user_states():
+            counts.setdefault(guild_id, {})[user_id] = count
+            if enabled:
+                tracking.setdefault(guild_id, set()).add(user_id)
+        for guild_id, voucher_id, vouched_id in self.engine.vouch_pairs():
+            received.setdefault(guild_id, {}).setdefault(vouched_id, set()).add(voucher_id)
+        for guild_id, user_id in self.engine.unvouchable_ids():
+            unvouchable.setdefault(guild_id, set()).add(user_id)
+        return counts, tracking, unvouchable, received
+
+    def apply(self, snapshot):
+        self.counts, self.tracking, self.unvouchable, self.received = snapshot
+        self.warm_model = True
+        self.generation += 1
+
+    def memory_usage(self):
+        """Model sizes plus approximate bytes held by its containers and IDs"""
+        partitions = [*self.counts.values(), *self.tracking.values(), *self.unvouchable.values()]
+        receivers = [vouchers for received in self.received.values() for vouchers in received.values()]
+        pairs = sum(map(len, receivers))
+        containers = sum(map(sys.getsizeof, (self.counts, self.tracking, self.unvouchable, self.received)))
+        containers += sum(map(sys.getsizeof, (*partitions, *self.received.values(), *receivers)))
+        ids = sum(map(len, partitions)) + len(receivers) + pairs
+        return {
+            "guilds": len(self.counts.keys() | self.received.keys()),
+            "users": sum(map(len, self.counts.values())),
+            "tracked": sum(map(len, self.tracking.values())),
+            "unvouchable": sum(map(len, self.unvouchable.values())),
+            "vouches": pairs,
+            "bytes": containers + ids * sys.getsizeof(1 << 62),  # Snowflake-sized ints
+        }
+
+    def _reload_received(self, guild_id, vouched_id):
+        vouchers = {voucher_id for _, voucher_id, _ in self.engine.vouch_pairs(guild_id, vouched_id)}
+        if vouchers:
+            self.received.setdefault(guild_id, {})[vouched_id] = vouchers
+        else:
+            self.received.get(guild_id, {}).pop(vouched_id, None)
+
+    def _reload_count(self, guild_id, user_id):
+        """Re-read a count after a record write moved it through the engine's triggers"""
+        count = self.engine.get_vouches(guild_id, user_id)
+        counts = self.counts.setdefault(guild_id, {})
+        if count or user_id in counts:
+            counts[user_id] = count
+
+    def _set_count(self, guild_id, user_id, count):
+        """Store a count written through set_vouch_count semantics (new users start tracked)"""
+        counts = self.counts.setdefault(guild_id, {})
+        if user_id not in counts:
+            self.tracking.setdefault(guild_id, set()).add(user_id)
+        counts[user_id] = count
+
+    def vouch_recorded(self, guild_id, voucher_id, vouched_id, count):
+        """Apply a record_vouch that was committed through WriteCoalescer"""
+        self.generation += 1
+        self._set_count(guild_id, vouched_id, count)
+        self.received.setdefault(guild_id, {}).setdefault(vouched_id, set()).add(voucher_id)
+
+    # Vouch counts and tracking
+    def get_vouches(self, guild_id, user_id):
+        if not self.warm_model:
+            return self.engine.get_vouches(guild_id, user_id)
+        return self.counts.get(guild_id, {}).get(user_id, 0)
+
+    def is_tracking_enabled(self, guild_id, user_id):
+        if not self.warm_model:
+            return self.engine.is_tracking_enabled(guild_id, user_id)
+        return user_id in self.tracking.get(guild_id, ())
+
+    def set_tracking(self, guild_id, user_id, enabled):
+        self.generation += 1
+        ok = self.engine.set_tracking(guild_id, user_id, enabled)
+        if ok:
+            self.counts.setdefault(guild_id, {}).setdefault(user_id, 0)
+            if enabled:
+                self.tracking.setdefault(guild_id, set()).add(user_id)
+            else:
+                self.tracking.get(guild_id, set()).discard(user_id)
+        return ok
+
+    def set_vouch_count(self, guild_id, user_id, count, admin_id=None, timestamp=0):
+        self.generation += 1
+        ok = self.engine.set_vouch_count(guild_id, user_id, count, admin_id, timestamp)
+        if ok:
+            self._set_count(guild_id, user_id, count)
+        return ok
+
+    def adjust_vouches(self, guild_id, user_id, delta, admin_id=None, timestamp=0):
+        self.generation += 1
+        count = self.engine.adjust_vouches(guild_id, user_id, delta, admin_id, timestamp)
+        if count is not None:
+            self._set_count(guild_id, user_id, count)
+        return count
+
+    def recount_vouches(self, guild_id):
+        # Re-warms in the calling thread, so call it on the event loop like every other model write
+        self.generation += 1
+        wrong = self.engine.recount_vouches(guild_id)
+        if wrong and self.warm_model:
+            self.warm()
+        return wrong
+
+    def get_nickname_state(self, guild_id, user_id):
+        if not self.warm_model:
+            return self.engine.get_nickname_state(guild_id, user_id)
+        counts = self.counts.get(guild_id, {})
+        if user_id not in counts:
+            return False, 0, False
+        return (
+            user_id in self.tracking.get(guild_id, ()), counts[user_id], user_id in self.unvouchable.get(guild_id, ())
+        )
+
+    def tracked_states(self, guild_id):
+        if not self.warm_model:
+            return self.engine.tracked_states(guild_id)
+        counts, unvouchable = self.counts.get(guild_id, {}), self.unvouchable.get(guild_id, ())
+        return [(user_id, counts[user_id], user_id in unvouchable) for user_id in self.tracking.get(guild_id, ())]
+
+    def positive_counts(self, guild_id):
+        if not self.warm_model:
+            return self.engine.positive_counts(guild_id)
+        return {user_id: count for user_id, count in self.counts.get(guild_id, {}).items() if count > 0}
+
+    def count_tracked(self, guild_id):
+        if not self.warm_model:
+            return self.engine.count_tracked(guild_id)
+        return len(self.tracking.get(guild_id, ()))
+
+    # Records and reasons
+    def has_vouched(self, guild_id, voucher_id, vouched_id):
+        if not self.warm_model:
+            return self.engine.has_vouched(guild_id, voucher_id, vouched_id)
+        return voucher_id in self.received.get(guild_id, {}).get(vouched_id, ())
+
+    def add_vouch(self, guild_id, voucher_id, vouched_id, reason, timestamp):
+        self.generation += 1
+        ok = self.engine.add_vouch(guild_id, voucher_id, vouched_id, reason, timestamp)
+        if ok:
+            self.received.setdefault(guild_id, {}).setdefault(vouched_id, set()).add(voucher_id)
+            self._reload_count(guild_id, vouched_id)
+        return ok
+
+    def record_vouch(self, guild_id, voucher_id, vouched_id, reason, timestamp):
+        count = self.engine.record_vouch(guild_id, voucher_id, vouched_id, reason, timestamp)
+        if count is not None:
+            self.vouch_recorded(guild_id, voucher_id, vouched_id, count)
+        return count
+
+    def add_record(self, guild_id, voucher_id, vouched_id, timestamp=0):
+        self.generation += 1
+        ok = self.engine.add_record(guild_id, voucher_id, vouched_id, timestamp)
+        if ok:
+            self.received.setdefault(guild_id, {}).setdefault(vouched_id, set()).add(voucher_id)
+            self._reload_count(guild_id, vouched_id)
+        return ok
+
+    def remove_records(self, guild_id, vouched_id, count, newest_first=False):
+        self.generation += 1
+        ok = self.engine.remove_records(guild_id, vouched_id, count, newest_first)
+        # Which records went depends on their timestamps, which the model does not keep
+        self._reload_received(guild_id, vouched_id)
+        self._reload_count(guild_id, vouched_id)
+        return ok
+
+    def clear_records(self, guild_id, vouched_id):
+        self.generation += 1
+        ok = self.engine.clear_records(guild_id, vouched_id)
+        if ok:
+            self.received.get(guild_id, {}).pop(vouched_id, None)
+            self._reload_count(guild_id, vouched_id)
+        return ok
+
+    def clear_vouches(self, guild_id, user_id=None):
+        self.generation += 1
+        ok = self.engine.clear_vouches(guild_id, user_id)
+        counts = self.counts.get(guild_id, {})
+        if ok and user_id is None:
+            self.counts[guild_id] = dict.fromkeys(counts, 0)
+            self.received.pop(guild_id, None)
+        elif ok:
+            if user_id in counts:
+                counts[user_id] = 0
+            self.received.get(guild_id, {}).pop(user_id, None)
+        return ok
+
+    # Unvouchable users
+    def is_unvouchable(self, guild_id, user_id):
+        if not self.warm_model:
+            return self.engine.is_unvouchable(guild_id, user_id)
+        return user_id in self.unvouchable.get(guild_id, ())
+
+    def set_unvouchable(self, guild_id, user_id, unvouchable):
+        self.generation += 1
+        ok = self.engine.set_unvouchable(guild_id, user_id, unvouchable)
+        if ok and unvouchable:
+            self.unvouchable.setdefault(guild_id, set()).add(user_id)
+        elif ok:
+            self.unvouchable.get(guild_id, set()).discard(user_id)
+        return ok
+
+    # Guild partitions
+    def claim_unassigned(self, guild_id):
+        self.generation += 1
+        moved = self.engine.claim_unassigned(guild_id)
+        if moved and self.warm_model:
+            self.warm()
+        return moved
+
+
+def run_conformance(store):
+    """Exercise every VouchStore method; raises AssertionError on the first mismatch"""
+    g, other = 5, 6
+    assert store.get_vouches(g, 1) == 0
+    assert not store.is_tracking_enabled(g, 1)
+    assert store.get_nickname_state(g, 1) == (False, 0, False)
+    assert store.verify_summary(g, 1) is None
+
+    # Tracking and counts
+    assert store.set_tracking(g, 1, True)
+    assert store.is_tracking_enabled(g, 1)
+    assert store.set_vouch_count(g, 1, 3)
+    assert store.get_vouches(g, 1) == 3
+    assert store.set_vouch_count(g, 2, 5)
+    assert store.is_tracking_enabled(g, 2)
+    assert store.set_tracking(g, 2, False)
+    assert store.get_vouches(g, 2) == 5
+    assert store.count_tracked(g) == 1
+    assert store.positive_counts(g) == {1: 3, 2: 5}
+    assert sorted(store.all_counts(g)) == [(1, 3), (2, 5)]
+
+    # Guild partitions are independent
+    assert store.set_vouch_count(other, 1, 9)
+    assert store.get_vouches(g, 1) == 3 and store.get_vouches(other, 1) == 9
+    assert store.positive_counts(other) == {1: 9} and store.count_tracked(other) == 1
+    assert not store.is_tracking_enabled(other, 2)
+
+    # Unvouchable users
+    assert store.set_unvouchable(g, 1, True)
+    assert store.set_unvouchable(g, 1, True)
+    assert store.is_unvouchable(g, 1) and not store.is_unvouchable(other, 1)
+    assert store.get_nickname_state(g, 1) == (True, 3, True)
+    assert store.get_nickname_state(other, 1) == (True, 9, False)
+    assert store.tracked_states(g) == [(1, 3, True)]
+    assert store.set_unvouchable(g, 1, False)
+    assert not store.is_unvouchable(g, 1)
+
+    # Records and reasons
+    assert store.add_vouch(g, 10, 1, "fast trade", 100)
+    assert not store.add_vouch(g, 10, 1, "again", 101)
+    assert store.add_vouch(other, 10, 1, "other server", 100)
+    assert store.add_vouch(g, 11, 1, DEFAULT_REASON, 200)
+    assert store.add_vouch(g, 12, 1, "middleman", 200)
+    assert store.add_record(g, 13, 1)
+    assert store.add_record(g, 13, 1, 500)
+    assert store.has_vouched(g, 10, 1)
+    assert not store.has_vouched(g, 1, 10) and not store.has_vouched(other, 12, 1)
+    assert store.record_count(g, 1) == 4 and store.record_count(other, 1) == 1
+    assert store.get_vouches(g, 1) == 7 and store.get_vouches(other, 1) == 10
+    rows, after = store.vouch_page(g, 1, limit=2)
+    assert [(row['voucher_id'], row['timestamp'], row['reason']) for row in rows] == [(12, 200, "middleman"), (11, 200, None)]
+    assert after == (200, 11)
+    rows, after = store.vouch_page(g, 1, after, limit=2)
+    assert [row['voucher_id'] for row in rows] == [10, 13] and after is None
+    store.set_unvouchable(g, 10, True)
+    summary = store.verify_summary(g, 1)
+    assert (summary['total_vouches'], summary['admin_vouches'], summary['last_vouch_time']) == (4, 1, 200)
+    assert (summary['vouch_count'], summary['adjustments']) == (7, 3)
+    assert store.verify_summary(other, 1)['admin_vouches'] == 0
+    store.set_unvouchable(g, 10, False)
+    assert store.fill_missing_timestamps(g, 300) == 1
+    assert store.remove_records(g, 1, 1)
+    assert not store.has_vouched(g, 10, 1) and store.has_vouched(other, 10, 1)
+    assert store.remove_records(g, 1, 1, newest_first=True)
+    assert not store.has_vouched(g, 13, 1)
+    assert store.record_count(g, 1) == 2 and store.get_vouches(g, 1) == 5
+    assert store.clear_records(g, 1)
+    assert store.record_count(g, 1) == 0 and store.record_count(other, 1) == 1
+    assert store.get_vouches(g, 1) == 3
+
+    # Cooldowns
+    assert store.get_last_vouch_time(g, 10) is None
+    assert store.set_last_vouch_time(g, 10, 100)
+    assert store.set_last_vouch_time(g, 10, 150)
+    assert store.get_last_vouch_time(g, 10) == 150
+    assert store.get_last_vouch_time(other, 10) is None
+
+    # Community vouches
+    assert store.record_vouch(g, 20, 3, "quick", 400) == 1
+    assert store.record_vouch(g, 20, 3, "again", 401) is None
+    assert store.record_vouch(g, 21, 3, DEFAULT_REASON, 402) == 2
+    assert store.get_vouches(g, 3) == 2 and store.is_tracking_enabled(g, 3)
+    assert store.get_last_vouch_time(g, 21) == 402 and store.record_count(g, 3) == 2
+    assert store.record_vouch(other, 20, 3, "quick", 400) == 1
+
+    # Admin adjustments
+    assert store.adjust_vouches(g, 200, 2, 99, 500) == 2 and store.is_tracking_enabled(g, 200)
+    assert store.record_vouch(g, 20, 200, "quick", 501) == 3
+    assert store.adjust_vouches(g, 200, -1, 99, 502) == 2
+    assert store.adjust_vouches(g, 200, 0) == 2
+    assert store.set_vouch_count(g, 200, 5, 99, 503) and store.get_vouches(g, 200) == 5
+    summary = store.verify_summary(g, 200)
+    assert (summary['vouch_count'], summary['total_vouches'], summary['adjustments']) == (5, 1, 4)
+    assert summary['last_adjustment_time'] == 503
+    assert store.clear_records(g, 200) and store.get_vouches(g, 200) == 4
+    assert store.recount_vouches(g) == 0 and store.recount_vouches(other) == 0
+
+    # Clearing vouches
+    store.add_vouch(g, 10, 2, "ok", 100)
+    store.set_last_vouch_time(g, 2, 100)
+    assert store.clear_vouches(g, 2)
+    assert store.get_vouches(g, 2) == 0 and store.record_count(g, 2) == 0 and store.get_last_vouch_time(g, 2) is None
+    assert store.get_last_vouch_time(g, 10) == 150
+    store.add_vouch(g, 11, 1, "ok", 100)
+    assert store.clear_vouches(g)
+    assert store.positive_counts(g) == {} and store.record_count(g, 1) == 0 and store.get_last_vouch_time(g, 10) is None
+    assert store.positive_counts(other) == {1: 10, 3: 1} and store.get_last_vouch_time(other, 20) == 400
+
+    # Keyset pages over user IDs
+    for user_id in range(100, 125):
+        store.set_unvouchable(g, user_id, True)
+        store.set_tracking(g, user_id, True)
+    seen, after = [], None
+    while True:
+        page, after = store.unvouchable_page(g, after, limit=10)
+        seen.extend(page)
+        if after is None:
+            break
+    assert seen == list(range(100, 125))
+    assert store.unvouchable_page(other) == ([], None)
+    page, after = store.tracked_page(g, limit=3)
+    assert page == [1, 3, 100] and after == 100
+
+    # Bulk reads
+    assert (g, 3, 0, True) in store.user_states() and (other, 1, 10, True) in store.user_states()
+    assert sorted(store.unvouchable_ids()) == [(g, user_id) for user_id in range(100, 125)]
+    assert store.add_record(g, 13, 1)
+    assert store.vouch_pairs(g, 1) == [(g, 13, 1)] and (other, 10, 1) in store.vouch_pairs()
+
+    # Claiming rows written before partitioning
+    assert store.set_vouch_count(UNASSIGNED_GUILD, 50, 2) and store.add_record(UNASSIGNED_GUILD, 51, 50)
+    assert store.set_vouch_count(UNASSIGNED_GUILD, 1, 4)
+    assert store.claim_unassigned(7) == 5
+    assert store.get_vouches(7, 50) == 3 and store.has_vouched(7, 51, 50) and store.get_vouches(7, 1) == 4
+    assert store.get_vouches(UNASSIGNED_GUILD, 50) == 0
+    assert store.set_vouch_count(UNASSIGNED_GUILD, 1, 8)
+    assert store.claim_unassigned(7) == 0 and store.get_vouches(7, 1) == 4
+
+    # Guild config
+    assert store.get_config(g) == (0, [])
+    assert store.set_config(g, "staff_channel_id", "42")
+    assert store.set_config(g, "admin_roles_id", json.dumps([7, 8]))
+    assert store.get_config(g) == (42, [7, 8])
+    assert not store.set_config(g, "bogus", "1")
+
+    # Writes that bypass the read model, then refresh()
+    if isinstance(store, ReadModelStore):
+        assert store.engine.set_vouch_count(other, 1, 12) and store.get_vouches(other, 1) == 10
+        asyncio.run(store.refresh())
+        assert store.get_vouches(other, 1) == 12
+
+        async def racing_write():
+            refresh = asyncio.create_task(store.refresh())
+            await asyncio.sleep(0)
+            store.set_vouch_count(other, 3, 6)  # Lands while the snapshot is read
+            await refresh
+        generation = store.generation
+        asyncio.run(racing_write())
+        assert store.get_vouches(other, 3) == 6 and store.generation > generation + 1
+
+
+def check_partition_migration(path):
+    """Build a pre-partitioning database and check init_schema parks its rows for a guild to claim"""
+    with sqlite3.connect(path, isolation_level=None) as conn:
+        conn.execute("CREATE TABLE vouches (user_id INTEGER PRIMARY KEY, vouch_count INTEGER DEFAULT 0, tracking_enabled INTEGER DEFAULT 0)")
+        conn.execute("CREATE TABLE unvouchable_users (user_id INTEGER PRIMARY KEY)")
+        conn.execute("CREATE TABLE vouch_cooldowns (user_id INTEGER PRIMARY KEY, last_vouch_time INTEGER)")
+        conn.execute("""
+        CREATE TABLE vouch_records (
+            vouched_id INTEGER NOT NULL, voucher_id INTEGER NOT NULL, timestamp INTEGER DEFAULT 0, reason_id INTEGER,
+            PRIMARY KEY (vouched_id, voucher_id)
+        ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE TABLE vouch_reasons (reason_id INTEGER PRIMARY KEY, voucher_id INTEGER, vouched_id INTEGER, reason TEXT)")
+        conn.execute("INSERT INTO vouches VALUES (1, 5, 1)")
+        conn.execute("INSERT INTO unvouchable_users VALUES (3)")
+        conn.execute("INSERT INTO vouch_cooldowns VALUES (10, 100)")
+        conn.execute("INSERT INTO vouch_reasons VALUES (1, 10, 1, 'legacy trade')")
+        conn.execute("INSERT INTO vouch_records VALUES (1, 10, 100, 1), (1, 11, 200, NULL)")
+    store = SQLiteStore(path)
+    # Three of the five vouches have no record, so they survive as a legacy adjustment
+    assert store.get_vouches(UNASSIGNED_GUILD, 1) == 5 and store.is_unvouchable(UNASSIGNED_GUILD, 3)
+    assert store.claim_unassigned(5) == 7
+    rows, _ = store.vouch_page(5, 1)
+    assert [(row['voucher_id'], row['reason']) for row in rows] == [(11, None), (10, "legacy trade")]
+    assert store.get_last_vouch_time(5, 10) == 100 and store.get_nickname_state(5, 1) == (True, 5, False)
+    assert store.clear_records(5, 1) and store._fetchone("SELECT COUNT(*) FROM vouch_reasons")[0] == 0
+    assert store.get_vouches(5, 1) == 3 and store.recount_vouches(5) == 0
+
+
+def benchmark(store, vouches=1000, guild_id=1):
+    """Time a vouch-heavy workload against an engine; returns seconds"""
+    started = time.perf_counter()
+    for i in range(vouches):
+        vouched_id = 1000 + i % 50
+        if not store.has_vouched(guild_id, i, vouched_id) and not store.is_unvouchable(guild_id, vouched_id):
+            store.add_vouch(guild_id, i, vouched_id, "bench" if i % 3 else DEFAULT_REASON, i)
+            store.set_last_vouch_time(guild_id, i, i)
+    for vouched_id in range(1000, 1050):
+        store.vouch_page(guild_id, vouched_id)
+    return time.perf_counter() - started
+
+
+def benchmark_burst(store, vouches=5000, guild_id=1):
+    """Push a burst of concurrent vouches through WriteCoalescer; returns vouches per second"""
+    async def burst():
+        coalescer = WriteCoalescer(store)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            coalescer.submit(store.write_vouch, guild_id, i, 1000 + i % 50, "bench", i) for i in range(vouches)
+        ))
+        elapsed = time.perf_counter() - started
+        assert all(results)
+        return vouches / elapsed, coalescer.batches
+    return asyncio.run(burst())
+
+
+def warmed(engine):
+    store = ReadModelStore(engine)
+    store.warm()
+    return store
+
+
+def check_read_model(store):
+    """Assert an incrementally maintained model matches one warmed from scratch"""
+    fresh = warmed(store.engine)
+    # Empty partitions left behind by deletes are not a mismatch
+    for name in ("counts", "tracking", "unvouchable", "received"):
+        maintained = {guild_id: part for guild_id, part in getattr(store, name).items() if part}
+        assert maintained == getattr(fresh, name), name
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        engines = {
+            "memory": MemoryStore,
+            "sqlite": lambda: SQLiteStore(os.path.join(directory, "conformance.db")),
+            "sqlite+model": lambda: warmed(SQLiteStore(os.path.join(directory, "model.db"))),
+        }
+        for name, make_store in engines.items():
+            store = make_store()
+            run_conformance(store)
+            if isinstance(store, ReadModelStore):
+                check_read_model(store)
+            print(f"{name}: conformance passed")
+        check_partition_migration(os.path.join(directory, "legacy.db"))
+        print("sqlite: guild partition migration passed")
+        engines["sqlite"] = lambda: SQLiteStore(os.path.join(directory, "bench.db"))
+        engines["sqlite+model"] = lambda: warmed(SQLiteStore(os.path.join(directory, "bench_model.db")))
+        for name, make_store in engines.items():
+            print(f"{name}: benchmark {benchmark(make_store()):.2f}s")
+        rate, batches = benchmark_burst(SQLiteStore(os.path.join(directory, "burst.db")))
+        print(f"sqlite: group commit {rate:.0f} vouches/s in {batches} batches")
+        model = ReadModelStore(SQLiteStore(os.path.join(directory, "burst.db")))
+        seconds = model.warm()
+        usage = model.memory_usage()
+        print(f"read model: warmed {usage['vouches']} vouches in {seconds * 1000:.1f} ms, "
+              f"{usage['bytes'] / 1024:.0f} KiB")
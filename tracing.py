@@ -0,0 +1,90 @@
+"""Record command and interaction traffic to JSONL for offline replay.
+
+Set VOUCH_TRACE_PATH to have main.py append one JSON object per line for
+every command it runs (prefix or slash) and every component or modal
+interaction. Lines look like:
+
+    {"at": 1760000000.123, "kind": "command", "name": "vouch", "slash": false,
+     "guild_id": 1, "channel_id": 2, "author": {"id": 3, "name": "bob", "nick": null, "roles": [4]},
+     "args": [{"member": {"id": 5, ...}}], "kwargs": {"reason": "fast trade"}}
+
+Commands are captured once their arguments are parsed and their checks
+have passed, so the trace holds exactly what the bot went on to execute.
+replay.py feeds a trace back into the bot.
+"""
+import json
+import time
+
+import discord
+
+
+def encode_member(member):
+    return {
+        "id": member.id,
+        "name": member.name,
+        "nick": getattr(member, "nick", None),
+        "roles": [role.id for role in getattr(member, "roles", ())],
+    }
+
+
+def encode_value(value):
+    """JSON-safe form of a command argument; Discord objects keep the fields replay needs"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (discord.Member, discord.User)):
+        return {"member": encode_member(value)}
+    if isinstance(value, discord.Role):
+        return {"role": value.id}
+    if isinstance(value, discord.abc.GuildChannel):
+        return {"channel": value.id}
+    return str(value)
+
+
+class TraceRecorder:
+    """Append events to a JSONL file, one line per event, flushed as it is written"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8", buffering=1)
+        self.events = 0
+
+    def write(self, event):
+        self.file.write(json.dumps({"at": round(time.time(), 4), **event}, ensure_ascii=False) + "\n")
+        self.events += 1
+
+    def record_command(self, ctx):
+        # ctx.args starts with the cog (for cog commands) and the context itself
+        args = ctx.args[2:] if ctx.cog is not None else ctx.args[1:]
+        self.write({
+            "kind": "command",
+            "name": ctx.command.qualified_name,
+            "slash": ctx.interaction is not None,
+            "guild_id": ctx.guild.id if ctx.guild else None,
+            "channel_id": ctx.channel.id,
+            "author": encode_member(ctx.author),
+            "args": [encode_value(arg) for arg in args],
+            "kwargs": {key: encode_value(value) for key, value in ctx.kwargs.items()},
+        })
+
+    async def record_interaction(self, interaction):
+        """on_interaction listener; slash commands are already recorded as commands"""
+        if interaction.type not in (discord.InteractionType.component, discord.InteractionType.modal_submit):
+            return
+        self.write({
+            "kind": interaction.type.name,
+            "name": (interaction.data or {}).get("custom_id"),
+            "guild_id": interaction.guild_id,
+            "channel_id": interaction.channel_id,
+            "author": encode_member(interaction.user),
+        })
+
+    def close(self):
+        self.file.close()
+
+
+def load_trace(path):
+    """Events from a JSONL trace in recorded order"""
+    with open(path, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda event: event["at"])
+    return events
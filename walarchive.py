@@ -0,0 +1,497 @@
+"""Continuous WAL archival and point-in-time restore.
+
+    python walarchive.py list ARCHIVE
+    python walarchive.py restore ARCHIVE OUTPUT.db [--at 2026-10-19T12:00:00]
+    python walarchive.py bench [--vouches 100000]
+
+Set VOUCH_WAL_ARCHIVE to a directory and the bot keeps an archive there
+that can rebuild the database as it was at any moment of the last
+VOUCH_WAL_RETENTION_DAYS days, so a bad `clearvouches_all` is no longer
+only recoverable from the last manual `backup_db`.
+
+WalArchiver switches the database to WAL mode and takes over checkpoints:
+every connection runs with wal_autocheckpoint = 0 and the archiver holds
+one connection open, so SQLite never folds the WAL into the database file
+on its own. About once a second the archiver reads the frames appended to
+the WAL since its last look, keeps those up to the last fully written
+commit (frames are checked against the WAL's salts and running checksum),
+and stores them as a gzipped segment. Only new bytes are read, and nothing
+is written when no vouch was written. Once the WAL grows past
+CHECKPOINT_BYTES the archiver checkpoints it with TRUNCATE and carries on
+with the next WAL.
+
+A generation is a snapshot plus the segments shipped after it. A snapshot
+is a gzipped copy of the database file taken right after a checkpoint has
+emptied the WAL. Writers only append to the WAL and nothing else
+checkpoints, so the file holds still while it is copied and nobody waits
+for the copy. A new generation starts when the archiver starts, once a day,
+and whenever frames may have been checkpointed before they were shipped.
+
+restore() copies the newest snapshot taken before the target time and
+writes the page images of each later segment shipped by then over it,
+truncating the file to the size recorded in every commit frame. Restore
+points are as fine as the ship interval. Archived vouch reasons
+(retention.py) live in their own file and are not part of the archive.
+"""
+import argparse
+import asyncio
+import functools
+import gzip
+import operator
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from storage import DEFAULT_REASON, SQLiteStore
+
+WAL_ARCHIVE_DIR = os.environ.get("VOUCH_WAL_ARCHIVE")
+WAL_RETENTION_DAYS = int(os.environ.get("VOUCH_WAL_RETENTION_DAYS", 7))
+SHIP_INTERVAL = 1.0  # Seconds between looks at the WAL
+CHECKPOINT_BYTES = 4 * 1024 * 1024  # WAL size that triggers a checkpoint once it is shipped
+SNAPSHOT_INTERVAL = 24 * 3600  # Seconds between snapshots
+CHECKPOINT_BUSY_TIMEOUT = 1000  # Milliseconds a checkpoint waits for readers before retrying next time
+COMPRESS_LEVEL = 3
+SNAPSHOT_NAME = "snapshot.db.gz"
+
+WAL_HEADER_SIZE = 32
+MASK = 0xFFFFFFFF
+FRAME_HEADER_SIZE = 24
+
+
+@functools.lru_cache(maxsize=None)
+def checksum_coefficients(count):
+    """Weights that reduce the WAL checksum of `count` words to two dot products.
+
+    Each pair of words (a, b) maps (s0, s1) to M (s0, s1) + (a, a + b) with
+    M = [[1, 1], [1, 2]], so the checksum is M^n (s0, s1) plus a fixed
+    multiple of every word. Returns (weights for s0, weights for s1, M^n).
+    """
+    c0, c1 = [0] * count, [0] * count
+    p, q, r, t = 1, 0, 0, 1
+    for i in range(count - 2, -1, -2):  # The last pair is multiplied by M^0
+        c0[i], c1[i] = (p + q) & MASK, (r + t) & MASK
+        c0[i + 1], c1[i + 1] = q, t
+        p, q, r, t = (p + r) & MASK, (q + t) & MASK, (p + 2 * r) & MASK, (q + 2 * t) & MASK
+    return c0, c1, (p, q, r, t)
+
+
+def wal_checksum(data, s0, s1, big_endian):
+    """SQLite's WAL checksum of `data`, continuing from (s0, s1)"""
+    words = struct.unpack(f"{'>' if big_endian else '<'}{len(data) // 4}I", data)
+    c0, c1, (p, q, r, t) = checksum_coefficients(len(words))
+    return (
+        (p * s0 + q * s1 + sum(map(operator.mul, words, c0))) & MASK,
+        (r * s0 + t * s1 + sum(map(operator.mul, words, c1))) & MASK,
+    )
+
+
+def read_wal_header(header):
+    """(page size, big-endian checksums, header checksum) of a WAL header, or None if it is not valid yet"""
+    magic, _, page_size = struct.unpack(">III", header[:12])
+    if magic not in (0x377F0682, 0x377F0683):
+        return None
+    big_endian = bool(magic & 1)
+    checksum = wal_checksum(header[:24], 0, 0, big_endian)
+    if checksum != struct.unpack(">II", header[24:32]):
+        return None
+    return page_size, big_endian, checksum
+
+
+def write_archive_file(path, source):
+    """Gzip `source` (bytes or a binary file) to `path` durably, appearing only once complete"""
+    partial = f"{path}.partial"
+    with open(partial, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=COMPRESS_LEVEL, mtime=0) as f:
+            if isinstance(source, bytes):
+                f.write(source)
+            else:
+                shutil.copyfileobj(source, f, 1 << 20)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+
+
+def list_generations(directory):
+    """[(created at, generation directory)] for every complete generation, oldest first"""
+    generations = []
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else ():
+        path = os.path.join(directory, name)
+        if name.isdigit() and os.path.exists(os.path.join(path, SNAPSHOT_NAME)):
+            generations.append((int(name) / 1000, path))
+    return generations
+
+
+def list_segments(generation):
+    """[(shipped at, segment path)] in shipping order"""
+    segments = []
+    for name in sorted(os.listdir(generation)):
+        if name.endswith(".wal.gz"):
+            _, shipped_ms = name[:-len(".wal.gz")].split("-")
+            segments.append((int(shipped_ms) / 1000, os.path.join(generation, name)))
+    return segments
+
+
+class WalArchiver:
+    """Ships a SQLite database's WAL into `directory` as generations of snapshot plus segments.
+
+    All file and database work happens on one archiver thread, which owns
+    the archiver's connection. start() runs it as a task on the bot's loop.
+    """
+
+    def __init__(self, store, directory, retention_days=WAL_RETENTION_DAYS):
+        self.store = store
+        self.directory = directory
+        self.retention = retention_days * 86400
+        self.checkpoint_bytes = CHECKPOINT_BYTES
+        self.snapshot_interval = SNAPSHOT_INTERVAL
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wal-archiver")
+        self.conn = None
+        self.task = None
+        self.generation = None  # Directory of the generation being shipped to; None until a snapshot
+        self.snapshot_at = 0.0
+        self.seq = 0  # Next segment number in the generation
+        self.salt = None  # Salts of the WAL being shipped
+        self.page_size = None
+        self.big_endian = None
+        self.header = None
+        self.offset = 0  # Bytes of the WAL shipped so far
+        self.checksum = None  # Running checksum after the last shipped frame
+        self.frames = 0  # Frames shipped from this WAL
+        self.wal_reset = False  # Our own checkpoint emptied the WAL, so a new one may begin
+        self.shipped_at = None
+        self.segments = 0
+        self.bytes_shipped = 0
+
+    @property
+    def wal_path(self):
+        return f"{self.store.path}-wal"
+
+    def wal_size(self):
+        try:
+            return os.path.getsize(self.wal_path)
+        except FileNotFoundError:
+            return 0
+
+    def open(self):
+        """Switch the database to WAL mode and open the archiver's connection (archiver thread)"""
+        self.store.autocheckpoint = 0
+        conn = self.store.connect()
+        conn.execute(f"PRAGMA busy_timeout = {CHECKPOINT_BUSY_TIMEOUT}")
+        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode != "wal":
+            conn.close()
+            raise RuntimeError(f"Could not switch {self.store.path} to WAL mode (journal mode is {mode})")
+        os.makedirs(self.directory, exist_ok=True)
+        self.conn = conn
+
+    def ship(self):
+        """Archive the commits appended to the WAL since the last call.
+
+        Returns False when the WAL can no longer be followed (no generation
+        yet, or it was restarted by someone else) and a snapshot is needed.
+        """
+        if self.generation is None:
+            return False
+        try:
+            f = open(self.wal_path, "rb")
+        except FileNotFoundError:
+            return True
+        with f:
+            header = f.read(WAL_HEADER_SIZE)
+            parsed = read_wal_header(header) if len(header) == WAL_HEADER_SIZE else None
+            if parsed is None:
+                return True  # Empty after a checkpoint, or the first writer is still writing the header
+            if header[16:24] != self.salt:
+                if not self.wal_reset:
+                    return False
+                self.salt, self.header = header[16:24], header
+                self.page_size, self.big_endian, self.checksum = parsed
+                self.offset, self.frames, self.wal_reset = WAL_HEADER_SIZE, 0, False
+            f.seek(self.offset)
+            data = f.read()
+
+        frame_size = FRAME_HEADER_SIZE + self.page_size
+        s0, s1 = self.checksum
+        position = frames = 0
+        committed = (0, self.checksum, 0)
+        while position + frame_size <= len(data):
+            frame = data[position:position + frame_size]
+            if frame[8:16] != self.salt:
+                break
+            s0, s1 = wal_checksum(frame[:8] + frame[FRAME_HEADER_SIZE:], s0, s1, self.big_endian)
+            if struct.unpack(">II", frame[16:24]) != (s0, s1):
+                break  # Still being written
+            position += frame_size
+            frames += 1
+            if frame[4:8] != b"\0\0\0\0":
+                committed = (position, (s0, s1), frames)
+        end, checksum, frames = committed
+        if not end:
+            return True
+
+        shipped_at = time.time()
+        name = f"{self.seq:08d}-{int(shipped_at * 1000)}.wal.gz"
+        write_archive_file(os.path.join(self.generation, name), self.header + data[:end])
+        self.seq += 1
+        self.offset += end
+        self.checksum = checksum
+        self.frames += frames
+        self.shipped_at = shipped_at
+        self.segments += 1
+        self.bytes_shipped += end
+        return True
+
+    def checkpoint(self):
+        """Fold the WAL into the database file without truncating it.
+
+        The next writer restarts the WAL once every frame in it is in the
+        file, so commits made since the last ship are shipped before that
+        can happen. Returns False if a restart beat us to them and a
+        snapshot is needed.
+        """
+        busy, frames, _ = self.conn.execute("PRAGMA wal_checkpoint(FULL)").fetchone()
+        if self.frames < frames and not self.ship():
+            return False
+        if not busy and self.frames >= frames:
+            self.wal_reset = True
+        return True
+
+    def snapshot(self):
+        """Start a new generation from a copy of the database file; False if readers blocked the checkpoint"""
+        self.generation = None
+        busy, _, _ = self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        if busy:
+            return False
+        self.wal_reset = True
+        created = time.time()
+        generation = os.path.join(self.directory, f"{int(created * 1000):013d}")
+        os.makedirs(generation, exist_ok=True)
+        # Only the archiver checkpoints, so the file holds still while writers append to the new WAL
+        with open(self.store.path, "rb") as f:
+            write_archive_file(os.path.join(generation, SNAPSHOT_NAME), f)
+        self.generation, self.snapshot_at, self.seq = generation, created, 0
+        self.prune()
+        return True
+
+    def prune(self):
+        """Delete generations no restore point inside the retention window needs"""
+        cutoff = time.time() - self.retention
+        generations = list_generations(self.directory)
+        keep = {path for created, path in generations if created >= cutoff}
+        older = [path for created, path in generations if created < cutoff]
+        if older:
+            keep.add(older[-1])  # Covers the start of the window
+        keep.add(self.generation)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.isdigit() and path not in keep and int(name) / 1000 < self.snapshot_at:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def cycle(self):
+        """One archiver step: ship new commits, then checkpoint or snapshot when due (archiver thread)"""
+        if not self.ship() or time.time() - self.snapshot_at >= self.snapshot_interval:
+            self.snapshot()
+        elif self.offset >= self.checkpoint_bytes and not self.checkpoint():
+            self.snapshot()
+
+    def status(self):
+        return {
+            "generation": self.snapshot_at if self.generation else None,
+            "shipped_at": self.shipped_at,
+            "segments": self.segments,
+            "bytes_shipped": self.bytes_shipped,
+            "wal_bytes": self.wal_size(),
+        }
+
+    def start(self):
+        """Run the archiver on the running loop; safe to call again"""
+        if self.task is not None and not self.task.done():
+            return
+        # Set before any other connection opens so nothing checkpoints behind the archiver's back
+        self.store.autocheckpoint = 0
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.open)
+        while True:
+            try:
+                await loop.run_in_executor(self.executor, self.cycle)
+            except (OSError, sqlite3.Error) as e:
+                print(f"WAL archiving failed: {e}")
+            await asyncio.sleep(SHIP_INTERVAL)
+
+
+def apply_frames(db, data):
+    """Write the page images of one segment over an open database file; returns frames applied"""
+    page_size = struct.unpack(">I", data[8:12])[0]
+    frame_size = FRAME_HEADER_SIZE + page_size
+    frames = 0
+    for position in range(WAL_HEADER_SIZE, len(data), frame_size):
+        page, commit = struct.unpack(">II", data[position:position + 8])
+        db.seek((page - 1) * page_size)
+        db.write(data[position + FRAME_HEADER_SIZE:position + frame_size])
+        if commit:
+            db.truncate(commit * page_size)
+        frames += 1
+    return frames
+
+
+def restore(directory, output, target=None):
+    """Rebuild the database as of `target` (a Unix time; latest if None) at `output`"""
+    if os.path.exists(output) or os.path.exists(f"{output}-wal"):
+        raise FileExistsError(f"{output} already exists")
+    started = time.perf_counter()
+    generations = [(created, path) for created, path in list_generations(directory) if target is None or created <= target]
+    if not generations:
+        raise ValueError("No snapshot was taken at or before that time")
+    created, generation = generations[-1]
+    partial = f"{output}.partial"
+    with gzip.open(os.path.join(generation, SNAPSHOT_NAME), "rb") as src, open(partial, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    restored_to, segments, frames = created, 0, 0
+    with open(partial, "r+b") as db:
+        for shipped_at, path in list_segments(generation):
+            if target is not None and shipped_at > target:
+                break
+            with gzip.open(path, "rb") as f:
+                frames += apply_frames(db, f.read())
+            restored_to = shipped_at
+            segments += 1
+        db.flush()
+        os.fsync(db.fileno())
+    os.replace(partial, output)
+    return {
+        "snapshot": created,
+        "restored_to": restored_to,
+        "segments": segments,
+        "frames": frames,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def parse_time(text):
+    """Unix seconds, or an ISO 8601 time (UTC unless it carries an offset)"""
+    try:
+        return float(text)
+    except ValueError:
+        moment = datetime.fromisoformat(text)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] + " UTC"
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def check_restore(directory, vouches=100000, rounds=20, per_round=2000):
+    """Archive a large database through rounds of writes, then restore points in time and check them.
+
+    Halfway through a forced snapshot starts a second generation, and the
+    last round wipes every record the way a bad clearvouches_all would.
+    """
+    store = SQLiteStore(os.path.join(directory, "bench.db"))
+    archive = os.path.join(directory, "archive")
+
+    def fill(conn, first, count):
+        for i in range(first, first + count):
+            reason = f"trade number {i} went smoothly" if i % 2 else DEFAULT_REASON
+            SQLiteStore.write_vouch(conn, 1, 100000 + i, 1 + i % 500, reason, 1700000000 + i)
+
+    def record_count():
+        return store._fetchone("SELECT COUNT(*) FROM vouch_records")[0]
+
+    started = time.perf_counter()
+    store._write(fill, 0, vouches)
+    loaded = time.perf_counter() - started
+    archiver = WalArchiver(store, archive)
+    archiver.checkpoint_bytes = 256 * 1024
+    archiver.open()
+    archiver.cycle()
+    points = [(archiver.snapshot_at, vouches)]
+    for r in range(rounds):
+        store._write(fill, vouches + r * per_round, per_round)
+        if r == rounds // 2:
+            archiver.snapshot_at = 0  # Due now
+        archiver.cycle()
+        points.append((archiver.shipped_at, record_count()))
+        time.sleep(0.002)  # Keep restore points a few milliseconds apart
+    store._execute("DELETE FROM vouch_records")
+    archiver.cycle()
+    assert record_count() == 0
+
+    result = None
+    for target, expected in points[::5] + [points[rounds // 2 + 1], points[-1]]:
+        output = os.path.join(directory, "restored.db")
+        result = restore(archive, output, target)
+        restored = SQLiteStore(output, init=False)
+        assert restored._fetchone("SELECT COUNT(*) FROM vouch_records")[0] == expected, (target, expected)
+        if target == points[-1][0]:
+            check_started = time.perf_counter()
+            assert restored._fetchone("PRAGMA integrity_check")[0] == "ok"
+            result["check_seconds"] = time.perf_counter() - check_started
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(output + suffix):
+                os.remove(output + suffix)
+    assert len(list_generations(archive)) == 2
+    result.update(
+        load_seconds=loaded,
+        database_bytes=os.path.getsize(store.path),
+        archive_bytes=directory_size(archive),
+        shipped_segments=archiver.segments,
+        shipped_bytes=archiver.bytes_shipped,
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    listing = commands.add_parser("list", help="show the generations and restore window of an archive")
+    listing.add_argument("archive")
+    rebuild = commands.add_parser("restore", help="rebuild the database as of a point in time")
+    rebuild.add_argument("archive")
+    rebuild.add_argument("output", help="path for the restored database; must not exist yet")
+    rebuild.add_argument("--at", type=parse_time, help="Unix time or ISO 8601 time, UTC by default (default: latest)")
+    bench = commands.add_parser("bench", help="time archiving and restore on a large scratch database")
+    bench.add_argument("--vouches", type=int, default=100000, help="records in the database before archiving starts")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        generations = list_generations(args.archive)
+        if not generations:
+            raise SystemExit(f"No generations in {args.archive}")
+        for created, path in generations:
+            segments = list_segments(path)
+            latest = segments[-1][0] if segments else created
+            print(f"{format_time(created)} → {format_time(latest)}: {len(segments)} segments, "
+                  f"{directory_size(path) / 1024 / 1024:.1f} MiB")
+    elif args.command == "restore":
+        result = restore(args.archive, args.output, args.at)
+        check = SQLiteStore(args.output, init=False)._fetchone("PRAGMA quick_check")
+        print(f"Restored {args.output} to {format_time(result['restored_to'])} from the snapshot of "
+              f"{format_time(result['snapshot'])} and {result['segments']} segments ({result['frames']} frames) "
+              f"in {result['seconds']:.2f}s; quick_check: {check[0] if check else 'failed'}")
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            result = check_restore(directory, args.vouches)
+        print(f"walarchive: {args.vouches} vouches ({result['database_bytes'] / 1024 / 1024:.1f} MiB) loaded in "
+              f"{result['load_seconds']:.1f}s; shipped {result['shipped_segments']} segments "
+              f"({result['shipped_bytes'] / 1024 / 1024:.1f} MiB of WAL), archive holds "
+              f"{result['archive_bytes'] / 1024 / 1024:.1f} MiB")
+        print(f"walarchive: restored {result['segments']} segments ({result['frames']} frames) in "
+              f"{result['seconds']:.2f}s, integrity_check {result['check_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()